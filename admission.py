@@ -0,0 +1,244 @@
+"""
+Admission control for the extraction endpoints.
+
+Before its body is read, every extraction request must be granted a share of
+a fixed capacity, measured in cost units. A request's cost grows with its
+declared size (``Content-Length``) and, when the client sends one, its
+declared page count (``X-Page-Count``). Requests that do not fit wait in a
+bounded queue for their lane: single-file endpoints use the ``interactive``
+lane and the batch endpoints use the ``batch`` lane. When capacity frees
+up, the waiting lanes are served in proportion to their weights. The batch
+lane can never take the capacity reserved for interactive requests, so
+small calls keep a predictable latency while batches use the rest.
+
+A request that finds its lane's queue full, or waits longer than the queue
+timeout, is rejected with 503 and a ``Retry-After`` header.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+from metrics import observe_admission_rejection, observe_stage
+from worker_pool import WORKER_PROCESSES
+
+# Cost units of concurrent work admitted at once (0 disables admission control)
+ADMISSION_CAPACITY = int(os.getenv("PDF_ADMISSION_CAPACITY", str(4 * max(1, WORKER_PROCESSES))))
+# Capacity only interactive requests may use (default: a quarter of the capacity)
+ADMISSION_INTERACTIVE_RESERVE = int(os.getenv("PDF_ADMISSION_INTERACTIVE_RESERVE", str(ADMISSION_CAPACITY // 4)))
+# Share of freed capacity given to each lane while both have requests waiting
+ADMISSION_INTERACTIVE_WEIGHT = float(os.getenv("PDF_ADMISSION_INTERACTIVE_WEIGHT", "4"))
+ADMISSION_BATCH_WEIGHT = float(os.getenv("PDF_ADMISSION_BATCH_WEIGHT", "1"))
+# Requests that may wait in each lane's queue; more are rejected straight away
+ADMISSION_QUEUE_SIZE = int(os.getenv("PDF_ADMISSION_QUEUE_SIZE", "100"))
+# Seconds a request may wait in the queue before it is rejected (0 = no limit)
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("PDF_ADMISSION_QUEUE_TIMEOUT", "60"))
+# Retry-After sent with rejections, in seconds
+ADMISSION_RETRY_AFTER = int(os.getenv("PDF_ADMISSION_RETRY_AFTER", "5"))
+# Declared bytes and pages that each add one cost unit to a request
+ADMISSION_COST_MB = float(os.getenv("PDF_ADMISSION_COST_MB", "8"))
+ADMISSION_COST_PAGES = int(os.getenv("PDF_ADMISSION_COST_PAGES", "50"))
+
+LANE_INTERACTIVE = "interactive"
+LANE_BATCH = "batch"
+
+# Request path -> lane; other requests are not subject to admission control
+ADMISSION_LANES = {
+    "/extract-text": LANE_INTERACTIVE,
+    "/extract-text-advanced": LANE_INTERACTIVE,
+    "/extract-text-stream": LANE_INTERACTIVE,
+    "/inspect": LANE_INTERACTIVE,
+    "/extract-text-batch": LANE_BATCH,
+    "/extract-text-batch-advanced": LANE_BATCH,
+    "/extract-text-batch-stream": LANE_BATCH,
+    "/extract-text-archive": LANE_BATCH,
+}
+
+PAGE_COUNT_HEADER = b"x-page-count"
+
+REJECTED_QUEUE_FULL = "queue_full"
+REJECTED_TIMEOUT = "timeout"
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; ``reason`` is 'queue_full' or 'timeout'"""
+
+    def __init__(self, lane: str, reason: str):
+        super().__init__(f"{lane} lane {reason}")
+        self.lane = lane
+        self.reason = reason
+
+
+class Lane:
+    """Requests of one kind: their queue, the capacity they hold and how much they have been served"""
+
+    def __init__(self, name: str, weight: float, limit: int):
+        self.name = name
+        self.weight = weight
+        self.limit = limit
+        self.waiting: Deque[Tuple[int, asyncio.Future]] = deque()
+        self.in_use = 0
+        self.served = 0.0
+        self.admitted = 0
+        self.rejected = 0
+
+
+class AdmissionController:
+    """Weighted admission of requests into a fixed capacity, with a bounded queue per lane"""
+
+    def __init__(self, capacity: int = ADMISSION_CAPACITY, interactive_reserve: int = ADMISSION_INTERACTIVE_RESERVE,
+                 interactive_weight: float = ADMISSION_INTERACTIVE_WEIGHT, batch_weight: float = ADMISSION_BATCH_WEIGHT,
+                 queue_size: int = ADMISSION_QUEUE_SIZE, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.capacity = capacity
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout if queue_timeout > 0 else None
+        reserve = min(max(0, interactive_reserve), capacity - 1) if capacity > 1 else 0
+        self.lanes = {
+            LANE_INTERACTIVE: Lane(LANE_INTERACTIVE, interactive_weight, capacity),
+            LANE_BATCH: Lane(LANE_BATCH, batch_weight, capacity - reserve),
+        }
+        self.in_use = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def request_cost(self, lane: str, content_length: Optional[int], pages: Optional[int]) -> int:
+        """Cost units of a request, from its declared size and page count, capped at what its lane may hold"""
+        cost = 1
+        if content_length and ADMISSION_COST_MB > 0:
+            cost = max(cost, 1 + int(content_length // (ADMISSION_COST_MB * 1024 * 1024)))
+        if pages and ADMISSION_COST_PAGES > 0:
+            cost = max(cost, 1 + pages // ADMISSION_COST_PAGES)
+        return min(cost, self.lanes[lane].limit)
+
+    @staticmethod
+    def queue_depth(lane: Lane) -> int:
+        return sum(1 for _, future in lane.waiting if not future.done())
+
+    def _fits(self, lane: Lane, cost: int) -> bool:
+        return self.in_use + cost <= self.capacity and lane.in_use + cost <= lane.limit
+
+    def _grant(self, lane: Lane, cost: int) -> None:
+        self.in_use += cost
+        lane.in_use += cost
+        lane.served += cost / lane.weight
+        lane.admitted += 1
+
+    def _dispatch(self) -> None:
+        """Admit waiting requests while they fit, the least served lane (for its weight) first"""
+        while True:
+            for lane in self.lanes.values():
+                while lane.waiting and lane.waiting[0][1].done():
+                    # Gave up waiting
+                    lane.waiting.popleft()
+            candidates = [lane for lane in self.lanes.values()
+                          if lane.waiting and self._fits(lane, lane.waiting[0][0])]
+            if not candidates:
+                return
+            lane = min(candidates, key=lambda candidate: candidate.served)
+            cost, future = lane.waiting.popleft()
+            self._grant(lane, cost)
+            future.set_result(None)
+
+    async def acquire(self, lane_name: str, cost: int) -> None:
+        """Wait until the request is admitted; raise AdmissionRejected if the queue is full or the wait too long"""
+        lane = self.lanes[lane_name]
+        depth = self.queue_depth(lane)
+        if not depth and self._fits(lane, cost):
+            self._grant(lane, cost)
+            return
+        if depth >= self.queue_size:
+            lane.rejected += 1
+            raise AdmissionRejected(lane_name, REJECTED_QUEUE_FULL)
+
+        waiting_lanes = [other for other in self.lanes.values() if other is not lane and self.queue_depth(other)]
+        if not depth and waiting_lanes:
+            # A lane that was idle starts level with the waiting lanes instead of catching up on them
+            lane.served = max(lane.served, min(other.served for other in waiting_lanes))
+        future = asyncio.get_running_loop().create_future()
+        lane.waiting.append((cost, future))
+        try:
+            await asyncio.wait([future], timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            if future.done():
+                self.release(lane_name, cost)
+            else:
+                future.cancel()
+            raise
+        if not future.done():
+            future.cancel()
+            lane.rejected += 1
+            self._dispatch()
+            raise AdmissionRejected(lane_name, REJECTED_TIMEOUT)
+
+    def release(self, lane_name: str, cost: int) -> None:
+        """Return the capacity held by an admitted request and admit the requests that now fit"""
+        self.in_use -= cost
+        self.lanes[lane_name].in_use -= cost
+        self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "capacity": self.capacity,
+            "in_use": self.in_use,
+            "lanes": {
+                name: {
+                    "weight": lane.weight,
+                    "limit": lane.limit,
+                    "in_use": lane.in_use,
+                    "queue_depth": self.queue_depth(lane),
+                    "admitted": lane.admitted,
+                    "rejected": lane.rejected
+                }
+                for name, lane in self.lanes.items()
+            }
+        }
+
+
+class AdmissionMiddleware:
+    """Hold extraction requests until they are admitted, answering 503 with Retry-After when they are not"""
+
+    def __init__(self, app, controller: AdmissionController, retry_after: int = ADMISSION_RETRY_AFTER):
+        self.app = app
+        self.controller = controller
+        self.retry_after = retry_after
+
+    async def __call__(self, scope, receive, send):
+        lane = ADMISSION_LANES.get(scope.get("path")) if scope["type"] == "http" else None
+        if lane is None or scope["method"] != "POST" or not self.controller.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length", b"")
+        pages = headers.get(PAGE_COUNT_HEADER, b"")
+        cost = self.controller.request_cost(
+            lane,
+            int(content_length) if content_length.isdigit() else None,
+            int(pages) if pages.isdigit() else None
+        )
+
+        started = time.perf_counter()
+        try:
+            await self.controller.acquire(lane, cost)
+        except AdmissionRejected as e:
+            observe_admission_rejection(e.lane, e.reason)
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": f"Server is busy ({e.reason.replace('_', ' ')}), retry later"},
+                headers={"Retry-After": str(self.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+        observe_stage("admission", time.perf_counter() - started)
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(lane, cost)
@@ -0,0 +1,331 @@
+"""
+Archive uploads.
+
+A zip or tar archive sent as the raw request body is copied to a temporary
+file as it arrives and read member by member in a worker thread. Tar
+archives (plain or gzip, bzip2 or xz compressed) are read while the body is
+still being received, so each member is available as soon as its last byte
+has arrived. Zip archives keep their directory at the end, so their members
+are read once the whole body is in. Each PDF member is copied to its own
+temporary file like an upload; neither the archive nor its members are held
+in memory.
+
+The body is received independently of how fast the members are extracted
+or the results are read, so a disconnect is noticed at once and a client
+that sends the whole request before reading the response cannot stall the
+server.
+"""
+
+import asyncio
+import functools
+import io
+import os
+import tarfile
+import tempfile
+import threading
+import zipfile
+from typing import AsyncIterator, BinaryIO, Callable, Iterator, Optional, Tuple
+
+import anyio.from_thread
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect, Request
+from starlette.responses import StreamingResponse
+
+from uploads import MAX_UPLOAD_BYTES, SPOOL_CHUNK_BYTES, UPLOAD_DIR, SpooledUpload, spool_stream
+
+# Default maximum number of PDF files processed from one archive (0 = unlimited)
+ARCHIVE_MAX_MEMBERS = int(os.getenv("PDF_ARCHIVE_MAX_MEMBERS", "10000"))
+# PDF members spooled to disk and waiting for an extraction slot before reading the archive pauses
+ARCHIVE_READ_AHEAD = max(1, int(os.getenv("PDF_ARCHIVE_READ_AHEAD", "4")))
+
+# Local file header and end of central directory (empty archive) signatures
+ZIP_SIGNATURES = (b"PK\x03\x04", b"PK\x05\x06")
+# Resource forks macOS adds to the zip archives it creates
+MACOS_METADATA_DIR = "__MACOSX/"
+
+
+class ArchiveMember:
+    """A PDF member of an archive spooled to disk, or the reason it could not be"""
+
+    def __init__(self, name: str, upload: Optional[SpooledUpload] = None, error: Optional[str] = None):
+        self.name = name
+        self.upload = upload
+        self.error = error
+
+    def close(self) -> None:
+        if self.upload is not None:
+            self.upload.close()
+
+
+class ArchiveClosed(Exception):
+    """Raised in the reading thread once nobody consumes the archive's members any more"""
+
+
+class BodyReadError(Exception):
+    """Receiving the request body failed, e.g. on a disconnect; the cause is the original exception"""
+
+
+class SpooledBody:
+    """
+    A request body copied to a temporary file as it arrives
+
+    Worker threads can read it while it is still growing; reads block at the
+    current end until more has been received.
+    """
+
+    def __init__(self):
+        fd, self.path = tempfile.mkstemp(suffix=".archive", dir=UPLOAD_DIR)
+        self._file = os.fdopen(fd, "wb")
+        self._changed = threading.Condition()
+        self.size = 0
+        self.complete = False
+        self.error: Optional[Exception] = None
+
+    def append(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+        self._file.flush()
+        with self._changed:
+            self.size += len(chunk)
+            self._changed.notify_all()
+
+    def finish(self, error: Optional[Exception] = None) -> None:
+        """Mark the body as received, or as broken off by ``error``"""
+        self._file.close()
+        with self._changed:
+            self.complete = True
+            self.error = error
+            self._changed.notify_all()
+
+    def wait(self, offset: int, stopped: threading.Event) -> bool:
+        """Block until there is data past ``offset``; False once the body has ended there"""
+        with self._changed:
+            while self.size <= offset and not self.complete and not stopped.is_set():
+                self._changed.wait(0.1)
+            if stopped.is_set():
+                raise ArchiveClosed()
+            if self.size > offset:
+                return True
+            if self.error is not None:
+                raise BodyReadError(str(self.error)) from self.error
+            return False
+
+    def wait_complete(self, stopped: threading.Event) -> None:
+        """Block until the whole body has been received"""
+        while self.wait(self.size, stopped):
+            pass
+
+    def reader(self, stopped: threading.Event) -> BinaryIO:
+        return io.BufferedReader(SpooledBodyReader(self, stopped), SPOOL_CHUNK_BYTES)
+
+    def close(self) -> None:
+        """Delete the spooled body"""
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class SpooledBodyReader(io.RawIOBase):
+    """Blocking file object over a SpooledBody that may still be growing"""
+
+    def __init__(self, body: SpooledBody, stopped: threading.Event):
+        self.body = body
+        self.stopped = stopped
+        self.file = open(body.path, "rb")
+        self.offset = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self.body.wait(self.offset, self.stopped):
+            return 0
+        size = self.file.readinto(buffer)
+        self.offset += size
+        return size
+
+    def close(self) -> None:
+        self.file.close()
+        super().close()
+
+
+def iter_zip_members(path: str) -> Iterator[Tuple[str, Callable[[], BinaryIO]]]:
+    """Yield the name and opener of each file in a zip archive"""
+    try:
+        archive = zipfile.ZipFile(path)
+    except zipfile.BadZipFile as e:
+        raise HTTPException(status_code=400, detail=f"Invalid zip archive: {str(e)}")
+    with archive:
+        for info in archive.infolist():
+            if not info.is_dir():
+                yield info.filename, functools.partial(archive.open, info)
+
+
+def iter_tar_members(stream: BinaryIO) -> Iterator[Tuple[str, Callable[[], BinaryIO]]]:
+    """Read a tar archive as a stream and yield the name and opener of each regular file, in order"""
+    try:
+        archive = tarfile.open(fileobj=stream, mode="r|*")
+    except tarfile.TarError:
+        raise HTTPException(status_code=400, detail="Request body is not a zip or tar archive")
+    with archive:
+        while True:
+            try:
+                info = archive.next()
+            except tarfile.TarError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid tar archive: {str(e)}")
+            if info is None:
+                return
+            if info.isfile():
+                # Only valid until the next member is read
+                yield info.name, functools.partial(archive.extractfile, info)
+
+
+class ArchiveStream:
+    """
+    The PDF members of an archive request body, spooled one at a time
+
+    Iterate ``members()`` to receive them in archive order, and ``close()``
+    when done. ``skipped`` counts the files passed over because they are not
+    PDFs, and ``disconnected`` is set when the client goes away, also after
+    the whole body has been read.
+    """
+
+    def __init__(self, request: Request, max_members: int = ARCHIVE_MAX_MEMBERS,
+                 read_ahead: int = ARCHIVE_READ_AHEAD):
+        self.request = request
+        self.max_members = max_members
+        self.skipped = 0
+        self.disconnected = asyncio.Event()
+        self._stopped = threading.Event()
+        self._body: Optional[SpooledBody] = None
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, read_ahead))
+        self._receiver: Optional[asyncio.Future] = None
+        self._reader: Optional[asyncio.Future] = None
+
+    async def _receive(self) -> None:
+        """Copy the body to disk as it arrives, then watch the connection for a disconnect"""
+        try:
+            async for chunk in self.request.stream():
+                self._body.append(chunk)
+        except Exception as e:
+            # A disconnect, or the body is over the request size limit
+            self._body.finish(e)
+            if isinstance(e, ClientDisconnect):
+                self.disconnected.set()
+            return
+        self._body.finish()
+        # Nothing else reads from the connection now that the body is in
+        while (await self.request.receive())["type"] != "http.disconnect":
+            pass
+        self.disconnected.set()
+
+    def _emit(self, member: ArchiveMember) -> None:
+        if self._stopped.is_set():
+            member.close()
+            raise ArchiveClosed()
+        anyio.from_thread.run(self._queue.put, member)
+
+    def _read(self) -> None:
+        """Spool each PDF member and hand it to the event loop; runs in a worker thread"""
+        with self._body.reader(self._stopped) as stream:
+            if stream.peek(len(ZIP_SIGNATURES[0]))[:len(ZIP_SIGNATURES[0])] in ZIP_SIGNATURES:
+                self._body.wait_complete(self._stopped)
+                files = iter_zip_members(self._body.path)
+            else:
+                files = iter_tar_members(stream)
+            count = 0
+            for name, open_member in files:
+                if not name.lower().endswith('.pdf') or name.startswith(MACOS_METADATA_DIR):
+                    self.skipped += 1
+                    continue
+                count += 1
+                if self.max_members and count > self.max_members:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Too many PDF files in the archive. Maximum allowed is {self.max_members}"
+                    )
+                try:
+                    with open_member() as member_stream:
+                        member = ArchiveMember(name, upload=spool_stream(name, member_stream, MAX_UPLOAD_BYTES))
+                except (BodyReadError, ArchiveClosed):
+                    raise
+                except HTTPException as e:
+                    member = ArchiveMember(name, error=e.detail)
+                except Exception as e:
+                    # Encrypted or corrupt member; the rest of the archive may still be fine
+                    member = ArchiveMember(name, error=str(e))
+                self._emit(member)
+
+    async def members(self) -> AsyncIterator[ArchiveMember]:
+        """
+        Yield PDF members as they are read; the caller owns (and closes) each one
+
+        Raises HTTPException for an invalid archive or too many members, and
+        the original exception (e.g. ClientDisconnect) when receiving the
+        body fails.
+        """
+        self._body = SpooledBody()
+        self._receiver = asyncio.ensure_future(self._receive())
+        self._reader = asyncio.ensure_future(run_in_threadpool(self._read))
+        try:
+            while True:
+                if not self._queue.empty():
+                    yield self._queue.get_nowait()
+                    continue
+                if self._reader.done():
+                    break
+                getter = asyncio.ensure_future(self._queue.get())
+                try:
+                    await asyncio.wait({getter, self._reader}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    if not getter.done():
+                        getter.cancel()
+                if getter.done() and not getter.cancelled():
+                    yield getter.result()
+            try:
+                self._reader.result()
+            except BodyReadError as e:
+                raise e.__cause__
+        finally:
+            await self._stop_reading()
+
+    async def _stop_reading(self) -> None:
+        """Stop the reading thread and delete the members nobody picked up"""
+        self._stopped.set()
+        if self._reader is None:
+            return
+        while True:
+            while not self._queue.empty():
+                self._queue.get_nowait().close()
+            if self._reader.done():
+                break
+            # The reading thread may be blocked handing over a member
+            await asyncio.wait({self._reader}, timeout=0.1)
+        if not self._reader.cancelled():
+            self._reader.exception()
+
+    async def close(self) -> None:
+        """Stop receiving and reading and delete the spooled body"""
+        await self._stop_reading()
+        if self._receiver is not None:
+            self._receiver.cancel()
+        if self._body is not None:
+            self._body.close()
+
+
+class RequestStreamingResponse(StreamingResponse):
+    """
+    A StreamingResponse for a body iterator that reads the request body
+
+    StreamingResponse listens on ``receive`` for a disconnect while it
+    streams, which would take the request body away from the iterator. This
+    one leaves ``receive`` to the iterator, which notices a disconnect
+    itself.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
@@ -0,0 +1,6 @@
+"""
+Offline benchmarks for the PDF Text Extractor.
+
+``benchmarks.corpus`` writes a deterministic synthetic PDF corpus and
+``benchmarks.engines`` measures the extraction engines against it.
+"""
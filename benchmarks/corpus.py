@@ -0,0 +1,272 @@
+"""
+Deterministic synthetic PDF corpus.
+
+The PDFs are written directly with a minimal PDF writer so the corpus needs
+no extra dependency and is byte-for-byte identical for a given seed: there
+are no timestamps or random document ids.
+
+    python -m benchmarks.corpus --output benchmarks/corpus
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import zlib
+from typing import Callable, Dict, List, Tuple
+
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+MARGIN = 54
+
+# The standard 14 fonts minus Symbol and ZapfDingbats, which have no Latin text
+STANDARD_FONTS = (
+    "Helvetica", "Helvetica-Bold", "Helvetica-Oblique", "Helvetica-BoldOblique",
+    "Times-Roman", "Times-Bold", "Times-Italic", "Times-BoldItalic",
+    "Courier", "Courier-Bold", "Courier-Oblique", "Courier-BoldOblique",
+)
+
+WORDS = (
+    "invoice", "amount", "total", "period", "account", "balance", "report", "quarter", "revenue",
+    "customer", "service", "contract", "payment", "delivery", "schedule", "order", "number", "date",
+    "the", "of", "and", "to", "in", "for", "with", "on", "by", "from", "at", "as", "is", "was",
+    "document", "section", "page", "table", "figure", "summary", "analysis", "result", "value",
+    "extraction", "layout", "column", "row", "header", "footer", "reference", "appendix", "note",
+)
+
+
+def escape_text(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+class PDFWriter:
+    """Just enough of the PDF format to write text, ruled lines, images and forms"""
+
+    def __init__(self, fonts: Tuple[str, ...] = ("Helvetica",)):
+        self.objects: List[bytes] = []
+        self.pages: List[int] = []
+        self._pages_id = self._reserve()
+        self.font_names = {}
+        for index, font in enumerate(fonts, start=1):
+            font_id = self.add(
+                f"<< /Type /Font /Subtype /Type1 /BaseFont /{font} /Encoding /WinAnsiEncoding >>".encode()
+            )
+            self.font_names[font] = (f"F{index}", font_id)
+
+    def _reserve(self) -> int:
+        self.objects.append(b"")
+        return len(self.objects)
+
+    def add(self, body: bytes) -> int:
+        self.objects.append(body)
+        return len(self.objects)
+
+    def add_stream(self, data: bytes, extra: str = "", compress: bool = False) -> int:
+        if compress:
+            data = zlib.compress(data, 6)
+            extra += " /Filter /FlateDecode"
+        return self.add(f"<< /Length {len(data)}{extra} >>\nstream\n".encode() + data + b"\nendstream")
+
+    def _resources(self, xobjects: Dict[str, int] = None) -> str:
+        fonts = " ".join(f"/{name} {font_id} 0 R" for name, font_id in self.font_names.values())
+        xobjects = " ".join(f"/{name} {xobject_id} 0 R" for name, xobject_id in (xobjects or {}).items())
+        return f"<< /Font << {fonts} >> /XObject << {xobjects} >> >>"
+
+    def add_page(self, content: str, images: Dict[str, int] = None) -> None:
+        contents_id = self.add_stream(content.encode("latin-1"), compress=True)
+        self.pages.append(self.add(
+            f"<< /Type /Page /Parent {self._pages_id} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources {self._resources(images)} /Contents {contents_id} 0 R >>".encode()
+        ))
+
+    def add_form(self, content: str, forms: Dict[str, int] = None) -> int:
+        return self.add_stream(
+            content.encode("latin-1"),
+            f" /Type /XObject /Subtype /Form /BBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources {self._resources(forms)}",
+            compress=True
+        )
+
+    def add_gray_image(self, width: int, height: int, pixels: bytes) -> int:
+        return self.add_stream(
+            pixels,
+            f" /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+            f"/ColorSpace /DeviceGray /BitsPerComponent 8",
+            compress=True
+        )
+
+    def font(self, name: str) -> str:
+        return self.font_names[name][0]
+
+    def tobytes(self) -> bytes:
+        kids = " ".join(f"{page_id} 0 R" for page_id in self.pages)
+        self.objects[self._pages_id - 1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>".encode()
+        catalog_id = self.add(f"<< /Type /Catalog /Pages {self._pages_id} 0 R >>".encode())
+
+        out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for number, body in enumerate(self.objects, start=1):
+            offsets.append(len(out))
+            out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+        xref_offset = len(out)
+        out += f"xref\n0 {len(self.objects) + 1}\n0000000000 65535 f \n".encode()
+        for offset in offsets:
+            out += f"{offset:010d} 00000 n \n".encode()
+        out += (
+            f"trailer\n<< /Size {len(self.objects) + 1} /Root {catalog_id} 0 R >>\n"
+            f"startxref\n{xref_offset}\n%%EOF\n"
+        ).encode()
+        return bytes(out)
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def text_lines(writer: PDFWriter, lines: List[str], x: float, top: float, font: str = "Helvetica",
+               size: float = 10, leading: float = 13) -> str:
+    parts = [f"BT /{writer.font(font)} {size} Tf {leading} TL {x} {top} Td"]
+    for line in lines:
+        parts.append(f"({escape_text(line)}) Tj T*")
+    parts.append("ET")
+    return "\n".join(parts)
+
+
+def text_pages(rng: random.Random, pages: int) -> bytes:
+    writer = PDFWriter()
+    for _ in range(pages):
+        lines = [sentence(rng, rng.randint(8, 13)) for _ in range(52)]
+        writer.add_page(text_lines(writer, lines, MARGIN, PAGE_HEIGHT - MARGIN))
+    return writer.tobytes()
+
+
+def multi_column(rng: random.Random, pages: int, columns: int = 3) -> bytes:
+    writer = PDFWriter()
+    column_width = (PAGE_WIDTH - 2 * MARGIN) / columns
+    for _ in range(pages):
+        content = []
+        for column in range(columns):
+            lines = [sentence(rng, rng.randint(3, 5)) for _ in range(60)]
+            content.append(text_lines(writer, lines, MARGIN + column * column_width,
+                                      PAGE_HEIGHT - MARGIN, size=8, leading=11))
+        writer.add_page("\n".join(content))
+    return writer.tobytes()
+
+
+def table_heavy(rng: random.Random, pages: int, rows: int = 40, columns: int = 6) -> bytes:
+    writer = PDFWriter(("Helvetica", "Helvetica-Bold"))
+    cell_width = (PAGE_WIDTH - 2 * MARGIN) / columns
+    row_height = (PAGE_HEIGHT - 2 * MARGIN) / rows
+    for _ in range(pages):
+        content = ["0.5 w"]
+        for row in range(rows + 1):
+            y = PAGE_HEIGHT - MARGIN - row * row_height
+            content.append(f"{MARGIN} {y:.2f} m {PAGE_WIDTH - MARGIN} {y:.2f} l S")
+        for column in range(columns + 1):
+            x = MARGIN + column * cell_width
+            content.append(f"{x:.2f} {MARGIN} m {x:.2f} {PAGE_HEIGHT - MARGIN} l S")
+        for row in range(rows):
+            font = "Helvetica-Bold" if row == 0 else "Helvetica"
+            y = PAGE_HEIGHT - MARGIN - (row + 1) * row_height + 4
+            for column in range(columns):
+                if row == 0:
+                    cell = rng.choice(WORDS).upper()
+                elif column == 0:
+                    cell = rng.choice(WORDS)
+                else:
+                    cell = f"{rng.uniform(0, 100000):,.2f}"
+                content.append(
+                    f"BT /{writer.font(font)} 8 Tf {MARGIN + column * cell_width + 3:.2f} {y:.2f} Td "
+                    f"({escape_text(cell)}) Tj ET"
+                )
+        writer.add_page("\n".join(content))
+    return writer.tobytes()
+
+
+def many_fonts(rng: random.Random, pages: int) -> bytes:
+    writer = PDFWriter(STANDARD_FONTS)
+    for _ in range(pages):
+        content = []
+        top = PAGE_HEIGHT - MARGIN
+        for line in range(48):
+            font = STANDARD_FONTS[line % len(STANDARD_FONTS)]
+            size = 8 + (line % 4)
+            content.append(
+                f"BT /{writer.font(font)} {size} Tf {MARGIN} {top:.2f} Td ({escape_text(sentence(rng, 9))}) Tj ET"
+            )
+            top -= size + 4
+        writer.add_page("\n".join(content))
+    return writer.tobytes()
+
+
+def image_only(rng: random.Random, pages: int, size: int = 400) -> bytes:
+    writer = PDFWriter()
+    for _ in range(pages):
+        # Noisy grey levels compress poorly, like a real scan
+        pixels = rng.randbytes(size * size)
+        image_id = writer.add_gray_image(size, size, pixels)
+        writer.add_page(f"q {PAGE_WIDTH - 2 * MARGIN} 0 0 {PAGE_HEIGHT - 2 * MARGIN} {MARGIN} {MARGIN} cm /Im1 Do Q",
+                        {"Im1": image_id})
+    return writer.tobytes()
+
+
+def nested_forms(rng: random.Random, pages: int, depth: int = 3) -> bytes:
+    writer = PDFWriter()
+    for _ in range(pages):
+        lines = [sentence(rng, rng.randint(8, 13)) for _ in range(52)]
+        # The text is only drawn by the innermost of ``depth`` nested forms.
+        # pdfminer drops a stream's last operator when no whitespace follows it
+        form_id = writer.add_form(text_lines(writer, lines, MARGIN, PAGE_HEIGHT - MARGIN) + "\n")
+        for _ in range(depth - 1):
+            form_id = writer.add_form("/Fm1 Do\n", {"Fm1": form_id})
+        writer.add_page("/Fm1 Do\n", {"Fm1": form_id})
+    return writer.tobytes()
+
+
+# Document name -> (generator, default page count)
+DOCUMENTS: Dict[str, Tuple[Callable[[random.Random, int], bytes], int]] = {
+    "text_only": (text_pages, 20),
+    "multi_column": (multi_column, 10),
+    "table_heavy": (table_heavy, 10),
+    "many_fonts": (many_fonts, 10),
+    "large": (text_pages, 500),
+    "image_only": (image_only, 10),
+    "nested_forms": (nested_forms, 10),
+}
+
+
+def build_corpus(output_dir: str, seed: int = 0, large_pages: int = None) -> Dict[str, Dict]:
+    """Write every corpus document to ``output_dir``; return name -> {path, pages, bytes, sha256}"""
+    os.makedirs(output_dir, exist_ok=True)
+    corpus = {}
+    for name, (generator, pages) in DOCUMENTS.items():
+        if name == "large" and large_pages:
+            pages = large_pages
+        # Seed per document so changing one document does not change the others
+        data = generator(random.Random(f"{seed}:{name}"), pages)
+        path = os.path.join(output_dir, f"{name}.pdf")
+        with open(path, "wb") as f:
+            f.write(data)
+        corpus[name] = {
+            "path": path,
+            "pages": pages,
+            "bytes": len(data),
+            "sha256": hashlib.sha256(data).hexdigest()
+        }
+    return corpus
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Write the synthetic benchmark corpus")
+    parser.add_argument("--output", default=os.path.join(os.path.dirname(__file__), "corpus"),
+                        help="Directory to write the PDFs to")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed")
+    parser.add_argument("--large-pages", type=int, default=None, help="Page count of the 'large' document")
+    args = parser.parse_args()
+
+    for name, document in build_corpus(args.output, args.seed, args.large_pages).items():
+        print(f"{name:14} {document['pages']:5} pages {document['bytes']:10} bytes  {document['sha256'][:16]}")
+
+
+if __name__ == "__main__":
+    main()
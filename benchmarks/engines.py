@@ -0,0 +1,228 @@
+"""
+Benchmark the extraction engines against the synthetic corpus.
+
+Every (document, engine) case runs in a fresh worker process so its peak RSS
+is its own. Results are written as JSON and compared against a stored
+baseline; any regression beyond the tolerance makes the run exit non-zero.
+
+    python -m benchmarks.engines                    # run and compare with benchmarks/baseline.json
+    python -m benchmarks.engines --save-baseline    # run and store the result as the new baseline
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+from benchmarks.corpus import DOCUMENTS, build_corpus
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+DEFAULT_OUTPUT = os.path.join(BENCHMARK_DIR, "results.json")
+DEFAULT_CORPUS_DIR = os.path.join(BENCHMARK_DIR, "corpus")
+
+ENGINES = ("pypdf2", "pdfplumber", "pdfminer", "advanced", "auto")
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    return {
+        "p50": round(percentile(seconds, 0.50) * 1000, 3),
+        "p95": round(percentile(seconds, 0.95) * 1000, 3),
+        "p99": round(percentile(seconds, 0.99) * 1000, 3),
+        "mean": round(sum(seconds) / len(seconds) * 1000, 3) if seconds else 0.0
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_case(engine: str, path: str, repeat: int, warmup: int) -> Dict[str, Any]:
+    """Extract ``path`` ``repeat`` times with ``engine`` after ``warmup`` unmeasured runs; runs in a fresh process"""
+    repo_dir = os.path.dirname(BENCHMARK_DIR)
+    if repo_dir not in sys.path:
+        sys.path.insert(0, repo_dir)
+    import main
+    from metrics import call_with_timings
+
+    extract = {
+        "pypdf2": main.extract_text_with_pypdf2,
+        "pdfplumber": main.extract_text_with_pdfplumber,
+        "pdfminer": main.extract_text_with_pdfminer,
+        "advanced": main.extract_text_advanced_with_pdfplumber,
+        "auto": main.extract_text_auto,
+    }[engine]
+
+    rss_before = peak_rss_mb()
+    for _ in range(warmup):
+        extract(path)
+    durations = []
+    page_seconds = []
+    pages = 0
+    characters = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result, timings = call_with_timings(extract, path)
+        durations.append(time.perf_counter() - started)
+        page_seconds.extend(seconds for _, _, seconds, page in timings if page is not None)
+        pages = result["pages"]
+        characters = len(result["text"])
+
+    return {
+        "pages": pages,
+        "characters": characters,
+        "runs": repeat,
+        "pages_per_sec": round(pages * repeat / sum(durations), 2),
+        "latency_ms": latency_summary(durations),
+        "page_latency_ms": latency_summary(page_seconds),
+        "rss_before_mb": rss_before,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def run_benchmarks(corpus: Dict[str, Dict], engines: List[str], repeat: int,
+                   warmup: int) -> List[Dict[str, Any]]:
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for name, document in corpus.items():
+        for engine in engines:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                case = executor.submit(run_case, engine, document["path"], repeat, warmup).result()
+            results.append({"document": name, "engine": engine, **case})
+            print(
+                f"{name:14} {engine:11} {case['pages_per_sec']:9.1f} pages/s  "
+                f"p50 {case['latency_ms']['p50']:9.1f} ms  p95 {case['latency_ms']['p95']:9.1f} ms  "
+                f"page p95 {case['page_latency_ms']['p95']:7.2f} ms  peak RSS {case['peak_rss_mb']:7.1f} MB",
+                flush=True
+            )
+    return results
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float,
+            rss_tolerance: float) -> List[str]:
+    """Return a description of every regression of ``results`` against ``baseline``"""
+    regressions = []
+    for name, document in results["corpus"].items():
+        expected = baseline["corpus"].get(name)
+        if expected is not None and expected["sha256"] != document["sha256"]:
+            regressions.append(f"{name}: corpus document differs from the baseline's, results are not comparable")
+
+    baseline_cases = {(case["document"], case["engine"]): case for case in baseline["results"]}
+    for case in results["results"]:
+        expected = baseline_cases.get((case["document"], case["engine"]))
+        if expected is None:
+            continue
+        label = f"{case['document']}/{case['engine']}"
+        # Text a change stops finding makes the case faster, so it is checked first
+        if case["characters"] < expected.get("characters", 0):
+            regressions.append(
+                f"{label}: {case['characters']} characters extracted, baseline {expected['characters']}"
+            )
+        if case["pages_per_sec"] < expected["pages_per_sec"] * (1 - tolerance):
+            regressions.append(
+                f"{label}: {case['pages_per_sec']} pages/s, baseline {expected['pages_per_sec']} pages/s"
+            )
+        if case["latency_ms"]["p95"] > expected["latency_ms"]["p95"] * (1 + tolerance):
+            regressions.append(
+                f"{label}: p95 latency {case['latency_ms']['p95']} ms, baseline {expected['latency_ms']['p95']} ms"
+            )
+        if case["peak_rss_mb"] > expected["peak_rss_mb"] * (1 + rss_tolerance):
+            regressions.append(
+                f"{label}: peak RSS {case['peak_rss_mb']} MB, baseline {expected['peak_rss_mb']} MB"
+            )
+    return regressions
+
+
+def package_version(name: str) -> str:
+    try:
+        from importlib.metadata import version
+        return version(name)
+    except Exception:
+        return "unknown"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the extraction engines on the synthetic corpus")
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR, help="Directory the corpus is written to")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed")
+    parser.add_argument("--large-pages", type=int, default=None, help="Page count of the 'large' document")
+    parser.add_argument("--documents", default=",".join(DOCUMENTS), help="Comma-separated corpus documents")
+    parser.add_argument("--engines", default=",".join(ENGINES), help="Comma-separated engines")
+    parser.add_argument("--repeat", type=int, default=3, help="Extractions of each document per engine")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured extractions before the measured ones")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Where to write the results")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed throughput/latency regression as a fraction (default: 0.2)")
+    parser.add_argument("--rss-tolerance", type=float, default=0.2,
+                        help="Allowed peak RSS regression as a fraction (default: 0.2)")
+    args = parser.parse_args()
+
+    documents = [name.strip() for name in args.documents.split(",") if name.strip()]
+    engines = [name.strip() for name in args.engines.split(",") if name.strip()]
+    unknown = [name for name in documents if name not in DOCUMENTS] + [name for name in engines if name not in ENGINES]
+    if unknown:
+        parser.error(f"Unknown documents or engines: {', '.join(unknown)}")
+
+    corpus = build_corpus(args.corpus_dir, args.seed, args.large_pages)
+    corpus = {name: corpus[name] for name in documents}
+
+    results = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "PyPDF2": package_version("PyPDF2"),
+            "pdfplumber": package_version("pdfplumber"),
+            "pdfminer.six": package_version("pdfminer.six"),
+        },
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "warmup": args.warmup,
+        "corpus": {name: {key: value for key, value in document.items() if key != "path"}
+                   for name, document in corpus.items()},
+        "results": run_benchmarks(corpus, engines, args.repeat, args.warmup)
+    }
+
+    output = args.baseline if args.save_baseline else args.output
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+    if args.save_baseline:
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance, args.rss_tolerance)
+    if regressions:
+        print(f"\nREGRESSIONS against {args.baseline}:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+    print(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
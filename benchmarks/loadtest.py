@@ -0,0 +1,295 @@
+"""
+End-to-end HTTP load test.
+
+Starts the API with uvicorn (or targets ``--url``), then drives a weighted
+mix of extraction endpoints with the synthetic corpus at each concurrency
+level for a fixed duration. Reports throughput, latency percentiles and
+error rates per level and endpoint, and samples the server's RSS (the
+uvicorn process plus its extraction workers) over time.
+
+    python -m benchmarks.loadtest --concurrency 1,4,16 --duration 30
+
+Needs ``httpx`` (``pip install -r benchmarks/requirements.txt``).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.corpus import DOCUMENTS, build_corpus
+from benchmarks.engines import BENCHMARK_DIR, DEFAULT_CORPUS_DIR, latency_summary
+
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+DEFAULT_OUTPUT = os.path.join(BENCHMARK_DIR, "loadtest.json")
+
+# Endpoint name -> path; the batch endpoints receive --batch-size files per request
+ENDPOINTS = {
+    "extract-text": "/extract-text",
+    "extract-text-advanced": "/extract-text-advanced",
+    "extract-text-batch": "/extract-text-batch",
+    "extract-text-batch-advanced": "/extract-text-batch-advanced",
+    "extract-text-batch-stream": "/extract-text-batch-stream",
+}
+DEFAULT_MIX = "extract-text=4,extract-text-advanced=2,extract-text-batch=1,extract-text-batch-stream=1"
+# The large document takes minutes with pdfplumber; leave it out unless asked for
+DEFAULT_DOCUMENTS = "text_only,multi_column,table_heavy,many_fonts,image_only"
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{name}'. Use one of: {', '.join(ENDPOINTS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def process_tree_rss_mb(pid: int) -> Optional[float]:
+    """RSS of ``pid`` and all of its descendants, read from /proc (Linux only)"""
+    children: Dict[int, List[int]] = {}
+    rss_kb: Dict[int, int] = {}
+    try:
+        entries = os.listdir("/proc")
+    except FileNotFoundError:
+        return None
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/status") as f:
+                status = dict(line.split(":", 1) for line in f if ":" in line)
+        except OSError:
+            continue
+        children.setdefault(int(status["PPid"].strip()), []).append(int(entry))
+        rss_kb[int(entry)] = int(status.get("VmRSS", "0 kB").split()[0])
+
+    total = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        total += rss_kb.get(current, 0)
+        stack.extend(children.get(current, []))
+    return round(total / 1024, 1) if pid in rss_kb else None
+
+
+def start_server(port: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=REPO_DIR
+    )
+
+
+async def wait_for_server(client: httpx.AsyncClient, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not become healthy")
+
+
+class LoadGenerator:
+    """Virtual users sending weighted random requests until the deadline"""
+
+    def __init__(self, client: httpx.AsyncClient, documents: List[Tuple[str, bytes]], mix: Dict[str, float],
+                 batch_size: int, use_cache: bool, seed: int):
+        self.client = client
+        self.documents = documents
+        self.endpoints = list(mix)
+        self.weights = [mix[name] for name in self.endpoints]
+        self.batch_size = batch_size
+        self.use_cache = use_cache
+        self.rng = random.Random(seed)
+        # (endpoint, latency seconds, status code or None, error message or None)
+        self.samples: List[Tuple[str, float, Optional[int], Optional[str]]] = []
+
+    async def send(self, endpoint: str) -> Tuple[Optional[int], Optional[str]]:
+        path = ENDPOINTS[endpoint]
+        data = {"use_cache": str(self.use_cache).lower()}
+        if endpoint.startswith("extract-text-batch"):
+            picked = [self.rng.choice(self.documents) for _ in range(self.batch_size)]
+            files = [("files", (name, content, "application/pdf")) for name, content in picked]
+            data["max_files"] = str(self.batch_size)
+        else:
+            name, content = self.rng.choice(self.documents)
+            files = {"file": (name, content, "application/pdf")}
+
+        if endpoint == "extract-text-batch-stream":
+            async with self.client.stream("POST", path, files=files, data=data) as response:
+                async for line in response.aiter_lines():
+                    if line and json.loads(line).get("success") is False:
+                        return response.status_code, "file failed in stream"
+                return response.status_code, None if response.status_code < 400 else response.reason_phrase
+
+        response = await self.client.post(path, files=files, data=data)
+        if response.status_code >= 400:
+            return response.status_code, response.text[:200]
+        return response.status_code, None
+
+    async def user(self, deadline: float) -> None:
+        while time.monotonic() < deadline:
+            endpoint = self.rng.choices(self.endpoints, self.weights)[0]
+            started = time.perf_counter()
+            try:
+                status, error = await self.send(endpoint)
+            except httpx.HTTPError as e:
+                status, error = None, f"{type(e).__name__}: {e}"
+            self.samples.append((endpoint, time.perf_counter() - started, status, error))
+
+    async def run(self, concurrency: int, duration: float) -> None:
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*(self.user(deadline) for _ in range(concurrency)))
+
+
+def summarise(samples: List[Tuple[str, float, Optional[int], Optional[str]]], elapsed: float) -> Dict[str, Any]:
+    errors = [sample for sample in samples if sample[3] is not None]
+    return {
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "error_rate": round(len(errors) / len(samples), 4) if samples else 0.0,
+        "latency_ms": latency_summary([sample[1] for sample in samples]),
+        "sample_errors": sorted({f"{sample[2]}: {sample[3]}" for sample in errors})[:5]
+    }
+
+
+async def sample_rss(pid: int, interval: float, started: float, timeline: List[Dict[str, float]],
+                     stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        rss = process_tree_rss_mb(pid)
+        if rss is not None:
+            timeline.append({"t": round(time.monotonic() - started, 2), "rss_mb": rss})
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_load_test(args: argparse.Namespace) -> Dict[str, Any]:
+    mix = parse_mix(args.mix)
+    corpus = build_corpus(args.corpus_dir, args.seed)
+    documents = []
+    for name in args.documents.split(","):
+        with open(corpus[name.strip()]["path"], "rb") as f:
+            documents.append((f"{name.strip()}.pdf", f.read()))
+
+    server = None
+    base_url = args.url
+    server_pid = args.server_pid
+    if base_url is None:
+        port = free_port()
+        server = start_server(port)
+        base_url = f"http://127.0.0.1:{port}"
+        server_pid = server.pid
+
+    limits = httpx.Limits(max_connections=max(args.concurrency_levels), max_keepalive_connections=None)
+    started = time.monotonic()
+    timeline: List[Dict[str, float]] = []
+    stop = asyncio.Event()
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+            await wait_for_server(client)
+            sampler = asyncio.create_task(sample_rss(server_pid, args.rss_interval, started, timeline, stop)) \
+                if server_pid else None
+
+            levels = []
+            for concurrency in args.concurrency_levels:
+                generator = LoadGenerator(client, documents, mix, args.batch_size, args.use_cache, args.seed)
+                level_started = time.monotonic()
+                await generator.run(concurrency, args.duration)
+                elapsed = time.monotonic() - level_started
+                level_rss = [point["rss_mb"] for point in timeline
+                             if level_started - started <= point["t"] <= level_started - started + elapsed]
+                level = {
+                    "concurrency": concurrency,
+                    "duration_s": round(elapsed, 2),
+                    **summarise(generator.samples, elapsed),
+                    "peak_rss_mb": max(level_rss) if level_rss else None,
+                    "endpoints": {
+                        endpoint: summarise([sample for sample in generator.samples if sample[0] == endpoint], elapsed)
+                        for endpoint in mix
+                    }
+                }
+                levels.append(level)
+                print(
+                    f"concurrency {concurrency:4}: {level['throughput_rps']:8.2f} req/s  "
+                    f"p50 {level['latency_ms']['p50']:9.1f} ms  p95 {level['latency_ms']['p95']:9.1f} ms  "
+                    f"p99 {level['latency_ms']['p99']:9.1f} ms  errors {level['error_rate']:.2%}  "
+                    f"peak RSS {level['peak_rss_mb']} MB",
+                    flush=True
+                )
+
+            stop.set()
+            if sampler is not None:
+                await sampler
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "url": base_url,
+        "mix": mix,
+        "documents": [name for name, _ in documents],
+        "batch_size": args.batch_size,
+        "use_cache": args.use_cache,
+        "levels": levels,
+        "rss_timeline": timeline
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the extraction API")
+    parser.add_argument("--url", default=None, help="Target an already running server instead of starting one")
+    parser.add_argument("--server-pid", type=int, default=None, help="PID of the --url server, to sample its RSS")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per concurrency level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted endpoints, e.g. 'extract-text=3,extract-text-batch=1'")
+    parser.add_argument("--documents", default=DEFAULT_DOCUMENTS, help="Comma-separated corpus documents to upload")
+    parser.add_argument("--batch-size", type=int, default=4, help="Files per batch request")
+    parser.add_argument("--use-cache", action="store_true", help="Let the server answer repeated uploads from its cache")
+    parser.add_argument("--timeout", type=float, default=300, help="Per-request timeout in seconds")
+    parser.add_argument("--rss-interval", type=float, default=1.0, help="Seconds between RSS samples")
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR, help="Directory the corpus is written to")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus and request mix seed")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Where to write the report")
+    args = parser.parse_args()
+
+    try:
+        parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    unknown = [name for name in args.documents.split(",") if name.strip() not in DOCUMENTS]
+    if unknown:
+        parser.error(f"Unknown documents: {', '.join(unknown)}")
+    args.concurrency_levels = [int(level) for level in args.concurrency.split(",")]
+
+    report = asyncio.run(run_load_test(args))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Time and page budgets for extractions.
+
+Each extraction gets a wall-clock deadline, a per-page time limit and a
+maximum number of pages. Inside the worker every page is extracted under an
+interval timer, so a page that runs too long is interrupted and the pages
+done so far are returned. If a worker does not come back at all (stuck in C
+code, swapping), the server kills that worker process once the deadline
+plus a grace period has passed.
+"""
+
+import contextlib
+import os
+import signal
+import threading
+import time
+from typing import Iterator, Optional
+
+# Wall-clock budget of one extraction request in seconds (0 = unlimited)
+REQUEST_TIMEOUT = float(os.getenv("PDF_REQUEST_TIMEOUT", "300"))
+# Time budget of a single page in seconds (0 = unlimited)
+PAGE_TIMEOUT = float(os.getenv("PDF_PAGE_TIMEOUT", "60"))
+# Maximum number of pages extracted per document (0 = unlimited)
+MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "0"))
+# Extra time a worker gets past the deadline before it is killed
+KILL_GRACE = float(os.getenv("PDF_KILL_GRACE", "5"))
+# Seconds /inspect may take, waiting for a worker included, before its worker is killed (0 = unlimited)
+INSPECT_TIMEOUT = float(os.getenv("PDF_INSPECT_TIMEOUT", "30"))
+
+STATUS_COMPLETE = "complete"
+STATUS_TIMEOUT = "timeout"
+STATUS_PAGE_TIMEOUT = "page_timeout"
+STATUS_PAGE_LIMIT = "page_limit"
+
+
+class BudgetExceeded(BaseException):
+    """
+    Raised inside a worker when a page runs out of time
+
+    Derives from BaseException so the ``except Exception`` blocks inside the
+    PDF libraries do not swallow it.
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Budget:
+    """Limits of one extraction; the deadline starts counting when it is created"""
+
+    def __init__(self, timeout: float = REQUEST_TIMEOUT, page_timeout: float = PAGE_TIMEOUT,
+                 max_pages: int = MAX_PAGES):
+        self.deadline = time.time() + timeout if timeout > 0 else None
+        self.page_timeout = page_timeout if page_timeout > 0 else None
+        self.max_pages = max_pages if max_pages > 0 else None
+
+    def kill_timeout(self) -> Optional[float]:
+        """Seconds left before a worker still running for this extraction is killed"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline + KILL_GRACE - time.time())
+
+
+@contextlib.contextmanager
+def page_budget(budget: Optional[Budget]) -> Iterator[None]:
+    """
+    Raise BudgetExceeded if the enclosed page extraction runs out of time
+
+    Uses SIGALRM, so it only takes effect in the main thread of a worker
+    process; elsewhere the page runs unbounded and only the server-side
+    deadline applies.
+    """
+    if budget is None or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    limits = []
+    if budget.page_timeout is not None:
+        limits.append((budget.page_timeout, STATUS_PAGE_TIMEOUT))
+    if budget.deadline is not None:
+        limits.append((budget.deadline - time.time(), STATUS_TIMEOUT))
+    if not limits:
+        yield
+        return
+
+    seconds, reason = min(limits)
+    if seconds <= 0:
+        raise BudgetExceeded(reason)
+
+    def interrupt(signum, frame):
+        raise BudgetExceeded(reason)
+
+    previous = signal.signal(signal.SIGALRM, interrupt)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
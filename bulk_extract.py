@@ -0,0 +1,328 @@
+"""
+Offline bulk extraction without the HTTP server.
+
+Walks files, directories and glob patterns for PDFs, extracts them across a
+pool of worker processes with the same functions the API uses and writes one
+JSON line per document (or per page with ``--per-page``) to a file or stdout.
+
+    python bulk_extract.py /data/pdfs "/archive/**/*.pdf" -o texts.jsonl --workers 8
+
+Documents are identified by the SHA-256 of their content. The hash and path
+of every record written out are appended to a checkpoint file
+(``<output>.done`` by default), so an interrupted run started again with the
+same arguments skips what it already did. Identical files under different
+paths are extracted once; each later path gets a record naming the first
+once that one has been written. Documents that could not be extracted at all
+are not checkpointed and are retried on the next run.
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterator, List, Optional, Set, TextIO, Tuple
+
+from fastapi import HTTPException
+
+from budgets import PAGE_TIMEOUT, Budget
+from main import (
+    EXTRACTION_METHODS, IMAGE_ONLY_ENGINE, budget_status, build_extraction_result, extract_page_chunk,
+    parse_layout_params
+)
+from uploads import hash_pdf_source
+from worker_pool import WORKER_START_METHOD
+
+# Tasks queued per worker process, so the pool never runs dry while files are hashed
+TASKS_PER_WORKER = 4
+# Seconds between progress lines when stderr is not a terminal
+PROGRESS_LOG_INTERVAL = 10
+
+
+def iter_pdf_paths(inputs: List[str]) -> Iterator[str]:
+    """Yield the PDF files named by ``inputs``: files, directories (searched recursively) and glob patterns"""
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(".pdf"):
+                        yield os.path.join(root, name)
+        elif os.path.isfile(item):
+            yield item
+        else:
+            for path in sorted(glob.iglob(item, recursive=True)):
+                if os.path.isfile(path) and path.lower().endswith(".pdf"):
+                    yield path
+
+
+def extract_file(path: str, sha256: str, method: str, include_metadata: bool, page_timeout: float,
+                 text_options: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[int, str], Dict[int, str]]:
+    """
+    Extract one document in a worker process
+    
+    Returns the document record with its page texts and engines keyed by
+    0-based page number; failures are returned as a record with an
+    ``error``, not raised.
+    """
+    started = time.perf_counter()
+    record = {'path': path, 'sha256': sha256}
+    page_texts = {}
+    page_engines = {}
+    try:
+        # Like jobs, bulk extraction has no overall deadline, only the per-page time limit
+        budget = Budget(timeout=0, page_timeout=page_timeout, max_pages=0)
+        chunk = extract_page_chunk(path, method, None, include_metadata, budget, text_options)
+        page_numbers = list(range(chunk['total_pages']))
+        status, incomplete_pages = budget_status(chunk['stopped'], page_numbers, chunk['page_texts'], [])
+        result = build_extraction_result(
+            method, chunk['page_texts'], chunk['page_engines'], chunk['total_pages'], chunk['metadata'],
+            None, include_metadata, status, incomplete_pages
+        )
+        record.update({'success': 'status' not in result, **result})
+        page_texts = {page_num: page_text or "" for page_num, page_text in chunk['page_texts'].items()}
+        page_engines = chunk['page_engines']
+    except Exception as e:
+        record.update({'success': False, 'error': str(e)})
+    record['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return record, page_texts, page_engines
+
+
+def format_records(record: Dict[str, Any], page_texts: Dict[int, str], page_engines: Dict[int, str],
+                   method: str, per_page: bool) -> List[Dict[str, Any]]:
+    """Output lines of an extracted document: one 'document' record, preceded by 'page' records with ``per_page``"""
+    lines = []
+    if per_page:
+        for page_num in sorted(page_texts):
+            line = {'type': 'page', 'path': record['path'], 'sha256': record['sha256'], 'page': page_num + 1,
+                    'text': page_texts[page_num]}
+            if method == "auto":
+                line['engine'] = page_engines[page_num]
+            if page_engines[page_num] == IMAGE_ONLY_ENGINE:
+                line['image_only'] = True
+            lines.append(line)
+        record = {key: value for key, value in record.items() if key != 'text'}
+    lines.append({'type': 'document', **record})
+    return lines
+
+
+def load_checkpoint(path: str) -> Tuple[Dict[str, str], Set[Tuple[str, str]]]:
+    """
+    What a previous run finished: the path each content hash was extracted
+    from, and the content hash and path of every record it wrote
+    """
+    first_paths = {}
+    done = set()
+    if not os.path.exists(path):
+        return first_paths, done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            sha256, _, done_path = line.rstrip("\n").partition("\t")
+            if sha256 and done_path:
+                first_paths.setdefault(sha256, done_path)
+                done.add((sha256, done_path))
+    return first_paths, done
+
+
+class Progress:
+    """Files, pages and throughput so far, written to stderr"""
+
+    def __init__(self, stream: TextIO = sys.stderr, enabled: bool = True):
+        self.stream = stream
+        self.enabled = enabled
+        self.interactive = stream.isatty()
+        self.started = time.monotonic()
+        self.last_shown = 0.0
+        self.found = 0
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0
+        self.pages = 0
+
+    def line(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return (
+            f"{self.done}/{self.found - self.skipped} files  {self.pages} pages  "
+            f"{self.done / elapsed:.1f} files/s  {self.pages / elapsed:.1f} pages/s  "
+            f"{self.failed} failed  {self.skipped} skipped"
+        )
+
+    def show(self, force: bool = False) -> None:
+        now = time.monotonic()
+        interval = 0.5 if self.interactive else PROGRESS_LOG_INTERVAL
+        if not self.enabled or (not force and now - self.last_shown < interval):
+            return
+        self.last_shown = now
+        if self.interactive:
+            self.stream.write(f"\r\033[K{self.line()}")
+        else:
+            self.stream.write(f"{self.line()}\n")
+        self.stream.flush()
+
+    def finish(self) -> None:
+        self.show(force=True)
+        if self.enabled and self.interactive:
+            self.stream.write("\n")
+
+
+def new_executor(workers: int, max_tasks_per_child: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context(WORKER_START_METHOD),
+        max_tasks_per_child=max_tasks_per_child or None
+    )
+
+
+def run(args: argparse.Namespace, text_options: Optional[Dict[str, Any]]) -> Progress:
+    """Extract every input document not in the checkpoint, writing records as documents finish"""
+    checkpoint_path = args.checkpoint or (None if args.output == "-" else f"{args.output}.done")
+    # Content hash -> path its record was written for, here or by a previous run
+    first_paths, done = load_checkpoint(checkpoint_path) if checkpoint_path and not args.restart else ({}, set())
+    resuming = bool(done)
+    output = sys.stdout if args.output == "-" else open(args.output, "a" if resuming else "w", encoding="utf-8")
+    checkpoint = open(checkpoint_path, "a" if resuming else "w", encoding="utf-8") if checkpoint_path else None
+    progress = Progress(enabled=not args.quiet)
+    options = (args.method, not args.no_metadata, args.page_timeout, text_options)
+    executor = new_executor(args.workers, args.max_tasks_per_child)
+    # Future -> (path, content hash, attempts so far)
+    pending: Dict[Future, Tuple[str, str, int]] = {}
+    # Content hash of a document being extracted -> later paths with the same content
+    duplicates: Dict[str, List[str]] = {}
+
+    def submit(path: str, sha256: str, attempts: int = 0) -> None:
+        pending[executor.submit(extract_file, path, sha256, *options)] = (path, sha256, attempts)
+
+    def write_checkpoint(sha256: str, path: str) -> None:
+        # Only after the record's lines are flushed, so a resumed run never loses one
+        if checkpoint is not None:
+            checkpoint.write(f"{sha256}\t{path}\n")
+            checkpoint.flush()
+
+    def write_duplicate(path: str, sha256: str) -> None:
+        line = {'type': 'document', 'path': path, 'sha256': sha256, 'duplicate_of': first_paths[sha256]}
+        output.write(json.dumps(line, ensure_ascii=False) + "\n")
+        output.flush()
+        write_checkpoint(sha256, path)
+        progress.skipped += 1
+        progress.show()
+
+    def write(record: Dict[str, Any], page_texts: Optional[Dict[int, str]] = None,
+              page_engines: Optional[Dict[int, str]] = None) -> None:
+        lines = format_records(record, page_texts or {}, page_engines or {}, args.method, args.per_page)
+        for line in lines:
+            output.write(json.dumps(line, ensure_ascii=False, default=str) + "\n")
+        output.flush()
+        if 'error' not in record:
+            progress.pages += record['pages']
+            first_paths[record['sha256']] = record['path']
+            write_checkpoint(record['sha256'], record['path'])
+        if not record['success']:
+            progress.failed += 1
+        progress.done += 1
+        progress.show()
+        # Paths with the same content share its outcome: a reference to it, or the same error
+        for path in duplicates.pop(record['sha256'], []):
+            if 'error' in record:
+                write({'path': path, 'sha256': record['sha256'], 'success': False, 'error': record['error']})
+            else:
+                write_duplicate(path, record['sha256'])
+
+    def collect() -> None:
+        nonlocal executor
+        finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+        broken = []
+        for future in finished:
+            path, sha256, attempts = pending.pop(future)
+            try:
+                write(*future.result())
+            except BrokenProcessPool:
+                broken.append((path, sha256, attempts))
+        if broken:
+            # A worker died (crash or out of memory) and took the pool and all its tasks with it.
+            # Which document did it is unknown: run each affected one once more on a new pool.
+            executor.shutdown(wait=False, cancel_futures=True)
+            executor = new_executor(args.workers, args.max_tasks_per_child)
+            broken += [pending.pop(future) for future in list(pending)]
+            for path, sha256, attempts in broken:
+                if attempts:
+                    write({'path': path, 'sha256': sha256, 'success': False,
+                           'error': "Worker process died while extracting this document"})
+                else:
+                    submit(path, sha256, attempts + 1)
+
+    try:
+        for path in iter_pdf_paths(args.inputs):
+            progress.found += 1
+            try:
+                sha256 = hash_pdf_source(path)
+            except OSError as e:
+                write({'path': path, 'sha256': None, 'success': False, 'error': str(e)})
+                continue
+            if (sha256, path) in done:
+                progress.skipped += 1
+                progress.show()
+                continue
+            # Identical content under another path is extracted once; this path refers to it
+            if sha256 in first_paths:
+                write_duplicate(path, sha256)
+                continue
+            if sha256 in duplicates:
+                duplicates[sha256].append(path)
+                continue
+            duplicates[sha256] = []
+            submit(path, sha256)
+            if len(pending) >= args.workers * TASKS_PER_WORKER:
+                collect()
+        while pending:
+            collect()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        if output is not sys.stdout:
+            output.close()
+        if checkpoint is not None:
+            checkpoint.close()
+        progress.finish()
+    return progress
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Extract text from PDFs on disk into JSON lines, without the API")
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories (searched recursively) or glob patterns")
+    parser.add_argument("-o", "--output", default="-", help="JSONL file to write, '-' for stdout (default)")
+    parser.add_argument("--method", default="pdfplumber", choices=EXTRACTION_METHODS, help="Extraction method")
+    parser.add_argument("--layout-params", default=None, help="pdfminer layout parameters as JSON (method 'pdfminer')")
+    parser.add_argument("--per-page", action="store_true", help="Write one line per page before each document line")
+    parser.add_argument("--no-metadata", action="store_true", help="Leave out the PDF metadata")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--max-tasks-per-child", type=int, default=0,
+                        help="Replace a worker after this many documents (0 = never)")
+    parser.add_argument("--page-timeout", type=float, default=PAGE_TIMEOUT,
+                        help="Seconds one page may take before it is skipped (0 = unlimited)")
+    parser.add_argument("--checkpoint", default=None,
+                        help="File of finished content hashes (default: <output>.done; none for stdout)")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over")
+    parser.add_argument("--quiet", action="store_true", help="Do not print progress to stderr")
+    args = parser.parse_args()
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    text_options = None
+    if args.method == "pdfminer":
+        try:
+            text_options = parse_layout_params(args.layout_params)
+        except HTTPException as e:
+            parser.error(e.detail)
+
+    try:
+        progress = run(args, text_options)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    sys.exit(1 if progress.failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Content-addressed cache for extraction results.
+
+Entries are kept in a bounded in-memory LRU, optionally backed by an on-disk
+tier that survives restarts. Both tiers are bounded by size in bytes and
+evict the least recently used entries first.
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# Maximum size of the in-memory tier (0 disables it)
+CACHE_MEMORY_MAX_BYTES = int(os.getenv("PDF_CACHE_MEMORY_MAX_BYTES", str(64 * 1024 * 1024)))
+# Directory of the on-disk tier (unset disables it)
+CACHE_DIR = os.getenv("PDF_CACHE_DIR", "")
+# Maximum size of the on-disk tier
+CACHE_DISK_MAX_BYTES = int(os.getenv("PDF_CACHE_DISK_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# Same settings for the per-page text cache
+PAGE_CACHE_MEMORY_MAX_BYTES = int(os.getenv("PDF_PAGE_CACHE_MEMORY_MAX_BYTES", str(64 * 1024 * 1024)))
+PAGE_CACHE_DIR = os.getenv("PDF_PAGE_CACHE_DIR", os.path.join(CACHE_DIR, "pages") if CACHE_DIR else "")
+PAGE_CACHE_DISK_MAX_BYTES = int(os.getenv("PDF_PAGE_CACHE_DISK_MAX_BYTES", str(1024 * 1024 * 1024)))
+# Let concurrent requests for the same document and options share one extraction
+SINGLE_FLIGHT = os.getenv("PDF_SINGLE_FLIGHT", "true").lower() in ("1", "true", "yes")
+
+
+def make_cache_key(*parts: Any) -> str:
+    """Build a cache key from a content hash and the extraction options"""
+    return hashlib.sha256(json.dumps(parts, default=str).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier LRU cache of JSON-serialisable values
+
+    Only the memory tier is active until ``open()`` attaches the disk tier,
+    which the server does on startup. Worker processes and other importers
+    of the module never scan or clean up the cache directory.
+    """
+
+    def __init__(self, memory_max_bytes: int = CACHE_MEMORY_MAX_BYTES, disk_dir: str = CACHE_DIR,
+                 disk_max_bytes: int = CACHE_DISK_MAX_BYTES):
+        self.memory_max_bytes = memory_max_bytes
+        self.configured_disk_dir = disk_dir or None
+        self.disk_dir: Optional[str] = None
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.memory_max_bytes > 0 or self.disk_dir is not None
+
+    def open(self) -> None:
+        """Attach the configured disk tier; call once, in the server process"""
+        if self.configured_disk_dir is None or self.disk_dir is not None:
+            return
+        os.makedirs(self.configured_disk_dir, exist_ok=True)
+        with self._lock:
+            self.disk_dir = self.configured_disk_dir
+            self._load_disk_index()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _load_disk_index(self) -> None:
+        """Rebuild the disk tier index, oldest entries first, and delete writes left unfinished"""
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith(".json"):
+                if name.endswith(".tmp"):
+                    os.remove(os.path.join(self.disk_dir, name))
+                continue
+            stat = os.stat(os.path.join(self.disk_dir, name))
+            entries.append((stat.st_mtime, name[:-len(".json")], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+        logger.info(f"Loaded {len(self._disk)} cached results ({self._disk_bytes} bytes) from {self.disk_dir}")
+
+    def _store_memory(self, key: str, data: bytes) -> None:
+        if len(data) > self.memory_max_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.memory_max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _store_disk(self, key: str, data: bytes) -> None:
+        """Write an entry to the disk tier; runs in a worker thread, taking the lock only to update the index"""
+        if len(data) > self.disk_max_bytes:
+            return
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{key}.", suffix=".tmp", dir=self.disk_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._disk_path(key))
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            if key in self._disk:
+                self._disk_bytes -= self._disk.pop(key)
+            self._disk[key] = len(data)
+            self._disk_bytes += len(data)
+            self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        while self._disk_bytes > self.disk_max_bytes:
+            evicted_key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            try:
+                os.remove(self._disk_path(evicted_key))
+            except FileNotFoundError:
+                pass
+
+    def _load_disk(self, key: str) -> Optional[Any]:
+        """Read an entry of the disk tier; runs in a worker thread, taking the lock only to update the index"""
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError as e:
+            logger.error(f"Cache read error for {key}: {str(e)}")
+            with self._lock:
+                if key in self._disk:
+                    self._disk_bytes -= self._disk.pop(key)
+            return None
+        value = json.loads(data)
+        with self._lock:
+            if key in self._disk:
+                self._disk.move_to_end(key)
+            self.disk_hits += 1
+            if self.memory_max_bytes > 0:
+                self._store_memory(key, data)
+        return value
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for ``key`` or None, reading the disk tier from a thread"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return json.loads(data)
+            on_disk = self.disk_dir is not None and key in self._disk
+        if on_disk:
+            value = await run_in_threadpool(self._load_disk, key)
+            if value is not None:
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any) -> None:
+        """Store a value in every enabled tier, writing the disk tier from a thread"""
+        if not self.enabled:
+            return
+        data = json.dumps(value, default=str).encode("utf-8")
+        if self.memory_max_bytes > 0:
+            with self._lock:
+                self._store_memory(key, data)
+        if self.disk_dir:
+            try:
+                await run_in_threadpool(self._store_disk, key, data)
+            except OSError as e:
+                logger.error(f"Cache write error for {key}: {str(e)}")
+
+    def clear(self) -> None:
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            for key in list(self._disk):
+                try:
+                    os.remove(self._disk_path(key))
+                except FileNotFoundError:
+                    pass
+            self._disk.clear()
+            self._disk_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and tier sizes"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "memory_max_bytes": self.memory_max_bytes,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+            "disk_max_bytes": self.disk_max_bytes if self.disk_dir else 0
+        }
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key into one
+
+    The first caller for a key runs the work; callers arriving while it is
+    in flight wait for its result (or exception) instead of repeating it.
+    If the first caller is cancelled the work is cancelled with it, and each
+    waiting caller runs the work itself. With ``remember`` the outcome of
+    finished work is kept for the lifetime of the object, which
+    deduplicates calls that do not overlap in time as well.
+    """
+
+    def __init__(self, remember: bool = False):
+        self.remember = remember
+        self._tasks: Dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def run(self, key: str, work: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the result of ``work()``, shared with every other caller for ``key``"""
+        while True:
+            task = self._tasks.get(key)
+            if task is None:
+                task = asyncio.ensure_future(work())
+                self._tasks[key] = task
+                task.add_done_callback(lambda done: self._finished(key, done))
+                # Awaiting the task directly cancels it if this caller is cancelled
+                return await task
+
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise
+                # The caller running the work went away; run it ourselves
+
+    def _finished(self, key: str, task: asyncio.Future) -> None:
+        if self._tasks.get(key) is task and (task.cancelled() or not self.remember):
+            del self._tasks[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": sum(1 for task in self._tasks.values() if not task.done()),
+            "coalesced": self.coalesced
+        }
@@ -0,0 +1,271 @@
+"""
+Durable asynchronous extraction jobs.
+
+Jobs are recorded in a SQLite database next to a blob area holding the
+uploaded PDFs and the finished results. A fixed number of background
+workers drain the queue; jobs that were queued or running when the server
+stopped are picked up again on the next start. A job's upload is deleted
+when it finishes, and the job and its result once the retention period has
+passed.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Directory holding the job database and blobs
+JOBS_DIR = os.getenv("PDF_JOBS_DIR", "jobs")
+# Number of jobs processed at the same time
+JOB_WORKERS = int(os.getenv("PDF_JOB_WORKERS", "2"))
+# Seconds a finished job and its result are kept (0 = forever)
+JOB_RETENTION = float(os.getenv("PDF_JOB_RETENTION", str(7 * 24 * 3600)))
+# Seconds between passes deleting expired jobs
+JOB_CLEANUP_INTERVAL = max(1.0, float(os.getenv("PDF_JOB_CLEANUP_INTERVAL", "3600")))
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# Seconds an upload without a queued or running job is kept, since its job may be being recorded
+ORPHAN_UPLOAD_GRACE = 3600
+
+# Called with (job id, path of the uploaded PDF, job options, progress callback)
+JobProcessor = Callable[[str, str, Dict[str, Any], Callable[[int, int], None]], Awaitable[Dict[str, Any]]]
+
+
+class JobStore:
+    """SQLite-backed job records plus an on-disk blob area"""
+
+    def __init__(self, directory: str = JOBS_DIR):
+        self.directory = directory
+        self.uploads_dir = os.path.join(directory, "uploads")
+        self.results_dir = os.path.join(directory, "results")
+        os.makedirs(self.uploads_dir, exist_ok=True)
+        os.makedirs(self.results_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "jobs.db"), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    options TEXT NOT NULL,
+                    pages_done INTEGER NOT NULL DEFAULT 0,
+                    pages_total INTEGER,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )
+                """
+            )
+
+    def upload_path(self, job_id: str) -> str:
+        return os.path.join(self.uploads_dir, f"{job_id}.pdf")
+
+    def result_path(self, job_id: str) -> str:
+        return os.path.join(self.results_dir, f"{job_id}.json")
+
+    def _execute(self, query: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._lock, self._db:
+            return self._db.execute(query, params).fetchall()
+
+    def create(self, filename: str, pdf_path: str, options: Dict[str, Any]) -> str:
+        """Record a new queued job, moving the PDF at ``pdf_path`` into the blob area"""
+        job_id = uuid.uuid4().hex
+        shutil.move(pdf_path, self.upload_path(job_id))
+        self._execute(
+            "INSERT INTO jobs (id, status, filename, options, created_at) VALUES (?, ?, ?, ?, ?)",
+            (job_id, JOB_QUEUED, filename, json.dumps(options), time.time())
+        )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        job = dict(rows[0])
+        job["options"] = json.loads(job["options"])
+        return job
+
+    def mark_running(self, job_id: str) -> None:
+        self._execute(
+            "UPDATE jobs SET status = ?, started_at = ?, pages_done = 0 WHERE id = ?",
+            (JOB_RUNNING, time.time(), job_id)
+        )
+
+    def update_progress(self, job_id: str, pages_done: int, pages_total: int) -> None:
+        self._execute(
+            "UPDATE jobs SET pages_done = ?, pages_total = ? WHERE id = ?",
+            (pages_done, pages_total, job_id)
+        )
+
+    def mark_done(self, job_id: str, result: Dict[str, Any]) -> None:
+        tmp_path = f"{self.result_path(job_id)}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, default=str)
+        os.replace(tmp_path, self.result_path(job_id))
+        self._execute(
+            "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?",
+            (JOB_DONE, time.time(), job_id)
+        )
+        self._remove_upload(job_id)
+
+    def mark_failed(self, job_id: str, error: str) -> None:
+        self._execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+            (JOB_FAILED, error, time.time(), job_id)
+        )
+        self._remove_upload(job_id)
+
+    def load_result(self, job_id: str) -> Dict[str, Any]:
+        with open(self.result_path(job_id), encoding="utf-8") as f:
+            return json.load(f)
+
+    def requeue_interrupted(self) -> List[str]:
+        """Put jobs left running by a previous process back in the queue; return all queued ids"""
+        self._execute("UPDATE jobs SET status = ? WHERE status = ?", (JOB_QUEUED, JOB_RUNNING))
+        rows = self._execute("SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (JOB_QUEUED,))
+        return [row["id"] for row in rows]
+
+    def delete_expired(self, retention: float = JOB_RETENTION) -> int:
+        """
+        Delete jobs finished more than ``retention`` seconds ago, with their results
+
+        Also deletes uploads no queued or running job refers to, e.g. after a
+        crash between storing the upload and recording the job. Returns the
+        number of jobs deleted.
+        """
+        deleted = 0
+        if retention > 0:
+            rows = self._execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (JOB_DONE, JOB_FAILED, time.time() - retention)
+            )
+            for row in rows:
+                self._remove_upload(row["id"])
+                try:
+                    os.remove(self.result_path(row["id"]))
+                except FileNotFoundError:
+                    pass
+                self._execute("DELETE FROM jobs WHERE id = ?", (row["id"],))
+            deleted = len(rows)
+
+        pending = {
+            row["id"] for row in
+            self._execute("SELECT id FROM jobs WHERE status IN (?, ?)", (JOB_QUEUED, JOB_RUNNING))
+        }
+        for name in os.listdir(self.uploads_dir):
+            job_id, _ = os.path.splitext(name)
+            if job_id not in pending:
+                path = os.path.join(self.uploads_dir, name)
+                if time.time() - os.path.getmtime(path) > ORPHAN_UPLOAD_GRACE:
+                    os.remove(path)
+        return deleted
+
+    def count_by_status(self) -> Dict[str, int]:
+        rows = self._execute("SELECT status, COUNT(*) AS count FROM jobs GROUP BY status")
+        return {row["status"]: row["count"] for row in rows}
+
+    def _remove_upload(self, job_id: str) -> None:
+        try:
+            os.remove(self.upload_path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class JobRunner:
+    """Background workers draining the job queue"""
+
+    def __init__(self, store: JobStore, process: JobProcessor, workers: int = JOB_WORKERS,
+                 retention: float = JOB_RETENTION, cleanup_interval: float = JOB_CLEANUP_INTERVAL):
+        self.store = store
+        self.process = process
+        self.workers = max(1, workers)
+        self.retention = retention
+        self.cleanup_interval = cleanup_interval
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Re-queue unfinished jobs and start the workers and the cleanup pass"""
+        queued = self.store.requeue_interrupted()
+        for job_id in queued:
+            self._queue.put_nowait(job_id)
+        if queued:
+            logger.info(f"Resuming {len(queued)} queued extraction jobs")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._cleaner()))
+
+    async def stop(self) -> None:
+        """Stop the workers; running jobs are resumed on the next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, job_id: str) -> None:
+        self._queue.put_nowait(job_id)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    async def _cleaner(self) -> None:
+        """Delete expired jobs now and then every cleanup interval"""
+        while True:
+            try:
+                deleted = await asyncio.to_thread(self.store.delete_expired, self.retention)
+            except Exception as e:
+                logger.error(f"Extraction job cleanup failed: {str(e)}")
+            else:
+                if deleted:
+                    logger.info(f"Deleted {deleted} expired extraction jobs")
+            await asyncio.sleep(self.cleanup_interval)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        job = self.store.get(job_id)
+        if job is None or job["status"] != JOB_QUEUED:
+            return
+
+        self.store.mark_running(job_id)
+
+        def report_progress(pages_done: int, pages_total: int) -> None:
+            self.store.update_progress(job_id, pages_done, pages_total)
+
+        try:
+            result = await self.process(job_id, self.store.upload_path(job_id), job["options"], report_progress)
+        except asyncio.CancelledError:
+            # Shutting down: leave the job 'running' so it is re-queued on restart
+            raise
+        except Exception as e:
+            logger.error(f"Extraction job {job_id} failed: {str(e)}")
+            self.store.mark_failed(job_id, str(e))
+        else:
+            self.store.mark_done(job_id, result)
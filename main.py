@@ -1,24 +1,123 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Header, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 import PyPDF2
 import pdfplumber
+from pdfplumber.utils.text import DEFAULT_X_TOLERANCE, DEFAULT_Y_TOLERANCE
+from pdfminer.converter import PDFPageAggregator, TextConverter
+from pdfminer.layout import LAParams, LTChar, LTContainer
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import PDFStream, resolve1
+from pdfminer.psparser import LIT
+from pdfminer.utils import decode_text
+import asyncio
+import contextlib
+import functools
 import io
+import json
 import logging
-from typing import Optional, Dict, Any, List
+import math
+import re
+import time
+import unicodedata
+from collections import deque
+from typing import Optional, Dict, Any, List, Callable, Awaitable, AsyncIterator, Iterator
 from pydantic import BaseModel
 import os
 
+from cache import (
+    PAGE_CACHE_DIR, PAGE_CACHE_DISK_MAX_BYTES, PAGE_CACHE_MEMORY_MAX_BYTES, SINGLE_FLIGHT,
+    ResultCache, SingleFlight, make_cache_key
+)
+from metrics import (
+    MetricsMiddleware, TimedJSONResponse, current_endpoint, metrics_response, observe_batch_size,
+    observe_bytes_ingested, register_admission_metrics, register_cache_metrics, register_gauge_callback,
+    register_worker_metrics, set_extraction_method, worker_timer
+)
+from profiling import PROFILE_DIR, PROFILING_ENABLED, ProfilingMiddleware, check_profile_token, load_profile, profile_path
+from budgets import (
+    INSPECT_TIMEOUT, STATUS_COMPLETE, STATUS_PAGE_LIMIT, STATUS_TIMEOUT, Budget, BudgetExceeded, page_budget
+)
+from admission import AdmissionController, AdmissionMiddleware
+from archives import ARCHIVE_MAX_MEMBERS, ArchiveMember, ArchiveStream, RequestStreamingResponse
+from jobs import JOB_DONE, JOB_FAILED, JOB_WORKERS, JOBS_DIR, JobRunner, JobStore
+from uploads import (
+    MAX_REQUEST_BYTES, PDFSource, RequestSizeLimitMiddleware, hash_pdf_source, open_pdf_source, spool_upload
+)
+from worker_pool import (
+    WORKER_PROCESSES, TaskOverdue, pending_tasks, queue_depth, run_in_worker, shutdown_pool, worker_stats
+)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Default number of files of a batch request processed in parallel
+BATCH_CONCURRENCY = int(os.getenv("PDF_BATCH_CONCURRENCY", str(max(1, WORKER_PROCESSES))))
+# Start the largest files of a batch first instead of in upload order
+BATCH_LARGEST_FIRST = os.getenv("PDF_BATCH_LARGEST_FIRST", "true").lower() in ("1", "true", "yes")
+# Split documents with at least this many pages across worker processes (0 = never)
+SHARD_MIN_PAGES = int(os.getenv("PDF_SHARD_MIN_PAGES", "100"))
+# Number of pages extracted by each worker when a document is sharded
+SHARD_CHUNK_PAGES = max(1, int(os.getenv("PDF_SHARD_CHUNK_PAGES", "50")))
+# Number of pages extracted by the first worker task when streaming a document; later tasks double it
+STREAM_CHUNK_PAGES = max(1, int(os.getenv("PDF_STREAM_CHUNK_PAGES", "5")))
+# Opening a document takes time in proportion to its length, so a streamed document or job is
+# reopened for about this many worker tasks at most, however long it is
+STREAM_MAX_CHUNKS = max(1, int(os.getenv("PDF_STREAM_MAX_CHUNKS", "20")))
+# Scan each page's content stream for text operators before running pdfplumber's layout analysis
+PRESCAN_PAGES = os.getenv("PDF_PRESCAN_PAGES", "true").lower() in ("1", "true", "yes")
+# Build only character objects for pdfplumber instead of every layout object
+PDFPLUMBER_CHARS_ONLY = os.getenv("PDF_PDFPLUMBER_CHARS_ONLY", "true").lower() in ("1", "true", "yes")
+# pdfminer layout parameters used by the 'pdfminer' method, as a JSON object; the
+# default turns off the boxes_flow reading-order pass, which dominates layout
+# analysis on pages with many text boxes (tables) and rarely improves plain text
+PDFMINER_LAPARAMS = json.loads(os.getenv("PDF_PDFMINER_LAPARAMS", '{"boxes_flow": null}'))
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+EXTRACTION_METHODS = ("pypdf2", "pdfplumber", "pdfminer", "auto")
+INVALID_METHOD_DETAIL = "Invalid method. Use 'pypdf2', 'pdfplumber', 'pdfminer' or 'auto'"
+
+# Layout parameters a request may override for the 'pdfminer' method
+PDFMINER_LAYOUT_PARAMS = ("line_overlap", "char_margin", "line_margin", "word_margin", "boxes_flow",
+                          "detect_vertical", "all_texts")
+
+# Engine recorded for pages whose content stream shows no text, e.g. scans
+IMAGE_ONLY_ENGINE = "image_only"
+# A text-showing operator (Tj, TJ, ' or ") right after its string or array operand
+TEXT_OPERATOR_PATTERN = re.compile(rb"[)\]>]\s*(?:Tj|TJ|'|\")")
+
+# Thresholds used by the 'auto' method to decide that PyPDF2's text for a
+# page is poor and the page should be re-extracted with pdfplumber
+AUTO_MAX_GARBLED_RATIO = 0.05
+AUTO_MAX_AVG_WORD_LENGTH = 20
+AUTO_MIN_CHARS_FOR_SPACING_CHECK = 50
+
+# Cache of extraction results keyed by document hash and extraction options
+result_cache = ResultCache()
+# Cache of single page texts keyed by document hash, extraction method and page number
+page_cache = ResultCache(PAGE_CACHE_MEMORY_MAX_BYTES, PAGE_CACHE_DIR, PAGE_CACHE_DISK_MAX_BYTES)
+# Extractions in progress keyed like the result cache, shared by identical concurrent requests
+in_flight = SingleFlight()
+
 app = FastAPI(
     title="PDF Text Extractor API",
     description="A FastAPI application that extracts text from PDF files",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=TimedJSONResponse
 )
 
+# Admit extraction requests into a bounded capacity before their bodies are read
+admission = AdmissionController()
+app.add_middleware(AdmissionMiddleware, controller=admission)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -28,12 +127,71 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Reject oversized request bodies before they are buffered
+app.add_middleware(RequestSizeLimitMiddleware, max_bytes=MAX_REQUEST_BYTES)
+
+# Profile requests that ask for it with an X-Profile header
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware, directory=PROFILE_DIR)
+
+# Count in-flight requests and label metrics with the route being handled
+app.add_middleware(MetricsMiddleware)
+
+# Durable job queue, opened on startup so worker processes never touch it
+job_store: Optional[JobStore] = None
+job_runner: Optional[JobRunner] = None
+
+# Metrics read at scrape time
+register_cache_metrics({"results": result_cache, "pages": page_cache})
+register_gauge_callback("pdf_worker_tasks_pending", "Extraction tasks submitted to the worker pool and not finished",
+                        pending_tasks)
+register_gauge_callback("pdf_worker_queue_depth", "Extraction tasks waiting for a free worker", queue_depth)
+register_worker_metrics(worker_stats)
+register_admission_metrics(admission.stats)
+register_gauge_callback("pdf_job_queue_depth", "Extraction jobs waiting for a job worker",
+                        lambda: job_runner.queue_depth if job_runner is not None else 0)
+register_gauge_callback("pdf_extractions_in_flight", "Distinct extractions in progress that identical requests can join",
+                        lambda: in_flight.stats()["in_flight"])
+register_gauge_callback("pdf_extractions_coalesced", "Requests answered by an identical extraction already in progress",
+                        lambda: in_flight.coalesced)
+
+@app.on_event("startup")
+def open_caches():
+    """Attach the on-disk cache tiers, which only the server process uses"""
+    result_cache.open()
+    page_cache.open()
+
+@app.on_event("startup")
+async def start_job_runner():
+    """Open the job store and resume any queued jobs"""
+    global job_store, job_runner
+    job_store = JobStore(JOBS_DIR)
+    job_runner = JobRunner(job_store, process_job, JOB_WORKERS)
+    await job_runner.start()
+
+@app.on_event("shutdown")
+async def stop_job_runner():
+    """Stop the job workers; unfinished jobs are resumed on the next start"""
+    if job_runner is not None:
+        await job_runner.stop()
+    if job_store is not None:
+        job_store.close()
+
+@app.on_event("shutdown")
+def shutdown_worker_pool():
+    """Stop the extraction worker processes"""
+    shutdown_pool()
+
 class TextExtractionResponse(BaseModel):
     success: bool
     text: str
     pages: int
     message: str
     metadata: Optional[Dict[str, Any]] = None
+    page_engines: Optional[Dict[str, str]] = None
+    status: str = STATUS_COMPLETE
+    incomplete_pages: Optional[List[int]] = None
+    image_only_pages: Optional[List[int]] = None
 
 class BatchFileResult(BaseModel):
     filename: str
@@ -42,6 +200,10 @@ class BatchFileResult(BaseModel):
     pages: int
     message: str
     metadata: Optional[Dict[str, Any]] = None
+    page_engines: Optional[Dict[str, str]] = None
+    status: str = STATUS_COMPLETE
+    incomplete_pages: Optional[List[int]] = None
+    image_only_pages: Optional[List[int]] = None
     error: Optional[str] = None
 
 class BatchExtractionResponse(BaseModel):
@@ -52,79 +214,1164 @@ class BatchExtractionResponse(BaseModel):
     results: List[BatchFileResult]
     summary: str
 
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str
+    filename: str
+    pages_done: int
+    pages_total: Optional[int] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+class InspectResponse(BaseModel):
+    success: bool
+    filename: str
+    file_size: int
+    pdf_version: Optional[str] = None
+    encrypted: bool
+    pages: Optional[int] = None
+    metadata: Optional[Dict[str, Any]] = None
+    page_has_text: Optional[List[bool]] = None
+    message: str
+
 class ErrorResponse(BaseModel):
     success: bool
     error: str
     message: str
 
-def extract_text_with_pypdf2(pdf_file: bytes) -> Dict[str, Any]:
+def get_pypdf2_metadata(pdf_reader: PyPDF2.PdfReader) -> Dict[str, Any]:
+    """Read the document information dictionary with PyPDF2"""
+    if not pdf_reader.metadata:
+        return {}
+    return {
+        'title': pdf_reader.metadata.get('/Title', ''),
+        'author': pdf_reader.metadata.get('/Author', ''),
+        'subject': pdf_reader.metadata.get('/Subject', ''),
+        'creator': pdf_reader.metadata.get('/Creator', ''),
+        'producer': pdf_reader.metadata.get('/Producer', ''),
+        'creation_date': pdf_reader.metadata.get('/CreationDate', ''),
+        'modification_date': pdf_reader.metadata.get('/ModDate', '')
+    }
+
+def get_pdfplumber_metadata(pdf: pdfplumber.PDF) -> Dict[str, Any]:
+    """Read the document information dictionary with pdfplumber"""
+    if not pdf.metadata:
+        return {}
+    return {
+        'title': pdf.metadata.get('Title', ''),
+        'author': pdf.metadata.get('Author', ''),
+        'subject': pdf.metadata.get('Subject', ''),
+        'creator': pdf.metadata.get('Creator', ''),
+        'producer': pdf.metadata.get('Producer', ''),
+        'creation_date': pdf.metadata.get('CreationDate', ''),
+        'modification_date': pdf.metadata.get('ModDate', '')
+    }
+
+def format_page_texts(page_texts: Dict[int, str]) -> str:
+    """Join page texts (keyed by 0-based page number) into the '--- Page N ---' layout"""
+    text = ""
+    for page_num in sorted(page_texts):
+        if page_texts[page_num]:
+            text += f"\n--- Page {page_num + 1} ---\n{page_texts[page_num]}\n"
+    return text.strip()
+
+@contextlib.contextmanager
+def open_pdfplumber(stream) -> Iterator[pdfplumber.PDF]:
+    """Open a PDF with pdfplumber, timing the open stage"""
+    with worker_timer("open"):
+        pdf = pdfplumber.open(stream)
+    with pdf:
+        yield pdf
+
+def content_shows_text(resources: Any, contents: List[Any]) -> bool:
+    """
+    Whether content streams, or the form XObjects they can draw, contain text-showing operators
+    
+    A page's content streams are searched as one, since an operand and its
+    operator may be split across two of them. Forms nested in forms are
+    followed to any depth, each one only once.
+    """
+    pending = [(resources, contents)]
+    seen = set()
+    while pending:
+        resources, contents = pending.pop()
+        streams = [resolve1(content) for content in contents]
+        data = b"\n".join(stream.get_data() for stream in streams if isinstance(stream, PDFStream))
+        if TEXT_OPERATOR_PATTERN.search(data):
+            return True
+        resources = resolve1(resources)
+        xobjects = resolve1(resources.get('XObject')) if isinstance(resources, dict) else None
+        for xobject in (xobjects.values() if isinstance(xobjects, dict) else []):
+            xobject = resolve1(xobject)
+            if (isinstance(xobject, PDFStream) and xobject.get('Subtype') is LIT('Form')
+                    and id(xobject) not in seen):
+                seen.add(id(xobject))
+                pending.append((xobject.get('Resources'), [xobject]))
+    return False
+
+def page_shows_text(page: pdfplumber.page.Page) -> bool:
+    """
+    Cheap check of a page's content stream for text, without layout analysis
+    
+    The decoded stream is kept by pdfminer, so pages that do show text are
+    not decoded twice. When in doubt the page is assumed to show text.
+    """
+    try:
+        return content_shows_text(page.page_obj.resources, page.page_obj.contents)
+    except Exception:
+        return True
+
+class CharsOnlyAggregator(PDFPageAggregator):
+    """pdfminer device that keeps only characters: paths and images are dropped as they are drawn"""
+    
+    def paint_path(self, gstate, stroke, fill, evenodd, path) -> None:
+        pass
+    
+    def render_image(self, name, stream) -> None:
+        pass
+
+def iter_layout_chars(objs) -> Iterator[LTChar]:
+    """Characters of a pdfminer layout, including those inside figures"""
+    for obj in objs:
+        if isinstance(obj, LTChar):
+            yield obj
+        elif isinstance(obj, LTContainer):
+            yield from iter_layout_chars(obj)
+
+def load_chars_only(page: pdfplumber.page.Page) -> None:
+    """
+    Interpret a page keeping only its characters, as the dicts text extraction reads
+    
+    pdfplumber's own parse builds every curve, rect and image and converts
+    each object attribute by attribute, which is most of its per-page cost.
+    The text extracted from the characters set here is the same.
+    """
+    device = CharsOnlyAggregator(page.pdf.rsrcmgr, pageno=page.page_number, laparams=None)
+    PDFPageInterpreter(page.pdf.rsrcmgr, device).process_page(page.page_obj)
+    chars = []
+    for char in iter_layout_chars(device.get_result()):
+        top = page.height - char.y1
+        chars.append({
+            'object_type': 'char',
+            'page_number': page.page_number,
+            'text': char.get_text(),
+            'fontname': char.fontname,
+            'size': char.size,
+            'upright': char.upright,
+            'x0': char.x0,
+            'x1': char.x1,
+            'y0': char.y0,
+            'y1': char.y1,
+            'width': char.width,
+            'height': char.height,
+            'top': top,
+            'bottom': page.height - char.y0,
+            'doctop': page.initial_doctop + top
+        })
+    # Page.objects is cached in _objects; flush_cache() drops it again
+    page._objects = {'char': chars}
+
+def build_text_options(x_tolerance: float = DEFAULT_X_TOLERANCE, y_tolerance: float = DEFAULT_Y_TOLERANCE,
+                       layout: bool = False) -> Optional[Dict[str, Any]]:
+    """pdfplumber ``extract_text`` arguments of a request; None when they are all the defaults"""
+    if x_tolerance < 0 or y_tolerance < 0:
+        raise HTTPException(status_code=400, detail="Tolerances must not be negative")
+    text_options = {}
+    if x_tolerance != DEFAULT_X_TOLERANCE:
+        text_options['x_tolerance'] = x_tolerance
+    if y_tolerance != DEFAULT_Y_TOLERANCE:
+        text_options['y_tolerance'] = y_tolerance
+    if layout:
+        text_options['layout'] = True
+    return text_options or None
+
+def cache_method(method: str, text_options: Optional[Dict[str, Any]]) -> Any:
+    """The method part of cache keys; non-default text options give different text"""
+    return method if text_options is None else [method, text_options]
+
+def extract_pdfplumber_page(page: pdfplumber.page.Page,
+                            text_options: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """
+    Extract the text of a pdfplumber page, then drop the layout it cached
+    
+    pdfplumber keeps every parsed page's characters and layout objects alive
+    until the document is closed, which makes memory grow with page count.
+    Returns None without running the layout analysis when the page shows no
+    text at all (see ``PRESCAN_PAGES``).
+    """
+    try:
+        if PRESCAN_PAGES and not page_shows_text(page):
+            return None
+        if PDFPLUMBER_CHARS_ONLY:
+            load_chars_only(page)
+        return page.extract_text(**(text_options or {}))
+    finally:
+        page.flush_cache()
+        page.get_textmap.cache_clear()
+
+def image_only_pages(page_texts: Dict[int, Optional[str]]) -> List[int]:
+    """1-based numbers of the pages pdfplumber skipped because they show no text"""
+    return [page_num + 1 for page_num in sorted(page_texts) if page_texts[page_num] is None]
+
+def extract_text_with_pypdf2(pdf_file: PDFSource) -> Dict[str, Any]:
     """Extract text using PyPDF2 library"""
     try:
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_file))
-        text = ""
-        metadata = {}
-        
-        # Extract metadata
-        if pdf_reader.metadata:
-            metadata = {
-                'title': pdf_reader.metadata.get('/Title', ''),
-                'author': pdf_reader.metadata.get('/Author', ''),
-                'subject': pdf_reader.metadata.get('/Subject', ''),
-                'creator': pdf_reader.metadata.get('/Creator', ''),
-                'producer': pdf_reader.metadata.get('/Producer', ''),
-                'creation_date': pdf_reader.metadata.get('/CreationDate', ''),
-                'modification_date': pdf_reader.metadata.get('/ModDate', '')
+        with open_pdf_source(pdf_file) as stream:
+            with worker_timer("open"):
+                pdf_reader = PyPDF2.PdfReader(stream)
+            
+            # Extract metadata
+            metadata = get_pypdf2_metadata(pdf_reader)
+            
+            # Extract text from each page
+            page_texts = {}
+            for page_num, page in enumerate(pdf_reader.pages):
+                with worker_timer("page", "pypdf2", page_num):
+                    page_texts[page_num] = page.extract_text()
+            
+            return {
+                'text': format_page_texts(page_texts),
+                'pages': len(pdf_reader.pages),
+                'metadata': metadata
             }
-        
-        # Extract text from each page
-        for page_num, page in enumerate(pdf_reader.pages):
-            page_text = page.extract_text()
-            if page_text:
-                text += f"\n--- Page {page_num + 1} ---\n{page_text}\n"
-        
-        return {
-            'text': text.strip(),
-            'pages': len(pdf_reader.pages),
-            'metadata': metadata
-        }
     except Exception as e:
         logger.error(f"PyPDF2 extraction error: {str(e)}")
         raise Exception(f"PyPDF2 extraction failed: {str(e)}")
 
-def extract_text_with_pdfplumber(pdf_file: bytes) -> Dict[str, Any]:
+def extract_text_with_pdfplumber(pdf_file: PDFSource) -> Dict[str, Any]:
     """Extract text using pdfplumber library (better for complex layouts)"""
     try:
-        with pdfplumber.open(io.BytesIO(pdf_file)) as pdf:
-            text = ""
-            metadata = {}
-            
+        with open_pdf_source(pdf_file) as stream, open_pdfplumber(stream) as pdf:
             # Extract metadata
-            if pdf.metadata:
-                metadata = {
-                    'title': pdf.metadata.get('Title', ''),
-                    'author': pdf.metadata.get('Author', ''),
-                    'subject': pdf.metadata.get('Subject', ''),
-                    'creator': pdf.metadata.get('Creator', ''),
-                    'producer': pdf.metadata.get('Producer', ''),
-                    'creation_date': pdf.metadata.get('CreationDate', ''),
-                    'modification_date': pdf.metadata.get('ModDate', '')
-                }
+            metadata = get_pdfplumber_metadata(pdf)
             
             # Extract text from each page
+            page_texts = {}
             for page_num, page in enumerate(pdf.pages):
-                page_text = page.extract_text()
-                if page_text:
-                    text += f"\n--- Page {page_num + 1} ---\n{page_text}\n"
+                with worker_timer("page", "pdfplumber", page_num):
+                    page_texts[page_num] = extract_pdfplumber_page(page)
             
-            return {
-                'text': text.strip(),
+            result = {
+                'text': format_page_texts(page_texts),
                 'pages': len(pdf.pages),
                 'metadata': metadata
             }
+            if image_only_pages(page_texts):
+                result['image_only_pages'] = image_only_pages(page_texts)
+            return result
     except Exception as e:
         logger.error(f"pdfplumber extraction error: {str(e)}")
         raise Exception(f"pdfplumber extraction failed: {str(e)}")
 
+def extract_text_advanced_with_pdfplumber(pdf_file: PDFSource, include_metadata: bool = True,
+                                          pages_to_extract: Optional[List[int]] = None,
+                                          text_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Extract text from selected pages using pdfplumber (0-based page numbers)"""
+    with open_pdf_source(pdf_file) as stream, open_pdfplumber(stream) as pdf:
+        # Extract metadata if requested
+        metadata = get_pdfplumber_metadata(pdf) if include_metadata else None
+        
+        # Extract text from specified pages
+        total_pages = len(pdf.pages)
+        page_texts = {}
+        for page_num in (pages_to_extract or range(total_pages)):
+            if 0 <= page_num < total_pages:
+                with worker_timer("page", "pdfplumber", page_num):
+                    page_texts[page_num] = extract_pdfplumber_page(pdf.pages[page_num], text_options)
+        
+        extracted_pages = len(pages_to_extract) if pages_to_extract else total_pages
+        
+        result = {
+            'text': format_page_texts(page_texts),
+            'pages': extracted_pages,
+            'metadata': metadata
+        }
+        if image_only_pages(page_texts):
+            result['image_only_pages'] = image_only_pages(page_texts)
+        return result
+
+def get_pdfminer_metadata(document: PDFDocument) -> Dict[str, Any]:
+    """Read the document information dictionary with pdfminer"""
+    info = resolve1(document.info[0]) if document.info else None
+    if not isinstance(info, dict):
+        return {}
+    
+    def field(name: str) -> str:
+        value = resolve1(info.get(name))
+        return decode_text(value) if isinstance(value, bytes) else str(value or '')
+    
+    return {
+        'title': field('Title'),
+        'author': field('Author'),
+        'subject': field('Subject'),
+        'creator': field('Creator'),
+        'producer': field('Producer'),
+        'creation_date': field('CreationDate'),
+        'modification_date': field('ModDate')
+    }
+
+class PdfminerDocument:
+    """
+    Plain text extraction straight through pdfminer's interpreter and text converter
+    
+    Skips pdfplumber's object model entirely: each page is laid out by
+    pdfminer with ``PDFMINER_LAPARAMS`` (overridden by ``layout_params``)
+    and written out as text. Pages are extracted one at a time, on demand.
+    """
+    
+    def __init__(self, stream, layout_params: Optional[Dict[str, Any]] = None):
+        with worker_timer("open"):
+            self.document = PDFDocument(PDFParser(stream))
+            self.pages = list(PDFPage.create_pages(self.document))
+        resource_manager = PDFResourceManager(caching=True)
+        self.output = io.StringIO()
+        self.device = TextConverter(resource_manager, self.output,
+                                    laparams=LAParams(**{**PDFMINER_LAPARAMS, **(layout_params or {})}))
+        self.interpreter = PDFPageInterpreter(resource_manager, self.device)
+    
+    def extract_page(self, page_num: int) -> Optional[str]:
+        """Text of a 0-based page; None when its content stream shows no text (see ``PRESCAN_PAGES``)"""
+        page = self.pages[page_num]
+        try:
+            if PRESCAN_PAGES and not content_shows_text(page.resources, page.contents):
+                return None
+        except Exception:
+            pass
+        self.output.seek(0)
+        self.output.truncate()
+        self.interpreter.process_page(page)
+        # The converter ends every page with a form feed
+        return self.output.getvalue().rstrip()
+    
+    def iter_pages(self, page_numbers: Optional[List[int]] = None) -> Iterator[tuple]:
+        """Yield (page number, text) for each existing page of ``page_numbers``, or for every page"""
+        for page_num in (range(len(self.pages)) if page_numbers is None else page_numbers):
+            if 0 <= page_num < len(self.pages):
+                with worker_timer("page", "pdfminer", page_num):
+                    page_text = self.extract_page(page_num)
+                yield page_num, page_text
+    
+    def metadata(self) -> Dict[str, Any]:
+        return get_pdfminer_metadata(self.document)
+    
+    def close(self) -> None:
+        self.device.close()
+
+@contextlib.contextmanager
+def open_pdfminer(stream, layout_params: Optional[Dict[str, Any]] = None) -> Iterator[PdfminerDocument]:
+    """Open a PDF for the 'pdfminer' method"""
+    document = PdfminerDocument(stream, layout_params)
+    try:
+        yield document
+    finally:
+        document.close()
+
+def extract_text_with_pdfminer(pdf_file: PDFSource, include_metadata: bool = True,
+                               pages_to_extract: Optional[List[int]] = None,
+                               layout_params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Extract text from selected pages using pdfminer directly (0-based page numbers)"""
+    try:
+        with open_pdf_source(pdf_file) as stream, open_pdfminer(stream, layout_params) as document:
+            metadata = document.metadata() if include_metadata else None
+            
+            page_texts = dict(document.iter_pages(pages_to_extract or None))
+            
+            result = {
+                'text': format_page_texts(page_texts),
+                'pages': len(pages_to_extract) if pages_to_extract else len(document.pages),
+                'metadata': metadata
+            }
+            if image_only_pages(page_texts):
+                result['image_only_pages'] = image_only_pages(page_texts)
+            return result
+    except Exception as e:
+        logger.error(f"pdfminer extraction error: {str(e)}")
+        raise Exception(f"pdfminer extraction failed: {str(e)}")
+
+def parse_layout_params(layout_params: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Parse a JSON object of pdfminer layout parameters, e.g. '{"char_margin": 3}'"""
+    if not layout_params:
+        return None
+    try:
+        params = json.loads(layout_params)
+        if not isinstance(params, dict):
+            raise ValueError("layout_params must be a JSON object")
+        unknown = [name for name in params if name not in PDFMINER_LAYOUT_PARAMS]
+        if unknown:
+            raise ValueError(f"Unknown layout parameters: {', '.join(unknown)}")
+        for name, value in params.items():
+            if name in ("detect_vertical", "all_texts"):
+                if not isinstance(value, bool):
+                    raise ValueError(f"{name} must be true or false")
+            elif not (isinstance(value, (int, float)) and not isinstance(value, bool)
+                      or value is None and name == "boxes_flow"):
+                raise ValueError(f"{name} must be a number")
+        LAParams(**{**PDFMINER_LAPARAMS, **params})
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid layout_params: {str(e)}")
+    return params or None
+
+def count_pages(pdf_file: PDFSource) -> int:
+    """Count pages by walking the page tree, without parsing any page content"""
+    with open_pdf_source(pdf_file) as stream:
+        with worker_timer("open"):
+            return len(PyPDF2.PdfReader(stream).pages)
+
+def resources_have_fonts(resources: Any) -> bool:
+    """
+    Whether a resource dictionary, or a form XObject it can draw, declares a font
+    
+    Forms nested in forms are followed to any depth, each one only once.
+    """
+    pending = [resources]
+    seen = set()
+    while pending:
+        resources = pending.pop()
+        resources = resources.get_object() if resources is not None else None
+        if not isinstance(resources, dict):
+            continue
+        if resources.get('/Font'):
+            return True
+        xobjects = resources.get('/XObject')
+        xobjects = xobjects.get_object() if xobjects is not None else {}
+        for xobject in (xobjects.values() if isinstance(xobjects, dict) else []):
+            xobject = xobject.get_object()
+            if xobject.get('/Subtype') == '/Form' and id(xobject) not in seen:
+                seen.add(id(xobject))
+                pending.append(xobject.get('/Resources'))
+    return False
+
+def inspect_pdf(pdf_file: PDFSource) -> Dict[str, Any]:
+    """
+    Read the version, encryption, document information and page tree of a PDF
+    
+    No content stream is decoded: whether a page has text is a hint taken
+    from the fonts its resources declare, since a page that declares no font
+    cannot show any. A page that declares one may still show none.
+    Encrypted documents that need a password only report their version.
+    """
+    with open_pdf_source(pdf_file) as stream:
+        pdf_reader = PyPDF2.PdfReader(stream)
+        encrypted = pdf_reader.is_encrypted
+        pdf_version = pdf_reader.pdf_header.replace('%PDF-', '', 1)
+        if encrypted:
+            try:
+                if not pdf_reader.decrypt(''):
+                    return {'pdf_version': pdf_version, 'encrypted': True}
+            except Exception:
+                return {'pdf_version': pdf_version, 'encrypted': True}
+        
+        # The catalog's /Version overrides the header when it is newer
+        catalog_version = pdf_reader.trailer['/Root'].get_object().get('/Version')
+        if catalog_version and str(catalog_version).lstrip('/') > pdf_version:
+            pdf_version = str(catalog_version).lstrip('/')
+        return {
+            'pdf_version': pdf_version,
+            'encrypted': encrypted,
+            'pages': len(pdf_reader.pages),
+            'metadata': get_pypdf2_metadata(pdf_reader),
+            'page_has_text': [resources_have_fonts(page.get('/Resources')) for page in pdf_reader.pages]
+        }
+
+def needs_layout_engine(page_text: Optional[str]) -> bool:
+    """
+    Whether PyPDF2's text for a page looks too poor to keep
+    
+    Empty pages, pages with many replacement/control characters and pages
+    whose words have run together are re-extracted with pdfplumber.
+    """
+    text = (page_text or "").strip()
+    if not text:
+        return True
+    
+    garbled = sum(
+        1 for ch in text
+        if ch == '\ufffd' or (unicodedata.category(ch) in ('Cc', 'Co') and not ch.isspace())
+    )
+    if garbled / len(text) > AUTO_MAX_GARBLED_RATIO:
+        return True
+    
+    words = text.split()
+    non_space = sum(len(word) for word in words)
+    if non_space >= AUTO_MIN_CHARS_FOR_SPACING_CHECK and non_space / len(words) > AUTO_MAX_AVG_WORD_LENGTH:
+        return True
+    
+    return False
+
+def extract_page_chunk(pdf_file: PDFSource, method: str, page_numbers: Optional[List[int]] = None,
+                       include_metadata: bool = False, budget: Optional[Budget] = None,
+                       text_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Extract the text of a subset of pages (0-based page numbers, None for all)
+    
+    Used to shard one large document across worker processes: every worker
+    opens the same file and returns the text of its pages keyed by page number,
+    along with the engine that produced each page. Pages that run out of
+    ``budget`` are left out and the reason is returned in ``stopped``.
+    ``text_options`` are passed to pdfplumber, or are the layout
+    parameters of the 'pdfminer' method.
+    """
+    try:
+        with open_pdf_source(pdf_file) as stream:
+            page_texts = {}
+            page_engines = {}
+            stopped = None
+            if method in ("pypdf2", "auto"):
+                with worker_timer("open"):
+                    pdf_reader = PyPDF2.PdfReader(stream)
+                total_pages = len(pdf_reader.pages)
+                metadata = get_pypdf2_metadata(pdf_reader) if include_metadata else None
+                for page_num in (range(total_pages) if page_numbers is None else page_numbers):
+                    if 0 <= page_num < total_pages:
+                        try:
+                            with page_budget(budget), worker_timer("page", "pypdf2", page_num):
+                                page_texts[page_num] = pdf_reader.pages[page_num].extract_text()
+                        except BudgetExceeded as e:
+                            # Skip a page that ran out of time; stop at the deadline
+                            stopped = e.reason
+                            if e.reason == STATUS_TIMEOUT:
+                                break
+                            continue
+                        page_engines[page_num] = "pypdf2"
+            
+            if method == "auto" and stopped != STATUS_TIMEOUT:
+                # Re-extract only the pages PyPDF2 handled badly
+                retry_pages = [page_num for page_num, page_text in page_texts.items()
+                               if needs_layout_engine(page_text)]
+                if retry_pages:
+                    stream.seek(0)
+                    with open_pdfplumber(stream) as pdf:
+                        for page_num in retry_pages:
+                            try:
+                                with page_budget(budget), worker_timer("page", "pdfplumber", page_num):
+                                    page_text = extract_pdfplumber_page(pdf.pages[page_num], text_options)
+                            except BudgetExceeded as e:
+                                # Keep PyPDF2's text for this page, and for the rest at the deadline
+                                if e.reason == STATUS_TIMEOUT:
+                                    stopped = e.reason
+                                    break
+                                continue
+                            if page_text is None:
+                                if not page_texts[page_num]:
+                                    page_texts[page_num] = ""
+                                    page_engines[page_num] = IMAGE_ONLY_ENGINE
+                            elif page_text or not page_texts[page_num]:
+                                page_texts[page_num] = page_text
+                                page_engines[page_num] = "pdfplumber"
+            elif method == "pdfminer":
+                with open_pdfminer(stream, text_options) as document:
+                    total_pages = len(document.pages)
+                    metadata = document.metadata() if include_metadata else None
+                    for page_num in (range(total_pages) if page_numbers is None else page_numbers):
+                        if 0 <= page_num < total_pages:
+                            try:
+                                with page_budget(budget), worker_timer("page", "pdfminer", page_num):
+                                    page_text = document.extract_page(page_num)
+                            except BudgetExceeded as e:
+                                stopped = e.reason
+                                if e.reason == STATUS_TIMEOUT:
+                                    break
+                                continue
+                            page_texts[page_num] = page_text or ""
+                            page_engines[page_num] = "pdfminer" if page_text is not None else IMAGE_ONLY_ENGINE
+            elif method not in ("pypdf2", "auto"):
+                with open_pdfplumber(stream) as pdf:
+                    total_pages = len(pdf.pages)
+                    metadata = get_pdfplumber_metadata(pdf) if include_metadata else None
+                    for page_num in (range(total_pages) if page_numbers is None else page_numbers):
+                        if 0 <= page_num < total_pages:
+                            try:
+                                with page_budget(budget), worker_timer("page", "pdfplumber", page_num):
+                                    page_text = extract_pdfplumber_page(pdf.pages[page_num], text_options)
+                            except BudgetExceeded as e:
+                                stopped = e.reason
+                                if e.reason == STATUS_TIMEOUT:
+                                    break
+                                continue
+                            page_texts[page_num] = page_text or ""
+                            page_engines[page_num] = "pdfplumber" if page_text is not None else IMAGE_ONLY_ENGINE
+        
+        return {
+            'page_texts': page_texts,
+            'page_engines': page_engines,
+            'total_pages': total_pages,
+            'metadata': metadata,
+            'stopped': stopped
+        }
+    except Exception as e:
+        logger.error(f"{method} page extraction error: {str(e)}")
+        raise Exception(f"{method} extraction failed: {str(e)}")
+
+def extract_text_auto(pdf_file: PDFSource, include_metadata: bool = True,
+                      pages_to_extract: Optional[List[int]] = None) -> Dict[str, Any]:
+    """Extract text with PyPDF2, falling back to pdfplumber for pages PyPDF2 handles badly"""
+    result = extract_page_chunk(pdf_file, "auto", pages_to_extract or None, include_metadata)
+    return build_extraction_result(
+        "auto", result['page_texts'], result['page_engines'], result['total_pages'],
+        result['metadata'], pages_to_extract, include_metadata
+    )
+
+def format_page_engines(page_engines: Dict[int, str]) -> Dict[str, str]:
+    """Map 1-based page numbers to the engine that extracted them"""
+    return {str(page_num + 1): page_engines[page_num] for page_num in sorted(page_engines)}
+
+def build_extraction_result(method: str, page_texts: Dict[int, str], page_engines: Dict[int, str],
+                            total_pages: int, metadata: Optional[Dict[str, Any]],
+                            pages_to_extract: Optional[List[int]] = None,
+                            include_metadata: bool = True, status: str = STATUS_COMPLETE,
+                            incomplete_pages: Optional[List[int]] = None) -> Dict[str, Any]:
+    """
+    Assemble an extraction result from per-page texts
+    
+    A result cut short by a budget carries its ``status`` and the 1-based
+    numbers of the pages that were not extracted; pages that show no text
+    are listed in ``image_only_pages``.
+    """
+    result = {
+        'text': format_page_texts(page_texts),
+        'pages': len(pages_to_extract) if pages_to_extract else total_pages,
+        'metadata': metadata if include_metadata else None
+    }
+    if method == "auto":
+        result['page_engines'] = format_page_engines(page_engines)
+    image_only = [page_num + 1 for page_num in sorted(page_engines) if page_engines[page_num] == IMAGE_ONLY_ENGINE]
+    if image_only:
+        result['image_only_pages'] = image_only
+    if status != STATUS_COMPLETE:
+        result['pages'] = len(page_texts)
+        result['status'] = status
+        result['incomplete_pages'] = [page_num + 1 for page_num in incomplete_pages or []]
+    return result
+
+def response_fields(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Response fields of an extraction result; results cut short by a budget are not successful"""
+    fields = {
+        'success': True,
+        'text': result['text'],
+        'pages': result['pages'],
+        'message': f"Successfully extracted text from {result['pages']} pages",
+        'metadata': result['metadata'],
+        'page_engines': result.get('page_engines'),
+        'image_only_pages': result.get('image_only_pages')
+    }
+    if 'status' in result:
+        fields.update({
+            'success': False,
+            'message': budget_message(
+                result['status'], result['pages'], result['pages'] + len(result['incomplete_pages'])
+            ),
+            'status': result['status'],
+            'incomplete_pages': result['incomplete_pages']
+        })
+    return fields
+
+def parse_page_range(page_range: Optional[str]) -> Optional[List[int]]:
+    """Parse a page range such as '1-3' or '1,3,5' into 0-based page numbers"""
+    if not page_range:
+        return None
+    try:
+        pages_to_extract = []
+        for part in page_range.split(','):
+            if '-' in part:
+                start, end = map(int, part.split('-'))
+                pages_to_extract.extend(range(start, end + 1))
+            else:
+                pages_to_extract.append(int(part))
+        # Convert to 0-based indexing
+        return [p - 1 for p in pages_to_extract if p > 0]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid page range format")
+
+def budget_status(stopped: Optional[str], page_numbers: List[int], page_texts: Dict[int, str],
+                  skipped_pages: List[int]) -> tuple:
+    """Return the status of an extraction and the pages it left out"""
+    if stopped is None and not skipped_pages:
+        return STATUS_COMPLETE, []
+    incomplete_pages = [page_num for page_num in page_numbers if page_num not in page_texts] + list(skipped_pages)
+    return stopped or STATUS_PAGE_LIMIT, incomplete_pages
+
+def budget_message(status: str, extracted_pages: int, requested_pages: int) -> str:
+    """Describe a result cut short by its budget"""
+    return f"Extraction stopped ({status}): {extracted_pages} of {requested_pages} pages extracted"
+
+async def apply_page_limit(pdf_file: PDFSource, pages_to_extract: Optional[List[int]],
+                           budget: Optional[Budget]) -> tuple:
+    """
+    Cut the requested pages down to the budget's page limit; return the pages to extract and those skipped
+    
+    Requested pages past the end of the document do not count towards the
+    limit, so the document is only counted when more pages than the limit
+    were requested.
+    """
+    if budget is None or budget.max_pages is None:
+        return pages_to_extract, []
+    if pages_to_extract and len(set(pages_to_extract)) <= budget.max_pages:
+        return pages_to_extract, []
+    total_pages = await run_in_worker(count_pages, pdf_file)
+    if pages_to_extract:
+        page_numbers = [page_num for page_num in dict.fromkeys(pages_to_extract) if page_num < total_pages]
+    else:
+        page_numbers = list(range(total_pages))
+    if len(page_numbers) <= budget.max_pages:
+        return pages_to_extract, []
+    return page_numbers[:budget.max_pages], page_numbers[budget.max_pages:]
+
+def sharding_enabled() -> bool:
+    """Whether documents with enough pages are split across worker processes"""
+    return SHARD_MIN_PAGES > 0 and WORKER_PROCESSES > 1
+
+async def extract_pages(pdf_file: PDFSource, method: str, page_numbers: Optional[List[int]],
+                        include_metadata: bool, budget: Optional[Budget] = None,
+                        text_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Extract a set of pages (None for all) in the worker pool
+    
+    When there are enough pages, they are split into chunks extracted by
+    several workers and merged back together. If the budget's deadline
+    passes with chunks still running, their workers are killed and the
+    pages extracted so far are returned with ``stopped`` set.
+    """
+    if page_numbers is None:
+        chunks = [None]
+    else:
+        if sharding_enabled() and len(page_numbers) >= SHARD_MIN_PAGES:
+            chunk_size = SHARD_CHUNK_PAGES
+        else:
+            chunk_size = max(1, len(page_numbers))
+        chunks = [page_numbers[i:i + chunk_size] for i in range(0, len(page_numbers), chunk_size)] or [[]]
+    kill_after = budget.kill_timeout() if budget else None
+    futures = [
+        asyncio.ensure_future(
+            run_in_worker(extract_page_chunk, pdf_file, method, chunk, include_metadata and index == 0, budget,
+                          text_options, kill_after=kill_after)
+        )
+        for index, chunk in enumerate(chunks)
+    ]
+    try:
+        await asyncio.wait(futures)
+    finally:
+        for future in futures:
+            future.cancel()
+    
+    stopped = None
+    chunk_results = []
+    for future in futures:
+        try:
+            chunk_results.append(future.result())
+        except TaskOverdue:
+            # Still running at the deadline; only this chunk's worker was killed
+            chunk_results.append(None)
+            stopped = STATUS_TIMEOUT
+    
+    page_texts = {}
+    page_engines = {}
+    for chunk_result in chunk_results:
+        if chunk_result is None:
+            continue
+        page_texts.update(chunk_result['page_texts'])
+        page_engines.update(chunk_result['page_engines'])
+        stopped = stopped or chunk_result['stopped']
+    
+    first_chunk = chunk_results[0]
+    return {
+        'page_texts': page_texts,
+        'page_engines': page_engines,
+        'total_pages': first_chunk['total_pages'] if first_chunk else None,
+        'metadata': first_chunk['metadata'] if first_chunk else None,
+        'stopped': stopped
+    }
+
+async def run_extraction(pdf_file: PDFSource, method: str, pages_to_extract: Optional[List[int]] = None,
+                         include_metadata: bool = True, budget: Optional[Budget] = None,
+                         skipped_pages: Optional[List[int]] = None,
+                         text_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Extract text from a PDF in the worker pool
+    
+    Large documents are sharded by page across workers; everything else is
+    extracted by a single worker. With a budget, extraction always goes
+    through page chunks so a partial result can be returned. The pages are
+    only counted up front when the document might be sharded.
+    """
+    if budget is not None or sharding_enabled():
+        page_numbers = pages_to_extract or None
+        if page_numbers is None and sharding_enabled():
+            page_numbers = list(range(await run_in_worker(count_pages, pdf_file)))
+        if budget is not None or len(page_numbers) >= SHARD_MIN_PAGES:
+            result = await extract_pages(pdf_file, method, page_numbers, include_metadata, budget, text_options)
+            if result['total_pages'] is not None:
+                page_numbers = [page_num for page_num in (page_numbers or range(result['total_pages']))
+                                if 0 <= page_num < result['total_pages']]
+            status, incomplete_pages = budget_status(
+                result['stopped'], page_numbers or [], result['page_texts'], skipped_pages or []
+            )
+            return build_extraction_result(
+                method, result['page_texts'], result['page_engines'], result['total_pages'],
+                result['metadata'], pages_to_extract, include_metadata, status, incomplete_pages
+            )
+    
+    if method == "auto":
+        return await run_in_worker(extract_text_auto, pdf_file, include_metadata, pages_to_extract)
+    if method == "pypdf2":
+        return await run_in_worker(extract_text_with_pypdf2, pdf_file)
+    if method == "pdfminer":
+        return await run_in_worker(extract_text_with_pdfminer, pdf_file, include_metadata, pages_to_extract,
+                                   text_options)
+    if pages_to_extract is None and include_metadata and text_options is None:
+        return await run_in_worker(extract_text_with_pdfplumber, pdf_file)
+    return await run_in_worker(extract_text_advanced_with_pdfplumber, pdf_file, include_metadata, pages_to_extract,
+                               text_options)
+
+async def extract_with_page_cache(pdf_file: PDFSource, doc_hash: str, method: str,
+                                  pages_to_extract: Optional[List[int]] = None,
+                                  include_metadata: bool = True, budget: Optional[Budget] = None,
+                                  skipped_pages: Optional[List[int]] = None,
+                                  text_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Assemble a result from cached page texts, extracting only the pages not cached yet"""
+    info_key = make_cache_key(doc_hash, method, "info")
+    page_method = cache_method(method, text_options)
+    info = await page_cache.get(info_key)
+    
+    if pages_to_extract:
+        page_numbers = list(dict.fromkeys(pages_to_extract))
+    elif info is not None:
+        page_numbers = list(range(info['total_pages']))
+    elif sharding_enabled():
+        page_numbers = list(range(await run_in_worker(count_pages, pdf_file)))
+    else:
+        # Nothing is known about the document yet: extract every page without counting them first
+        page_numbers = None
+    if info is not None:
+        page_numbers = [page_num for page_num in page_numbers if 0 <= page_num < info['total_pages']]
+    
+    page_texts = {}
+    page_engines = {}
+    missing_pages = None if page_numbers is None else []
+    for page_num in page_numbers or []:
+        cached_page = await page_cache.get(make_cache_key(doc_hash, page_method, page_num))
+        if cached_page is None:
+            missing_pages.append(page_num)
+        else:
+            page_texts[page_num] = cached_page['text']
+            page_engines[page_num] = cached_page['engine']
+    
+    stopped = None
+    if missing_pages or info is None:
+        extracted = await extract_pages(pdf_file, method, missing_pages, info is None, budget, text_options)
+        stopped = extracted['stopped']
+        if info is None and extracted['total_pages'] is not None:
+            info = {'total_pages': extracted['total_pages'], 'metadata': extracted['metadata']}
+            await page_cache.set(info_key, info)
+            page_numbers = [page_num for page_num in (page_numbers if page_numbers is not None
+                                                      else range(info['total_pages']))
+                            if 0 <= page_num < info['total_pages']]
+        for page_num, page_text in extracted['page_texts'].items():
+            page_texts[page_num] = page_text or ""
+            page_engines[page_num] = extracted['page_engines'][page_num]
+            await page_cache.set(
+                make_cache_key(doc_hash, page_method, page_num),
+                {'text': page_texts[page_num], 'engine': page_engines[page_num]}
+            )
+    
+    status, incomplete_pages = budget_status(stopped, page_numbers or [], page_texts, skipped_pages or [])
+    return build_extraction_result(
+        method, page_texts, page_engines, info['total_pages'] if info else None,
+        info['metadata'] if info else None, pages_to_extract, include_metadata, status, incomplete_pages
+    )
+
+async def extract_with_budget(pdf_file: PDFSource, method: str, pages_to_extract: Optional[List[int]] = None,
+                              include_metadata: bool = True, doc_hash: Optional[str] = None,
+                              text_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Extract a document under its own time and page budget, reusing cached pages when ``doc_hash`` is given"""
+    budget = Budget()
+    limited_pages, skipped_pages = await apply_page_limit(pdf_file, pages_to_extract, budget)
+    if doc_hash and page_cache.enabled:
+        return await extract_with_page_cache(pdf_file, doc_hash, method, limited_pages, include_metadata,
+                                             budget, skipped_pages, text_options)
+    return await run_extraction(pdf_file, method, limited_pages, include_metadata, budget, skipped_pages,
+                                text_options)
+
+async def extract_document(pdf_file: PDFSource, method: str, pages_to_extract: Optional[List[int]] = None,
+                           include_metadata: bool = True, use_cache: bool = True,
+                           doc_hash: Optional[str] = None,
+                           text_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Extract text from a PDF, serving repeated work from the caches
+    
+    Identical requests are answered from the result cache; requests for
+    overlapping page ranges reuse the page texts already in the page cache.
+    Identical requests arriving while the first is still being extracted
+    wait for its result instead of extracting the document again.
+    Each document gets its own time and page budget, and results cut short
+    by the budget are not cached.
+    """
+    method = method.lower()
+    set_extraction_method(method)
+    if not use_cache or not (result_cache.enabled or page_cache.enabled or SINGLE_FLIGHT):
+        return await extract_with_budget(pdf_file, method, pages_to_extract, include_metadata, None, text_options)
+    
+    doc_hash = doc_hash or hash_pdf_source(pdf_file)
+    cache_key = make_cache_key(doc_hash, cache_method(method, text_options), pages_to_extract, include_metadata)
+    result = await result_cache.get(cache_key)
+    if result is not None:
+        return result
+    
+    async def extract() -> Dict[str, Any]:
+        result = await extract_with_budget(pdf_file, method, pages_to_extract, include_metadata, doc_hash,
+                                           text_options)
+        if 'status' not in result:
+            await result_cache.set(cache_key, result)
+        return result
+    
+    if not SINGLE_FLIGHT:
+        return await extract()
+    return await in_flight.run(cache_key, extract)
+
+def ndjson_line(record: Dict[str, Any]) -> str:
+    """Serialise one record of a streamed NDJSON response"""
+    return json.dumps(record, default=str) + "\n"
+
+async def iter_chunk_results(pdf_file: PDFSource, method: str, chunks: List[List[int]],
+                             include_metadata: bool, budget: Optional[Budget] = None,
+                             text_options: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield page chunk results in order, keeping up to one chunk per worker in flight
+    
+    If a chunk is still running at the budget's deadline, its worker is
+    killed and a final empty chunk with ``stopped`` set is yielded instead.
+    """
+    pending = deque()
+    
+    async def next_result() -> Dict[str, Any]:
+        try:
+            return await pending.popleft()
+        except TaskOverdue:
+            # Chunks still running share the deadline, so their workers are killed too
+            while pending:
+                pending.popleft().cancel()
+            return {'page_texts': {}, 'page_engines': {}, 'total_pages': None, 'metadata': None,
+                    'stopped': STATUS_TIMEOUT}
+    
+    try:
+        for index, chunk in enumerate(chunks):
+            pending.append(asyncio.ensure_future(
+                run_in_worker(extract_page_chunk, pdf_file, method, chunk, include_metadata and index == 0, budget,
+                              text_options, kill_after=budget.kill_timeout() if budget else None)
+            ))
+            if len(pending) >= max(1, WORKER_PROCESSES):
+                chunk_result = await next_result()
+                yield chunk_result
+                if chunk_result['stopped'] == STATUS_TIMEOUT:
+                    return
+        while pending:
+            chunk_result = await next_result()
+            yield chunk_result
+            if chunk_result['stopped'] == STATUS_TIMEOUT:
+                return
+    finally:
+        # The client went away, a chunk failed or time ran out; don't leave work queued
+        for future in pending:
+            future.cancel()
+
+def stream_chunks(page_numbers: List[int], total_pages: int) -> List[List[int]]:
+    """
+    Split the pages of a streamed document into the chunks extracted by one worker task each
+    
+    The first chunk has ``STREAM_CHUNK_PAGES`` pages, so the first pages
+    arrive quickly; each one after it is twice as long, up to the length at
+    which the document is opened ``STREAM_MAX_CHUNKS`` times in all.
+    """
+    max_size = max(STREAM_CHUNK_PAGES, math.ceil(total_pages / STREAM_MAX_CHUNKS))
+    chunks = []
+    size = STREAM_CHUNK_PAGES
+    start = 0
+    while start < len(page_numbers):
+        chunks.append(page_numbers[start:start + size])
+        start += size
+        size = min(size * 2, max_size)
+    return chunks
+
+async def stream_document(pdf_file: PDFSource, method: str, pages_to_extract: Optional[List[int]] = None,
+                          include_metadata: bool = True, use_cache: bool = True,
+                          doc_hash: Optional[str] = None,
+                          text_options: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+    """
+    Extract a PDF page by page as NDJSON
+    
+    Emits one ``page`` record per page as soon as it is extracted, followed by
+    a ``summary`` record with the page count, metadata and timings. Pages
+    already in the page cache are emitted without being extracted again.
+    Pages left out by the document's budget are listed in the summary.
+    """
+    started = time.perf_counter()
+    first_page_ms = None
+    method = method.lower()
+    set_extraction_method(method)
+    budget = Budget()
+    try:
+        if not (use_cache and page_cache.enabled):
+            doc_hash = None
+        elif doc_hash is None:
+            doc_hash = hash_pdf_source(pdf_file)
+        info_key = make_cache_key(doc_hash, method, "info")
+        page_method = cache_method(method, text_options)
+        info = await page_cache.get(info_key) if doc_hash else None
+        total_pages = info['total_pages'] if info else await run_in_worker(count_pages, pdf_file)
+        metadata = info['metadata'] if info else None
+        
+        page_numbers = list(dict.fromkeys(pages_to_extract)) if pages_to_extract else range(total_pages)
+        page_numbers = [page_num for page_num in page_numbers if 0 <= page_num < total_pages]
+        skipped_pages = []
+        if budget.max_pages is not None:
+            page_numbers, skipped_pages = page_numbers[:budget.max_pages], page_numbers[budget.max_pages:]
+        
+        cached_pages = {}
+        if doc_hash:
+            for page_num in page_numbers:
+                cached_page = await page_cache.get(make_cache_key(doc_hash, page_method, page_num))
+                if cached_page is not None:
+                    cached_pages[page_num] = cached_page
+        
+        missing_pages = [page_num for page_num in page_numbers if page_num not in cached_pages]
+        chunks = stream_chunks(missing_pages, total_pages)
+        if info is None and not chunks:
+            chunks = [[]]
+        chunk_results = iter_chunk_results(pdf_file, method, chunks, info is None, budget, text_options)
+        
+        extracted_pages = {}
+        finished_pages = set()
+        remaining_chunks = iter(chunks)
+        stopped = None
+        incomplete_pages = []
+        for page_num in page_numbers:
+            if page_num in cached_pages:
+                page = cached_pages.pop(page_num)
+            else:
+                while page_num not in finished_pages and stopped != STATUS_TIMEOUT:
+                    chunk_result = await chunk_results.__anext__()
+                    finished_pages.update(next(remaining_chunks))
+                    if chunk_result['stopped'] is not None:
+                        stopped = chunk_result['stopped']
+                    if info is None and chunk_result['total_pages'] is not None:
+                        info = {'total_pages': chunk_result['total_pages'], 'metadata': chunk_result['metadata']}
+                        metadata = info['metadata']
+                        if doc_hash:
+                            await page_cache.set(info_key, info)
+                    for extracted_num, page_text in chunk_result['page_texts'].items():
+                        extracted_pages[extracted_num] = {
+                            'text': page_text or "",
+                            'engine': chunk_result['page_engines'][extracted_num]
+                        }
+                if page_num not in extracted_pages:
+                    incomplete_pages.append(page_num)
+                    continue
+                page = extracted_pages.pop(page_num)
+                if doc_hash:
+                    await page_cache.set(make_cache_key(doc_hash, page_method, page_num), page)
+            
+            if first_page_ms is None:
+                first_page_ms = (time.perf_counter() - started) * 1000
+            record = {'type': 'page', 'page': page_num + 1, 'text': page['text']}
+            if method == "auto":
+                record['engine'] = page['engine']
+            if page['engine'] == IMAGE_ONLY_ENGINE:
+                record['image_only'] = True
+            yield ndjson_line(record)
+        
+        if info is None and stopped != STATUS_TIMEOUT:
+            # Every requested page was cached but the document info was not
+            async for chunk_result in chunk_results:
+                metadata = chunk_result['metadata']
+        
+        status, incomplete_pages = budget_status(stopped, incomplete_pages, {}, skipped_pages)
+        extracted_pages = len(pages_to_extract) if pages_to_extract else total_pages
+        summary = {
+            'type': 'summary',
+            'success': True,
+            'pages': extracted_pages,
+            'total_pages': total_pages,
+            'message': f"Successfully extracted text from {extracted_pages} pages",
+            'metadata': metadata if include_metadata else None,
+            'timings': {
+                'first_page_ms': round(first_page_ms, 1) if first_page_ms is not None else None,
+                'total_ms': round((time.perf_counter() - started) * 1000, 1)
+            }
+        }
+        if status != STATUS_COMPLETE:
+            extracted_pages = len(page_numbers) - len(incomplete_pages) + len(skipped_pages)
+            summary.update({
+                'success': False,
+                'pages': extracted_pages,
+                'message': budget_message(status, extracted_pages, extracted_pages + len(incomplete_pages)),
+                'status': status,
+                'incomplete_pages': [page_num + 1 for page_num in incomplete_pages]
+            })
+        yield ndjson_line(summary)
+    except Exception as e:
+        logger.error(f"Streaming extraction error: {str(e)}")
+        yield ndjson_line({'type': 'error', 'success': False, 'error': str(e)})
+
+async def process_job(job_id: str, pdf_path: str, options: Dict[str, Any],
+                      report_progress: Callable[[int, int], None]) -> Dict[str, Any]:
+    """
+    Run a queued extraction job, reporting progress after each page chunk
+    
+    Returns the same body as the synchronous extraction endpoints.
+    """
+    method = options['method']
+    current_endpoint.set("/jobs")
+    set_extraction_method(method)
+    pages_to_extract = options.get('pages_to_extract')
+    include_metadata = options.get('include_metadata', True)
+    text_options = options.get('text_options')
+    
+    cache_key = None
+    result = None
+    if options.get('use_cache', True) and result_cache.enabled:
+        # Jobs queued before the upload hash was recorded are hashed off the event loop
+        doc_hash = options.get('sha256') or await run_in_threadpool(hash_pdf_source, pdf_path)
+        cache_key = make_cache_key(doc_hash, cache_method(method, text_options), pages_to_extract, include_metadata)
+        result = await result_cache.get(cache_key)
+        if result is not None:
+            # Every page of a cached result counts as done
+            report_progress(result['pages'], result['pages'])
+    
+    if result is None:
+        # Jobs run in the background, so only the page budgets apply, not the request timeout
+        budget = Budget(timeout=0)
+        total_pages = await run_in_worker(count_pages, pdf_path)
+        page_numbers = list(dict.fromkeys(pages_to_extract)) if pages_to_extract else range(total_pages)
+        page_numbers = [page_num for page_num in page_numbers if 0 <= page_num < total_pages]
+        skipped_pages = []
+        if budget.max_pages is not None:
+            page_numbers, skipped_pages = page_numbers[:budget.max_pages], page_numbers[budget.max_pages:]
+        report_progress(0, len(page_numbers))
+        
+        chunks = stream_chunks(page_numbers, total_pages)
+        page_texts = {}
+        page_engines = {}
+        metadata = None
+        stopped = None
+        async for chunk_result in iter_chunk_results(pdf_path, method, chunks or [[]], include_metadata, budget,
+                                                   text_options):
+            if metadata is None:
+                metadata = chunk_result['metadata']
+            stopped = stopped or chunk_result['stopped']
+            for page_num, page_text in chunk_result['page_texts'].items():
+                page_texts[page_num] = page_text or ""
+                page_engines[page_num] = chunk_result['page_engines'][page_num]
+            report_progress(len(page_texts), len(page_numbers))
+        
+        status, incomplete_pages = budget_status(stopped, page_numbers, page_texts, skipped_pages)
+        result = build_extraction_result(method, page_texts, page_engines, total_pages, metadata,
+                                         pages_to_extract, include_metadata, status, incomplete_pages)
+        if cache_key is not None and 'status' not in result:
+            await result_cache.set(cache_key, result)
+    
+    return TextExtractionResponse(**response_fields(result)).model_dump()
+
 @app.get("/")
 async def root():
     """Root endpoint with API information"""
@@ -134,8 +1381,18 @@ async def root():
         "endpoints": {
             "extract_text": "/extract-text",
             "extract_text_advanced": "/extract-text-advanced",
+            "extract_text_stream": "/extract-text-stream",
+            "inspect": "/inspect",
             "extract_text_batch": "/extract-text-batch",
             "extract_text_batch_advanced": "/extract-text-batch-advanced",
+            "extract_text_batch_stream": "/extract-text-batch-stream",
+            "extract_text_archive": "/extract-text-archive",
+            "jobs": "/jobs",
+            "job_status": "/jobs/{job_id}",
+            "job_result": "/jobs/{job_id}/result",
+            "cache_stats": "/cache/stats",
+            "admission_stats": "/admission/stats",
+            "metrics": "/metrics",
             "health": "/health"
         }
     }
@@ -145,54 +1402,101 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "message": "API is running"}
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Result and page cache hit/miss counters and sizes, and extractions shared by identical requests"""
+    return {"results": result_cache.stats(), "pages": page_cache.stats(), "in_flight": in_flight.stats()}
+
+@app.get("/admission/stats")
+async def admission_stats():
+    """Capacity in use, queue depth and admitted/rejected counts of each admission lane"""
+    return admission.stats()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics"""
+    return metrics_response()
+
+@app.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, x_profile_token: Optional[str] = Header(None)):
+    """Per-page timings and profile of a request sent with an X-Profile header"""
+    check_profile_token(x_profile_token)
+    profile = load_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+@app.get("/profiles/{profile_id}/download")
+async def download_profile(profile_id: str, x_profile_token: Optional[str] = Header(None)):
+    """Raw profile file: a .pstats dump or collapsed stacks"""
+    check_profile_token(x_profile_token)
+    path = profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=os.path.basename(path))
+
+@app.delete("/cache")
+async def clear_cache():
+    """Drop every cached extraction result and page text"""
+    result_cache.clear()
+    page_cache.clear()
+    return {"success": True, "message": "Cache cleared"}
+
 @app.post("/extract-text", response_model=TextExtractionResponse)
 async def extract_text(
     file: UploadFile = File(...),
-    method: str = Form("pdfplumber", description="Extraction method: 'pypdf2' or 'pdfplumber'")
+    method: str = Form("pdfplumber", description="Extraction method: 'pypdf2', 'pdfplumber', 'pdfminer' or 'auto'"),
+    use_cache: bool = Form(True, description="Serve repeated uploads from the result cache"),
+    layout_params: Optional[str] = Form(None, description="pdfminer layout parameters as JSON, e.g. '{\"char_margin\": 3}' (method 'pdfminer' only)"),
 ):
     """
     Extract text from a PDF file
     
     - **file**: PDF file to extract text from
-    - **method**: Extraction method ('pypdf2' or 'pdfplumber')
+    - **method**: Extraction method ('pypdf2', 'pdfplumber', 'pdfminer' or 'auto')
+    - **use_cache**: Whether to serve repeated uploads from the result cache
+    - **layout_params**: JSON object of pdfminer layout parameters for the 'pdfminer' method
     """
+    upload = None
     try:
         # Validate file type
         if not file.filename.lower().endswith('.pdf'):
             raise HTTPException(status_code=400, detail="File must be a PDF")
         
-        # Read file content
-        content = await file.read()
-        if not content:
+        # Spool file content to disk
+        upload = await spool_upload(file)
+        if not upload.size:
             raise HTTPException(status_code=400, detail="Empty file")
         
         # Choose extraction method
-        if method.lower() == "pypdf2":
-            result = extract_text_with_pypdf2(content)
-        elif method.lower() == "pdfplumber":
-            result = extract_text_with_pdfplumber(content)
-        else:
-            raise HTTPException(status_code=400, detail="Invalid method. Use 'pypdf2' or 'pdfplumber'")
+        if method.lower() not in EXTRACTION_METHODS:
+            raise HTTPException(status_code=400, detail=INVALID_METHOD_DETAIL)
+        text_options = parse_layout_params(layout_params) if method.lower() == "pdfminer" else None
         
-        return TextExtractionResponse(
-            success=True,
-            text=result['text'],
-            pages=result['pages'],
-            message=f"Successfully extracted text from {result['pages']} pages",
-            metadata=result['metadata']
-        )
+        result = await extract_document(upload.path, method, use_cache=use_cache, doc_hash=upload.sha256,
+                                        text_options=text_options)
+        
+        return TextExtractionResponse(**response_fields(result))
         
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Extraction error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Text extraction failed: {str(e)}")
+    finally:
+        if upload is not None:
+            upload.close()
 
 @app.post("/extract-text-advanced", response_model=TextExtractionResponse)
 async def extract_text_advanced(
     file: UploadFile = File(...),
     include_metadata: bool = Form(True, description="Include PDF metadata"),
-    page_range: Optional[str] = Form(None, description="Page range (e.g., '1-3' or '1,3,5')")
+    page_range: Optional[str] = Form(None, description="Page range (e.g., '1-3' or '1,3,5')"),
+    use_cache: bool = Form(True, description="Serve repeated uploads from the result cache"),
+    x_tolerance: float = Form(DEFAULT_X_TOLERANCE, description="Horizontal gap between characters that starts a new word"),
+    y_tolerance: float = Form(DEFAULT_Y_TOLERANCE, description="Vertical distance between characters that starts a new line"),
+    layout: bool = Form(False, description="Keep the page layout by padding the text with spaces and blank lines"),
+    accept: Optional[str] = Header(None)
 ):
     """
     Advanced text extraction with additional options
@@ -200,201 +1504,659 @@ async def extract_text_advanced(
     - **file**: PDF file to extract text from
     - **include_metadata**: Whether to include PDF metadata
     - **page_range**: Specific page range to extract (e.g., '1-3' or '1,3,5')
+    - **use_cache**: Whether to serve repeated uploads from the result cache
+    - **x_tolerance**: Horizontal gap (in points) between characters that starts a new word
+    - **y_tolerance**: Vertical distance (in points) between characters that starts a new line
+    - **layout**: Whether to keep the page layout by padding the text with spaces and blank lines
+    
+    Send `Accept: application/x-ndjson` to receive the pages as a stream
+    (see `/extract-text-stream`).
     """
+    upload = None
     try:
         # Validate file type
         if not file.filename.lower().endswith('.pdf'):
             raise HTTPException(status_code=400, detail="File must be a PDF")
         
-        # Read file content
-        content = await file.read()
-        if not content:
+        # Spool file content to disk
+        upload = await spool_upload(file)
+        if not upload.size:
             raise HTTPException(status_code=400, detail="Empty file")
         
-        # Parse page range
-        pages_to_extract = None
-        if page_range:
-            try:
-                pages_to_extract = []
-                for part in page_range.split(','):
-                    if '-' in part:
-                        start, end = map(int, part.split('-'))
-                        pages_to_extract.extend(range(start, end + 1))
-                    else:
-                        pages_to_extract.append(int(part))
-                # Convert to 0-based indexing
-                pages_to_extract = [p - 1 for p in pages_to_extract if p > 0]
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid page range format")
+        # Parse page range and text options
+        pages_to_extract = parse_page_range(page_range)
+        text_options = build_text_options(x_tolerance, y_tolerance, layout)
         
-        # Use pdfplumber for advanced extraction
-        with pdfplumber.open(io.BytesIO(content)) as pdf:
-            text = ""
-            metadata = {}
-            
-            # Extract metadata if requested
-            if include_metadata and pdf.metadata:
-                metadata = {
-                    'title': pdf.metadata.get('Title', ''),
-                    'author': pdf.metadata.get('Author', ''),
-                    'subject': pdf.metadata.get('Subject', ''),
-                    'creator': pdf.metadata.get('Creator', ''),
-                    'producer': pdf.metadata.get('Producer', ''),
-                    'creation_date': pdf.metadata.get('CreationDate', ''),
-                    'modification_date': pdf.metadata.get('ModDate', '')
-                }
-            
-            # Extract text from specified pages
-            total_pages = len(pdf.pages)
-            if pages_to_extract:
-                for page_num in pages_to_extract:
-                    if 0 <= page_num < total_pages:
-                        page = pdf.pages[page_num]
-                        page_text = page.extract_text()
-                        if page_text:
-                            text += f"\n--- Page {page_num + 1} ---\n{page_text}\n"
-            else:
-                # Extract from all pages
-                for page_num, page in enumerate(pdf.pages):
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += f"\n--- Page {page_num + 1} ---\n{page_text}\n"
-            
-            extracted_pages = len(pages_to_extract) if pages_to_extract else total_pages
-            
-            return TextExtractionResponse(
-                success=True,
-                text=text.strip(),
-                pages=extracted_pages,
-                message=f"Successfully extracted text from {extracted_pages} pages",
-                metadata=metadata if include_metadata else None
+        if accept and NDJSON_MEDIA_TYPE in accept:
+            response = StreamingResponse(
+                stream_document(upload.path, "pdfplumber", pages_to_extract, include_metadata, use_cache,
+                                upload.sha256, text_options),
+                media_type=NDJSON_MEDIA_TYPE,
+                background=BackgroundTask(upload.close)
             )
+            # The spooled file is removed once the response has been streamed
+            upload = None
+            return response
+        
+        # Use pdfplumber for advanced extraction
+        result = await extract_document(upload.path, "pdfplumber", pages_to_extract, include_metadata, use_cache,
+                                        upload.sha256, text_options)
+        
+        return TextExtractionResponse(**response_fields(result))
         
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Advanced extraction error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Advanced text extraction failed: {str(e)}")
+    finally:
+        if upload is not None:
+            upload.close()
+
+@app.post("/inspect", response_model=InspectResponse)
+async def inspect(file: UploadFile = File(...)):
+    """
+    Page count, metadata, version and encryption of a PDF, without extracting any text
+    
+    - **file**: PDF file to inspect
+    
+    Only the trailer, the document information dictionary and the page tree
+    are read, so large files are answered in milliseconds. `page_has_text`
+    is a per-page hint based on declared fonts, not on the text actually
+    drawn: `false` means the page declares no fonts and needs OCR, while
+    `true` only means it declares some.
+    """
+    upload = None
+    try:
+        # Validate file type
+        if not file.filename.lower().endswith('.pdf'):
+            raise HTTPException(status_code=400, detail="File must be a PDF")
+        
+        # Spool file content to disk
+        upload = await spool_upload(file)
+        if not upload.size:
+            raise HTTPException(status_code=400, detail="Empty file")
+        
+        # Even reading the page tree of an untrusted file is left to a worker that can be killed
+        try:
+            result = await run_in_worker(inspect_pdf, upload.path, kill_after=INSPECT_TIMEOUT or None)
+        except TaskOverdue:
+            raise HTTPException(status_code=504, detail=f"PDF inspection took longer than {INSPECT_TIMEOUT:g} seconds")
+        
+        if result.get('pages') is None:
+            message = "PDF is encrypted; only its version can be read without the password"
+        else:
+            message = f"Inspected {result['pages']} pages"
+        return InspectResponse(
+            success=True,
+            filename=file.filename,
+            file_size=upload.size,
+            message=message,
+            **result
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Inspection error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"PDF inspection failed: {str(e)}")
+    finally:
+        if upload is not None:
+            upload.close()
+
+@app.post("/extract-text-stream")
+async def extract_text_stream(
+    file: UploadFile = File(...),
+    method: str = Form("pdfplumber", description="Extraction method: 'pypdf2', 'pdfplumber', 'pdfminer' or 'auto'"),
+    include_metadata: bool = Form(True, description="Include PDF metadata"),
+    page_range: Optional[str] = Form(None, description="Page range (e.g., '1-3' or '1,3,5')"),
+    use_cache: bool = Form(True, description="Serve repeated uploads from the result cache"),
+    layout_params: Optional[str] = Form(None, description="pdfminer layout parameters as JSON, e.g. '{\"char_margin\": 3}' (method 'pdfminer' only)"),
+):
+    """
+    Stream extracted text page by page as NDJSON
+    
+    - **file**: PDF file to extract text from
+    - **method**: Extraction method ('pypdf2', 'pdfplumber', 'pdfminer' or 'auto')
+    - **include_metadata**: Whether to include PDF metadata in the summary record
+    - **page_range**: Specific page range to extract (e.g., '1-3' or '1,3,5')
+    - **use_cache**: Whether to reuse cached page texts
+    - **layout_params**: JSON object of pdfminer layout parameters for the 'pdfminer' method
+    """
+    # Validate file type
+    if not file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="File must be a PDF")
+    
+    if method.lower() not in EXTRACTION_METHODS:
+        raise HTTPException(status_code=400, detail=INVALID_METHOD_DETAIL)
+    
+    # Parse page range and layout parameters
+    pages_to_extract = parse_page_range(page_range)
+    text_options = parse_layout_params(layout_params) if method.lower() == "pdfminer" else None
+    
+    # Spool file content to disk
+    upload = await spool_upload(file)
+    if not upload.size:
+        upload.close()
+        raise HTTPException(status_code=400, detail="Empty file")
+    
+    return StreamingResponse(
+        stream_document(upload.path, method, pages_to_extract, include_metadata, use_cache, upload.sha256,
+                        text_options),
+        media_type=NDJSON_MEDIA_TYPE,
+        background=BackgroundTask(upload.close)
+    )
+
+async def process_batch_file(file: UploadFile, method: str, use_cache: bool = True,
+                             batch_documents: Optional[SingleFlight] = None) -> BatchFileResult:
+    """
+    Extract text from a single file of a batch request
+    
+    Files of the same batch with identical content are extracted once
+    through ``batch_documents`` and the result is shared.
+    """
+    upload = None
+    try:
+        # Validate file type
+        if not file.filename.lower().endswith('.pdf'):
+            return BatchFileResult(
+                filename=file.filename,
+                success=False,
+                text="",
+                pages=0,
+                message="File must be a PDF",
+                error="Invalid file type"
+            )
+        
+        # Spool file content to disk
+        upload = await spool_upload(file)
+        if not upload.size:
+            return BatchFileResult(
+                filename=file.filename,
+                success=False,
+                text="",
+                pages=0,
+                message="Empty file",
+                error="File is empty"
+            )
+        
+        # Choose extraction method
+        if method.lower() not in EXTRACTION_METHODS:
+            return BatchFileResult(
+                filename=file.filename,
+                success=False,
+                text="",
+                pages=0,
+                message="Invalid extraction method",
+                error=INVALID_METHOD_DETAIL
+            )
+        
+        extract = functools.partial(extract_document, upload.path, method, use_cache=use_cache,
+                                    doc_hash=upload.sha256)
+        result = await (batch_documents.run(upload.sha256, extract) if batch_documents else extract())
+        
+        return BatchFileResult(
+            filename=file.filename,
+            **response_fields(result)
+        )
+        
+    except HTTPException as e:
+        return BatchFileResult(
+            filename=file.filename,
+            success=False,
+            text="",
+            pages=0,
+            message=e.detail,
+            error=e.detail
+        )
+        
+    except Exception as e:
+        logger.error(f"Batch extraction error for {file.filename}: {str(e)}")
+        return BatchFileResult(
+            filename=file.filename,
+            success=False,
+            text="",
+            pages=0,
+            message=f"Extraction failed: {str(e)}",
+            error=str(e)
+        )
+    finally:
+        if upload is not None:
+            upload.close()
+
+async def process_batch_file_advanced(file: UploadFile, include_metadata: bool,
+                                      pages_to_extract: Optional[List[int]],
+                                      use_cache: bool = True,
+                                      batch_documents: Optional[SingleFlight] = None) -> BatchFileResult:
+    """Extract text from a single file of an advanced batch request, sharing results like ``process_batch_file``"""
+    upload = None
+    try:
+        # Validate file type
+        if not file.filename.lower().endswith('.pdf'):
+            return BatchFileResult(
+                filename=file.filename,
+                success=False,
+                text="",
+                pages=0,
+                message="File must be a PDF",
+                error="Invalid file type"
+            )
+        
+        # Spool file content to disk
+        upload = await spool_upload(file)
+        if not upload.size:
+            return BatchFileResult(
+                filename=file.filename,
+                success=False,
+                text="",
+                pages=0,
+                message="Empty file",
+                error="File is empty"
+            )
+        
+        # Use pdfplumber for advanced extraction
+        extract = functools.partial(extract_document, upload.path, "pdfplumber", pages_to_extract,
+                                    include_metadata, use_cache, upload.sha256)
+        result = await (batch_documents.run(upload.sha256, extract) if batch_documents else extract())
+        
+        return BatchFileResult(
+            filename=file.filename,
+            **response_fields(result)
+        )
+        
+    except HTTPException as e:
+        return BatchFileResult(
+            filename=file.filename,
+            success=False,
+            text="",
+            pages=0,
+            message=e.detail,
+            error=e.detail
+        )
+        
+    except Exception as e:
+        logger.error(f"Advanced batch extraction error for {file.filename}: {str(e)}")
+        return BatchFileResult(
+            filename=file.filename,
+            success=False,
+            text="",
+            pages=0,
+            message=f"Advanced extraction failed: {str(e)}",
+            error=str(e)
+        )
+    finally:
+        if upload is not None:
+            upload.close()
+
+def estimate_upload_cost(file: UploadFile) -> int:
+    """
+    Rough extraction cost of a batch file: its size in bytes
+    
+    Nothing is parsed, so an untrusted file costs no CPU or memory in the
+    server process before it reaches a worker and its budget.
+    """
+    if file.size is not None:
+        return file.size
+    stream = file.file
+    try:
+        return stream.seek(0, os.SEEK_END)
+    finally:
+        stream.seek(0)
+
+def batch_dispatch_order(files: List[UploadFile]) -> Optional[List[int]]:
+    """
+    Indices of the batch files, most expensive first (see ``BATCH_LARGEST_FIRST``)
+    
+    Starting the longest files first keeps one large file uploaded last from
+    running alone after everything else has finished. Files of equal cost
+    keep their upload order. None means upload order.
+    
+    The estimate ignores page counts: a file is only spooled to a path a
+    worker can open when its turn comes, and it must not be parsed in the
+    server process. Bytes are a poor proxy for some files, e.g. a large scan
+    whose image-only pages the prescan skips is started before a smaller but
+    longer text document.
+    """
+    if not BATCH_LARGEST_FIRST or len(files) < 2:
+        return None
+    costs = [estimate_upload_cost(file) for file in files]
+    return sorted(range(len(files)), key=lambda index: -costs[index])
+
+async def gather_batch_results(jobs: List[Callable[[], Awaitable[BatchFileResult]]],
+                               concurrency: int, order: Optional[List[int]] = None) -> List[BatchFileResult]:
+    """Run batch jobs with at most ``concurrency`` in flight, started in ``order``, keeping request order"""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    async def run(job: Callable[[], Awaitable[BatchFileResult]]) -> BatchFileResult:
+        async with semaphore:
+            return await job()
+    
+    # Tasks acquire the semaphore in the order they are created
+    tasks = {index: asyncio.ensure_future(run(jobs[index])) for index in (order or range(len(jobs)))}
+    return list(await asyncio.gather(*(tasks[index] for index in range(len(jobs)))))
+
+async def stream_batch_results(files: List[UploadFile], jobs: List[Callable[[], Awaitable[BatchFileResult]]],
+                               concurrency: int, output_format: str) -> AsyncIterator[str]:
+    """
+    Stream batch results as each file completes
+    
+    Files are started most expensive first (see ``batch_dispatch_order``).
+    Every ``result`` record carries the file's index in the request; a final
+    ``summary`` record has the same counts as a batch response.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    async def run(index: int, job: Callable[[], Awaitable[BatchFileResult]]):
+        async with semaphore:
+            return index, await job()
+    
+    order = batch_dispatch_order(files)
+    tasks = [asyncio.ensure_future(run(index, jobs[index])) for index in (order or range(len(jobs)))]
+    results: List[Optional[BatchFileResult]] = [None] * len(jobs)
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            index, result = await next_result
+            results[index] = result
+            yield format_stream_record("result", {'index': index, **result.model_dump()}, output_format)
+        
+        summary = build_batch_response(files, results).model_dump(exclude={'results'})
+        yield format_stream_record("summary", summary, output_format)
+    finally:
+        # The client went away; stop the files that have not finished
+        for task in tasks:
+            task.cancel()
+
+def format_stream_record(record_type: str, record: Dict[str, Any], output_format: str) -> str:
+    """Serialise one streamed record as an NDJSON line or a Server-Sent Event"""
+    if output_format == "sse":
+        return f"event: {record_type}\ndata: {json.dumps(record, default=str)}\n\n"
+    return ndjson_line({'type': record_type, **record})
+
+def build_batch_response(files: List[UploadFile], results: List[BatchFileResult]) -> BatchExtractionResponse:
+    """Summarise per-file results into a batch response"""
+    successful_count = sum(1 for result in results if result.success)
+    return batch_response(len(files), successful_count, results)
+
+def batch_response(total_files: int, successful_count: int,
+                   results: List[BatchFileResult]) -> BatchExtractionResponse:
+    """Batch response for ``total_files`` files of which ``successful_count`` succeeded"""
+    failed_count = total_files - successful_count
+    summary = f"Processed {total_files} files: {successful_count} successful, {failed_count} failed"
+    
+    return BatchExtractionResponse(
+        success=successful_count > 0,
+        total_files=total_files,
+        successful_extractions=successful_count,
+        failed_extractions=failed_count,
+        results=results,
+        summary=summary
+    )
+
+async def process_archive_member(member: ArchiveMember, method: str, use_cache: bool,
+                                 archive_documents: SingleFlight) -> BatchFileResult:
+    """
+    Extract text from a PDF member of an archive like a file of a batch request, deleting it afterwards
+    
+    Identical members extracted at the same time share one extraction
+    through ``archive_documents``; later ones are served by the result cache.
+    """
+    try:
+        if member.error is not None:
+            return BatchFileResult(
+                filename=member.name,
+                success=False,
+                text="",
+                pages=0,
+                message=member.error,
+                error=member.error
+            )
+        
+        if not member.upload.size:
+            return BatchFileResult(
+                filename=member.name,
+                success=False,
+                text="",
+                pages=0,
+                message="Empty file",
+                error="File is empty"
+            )
+        
+        extract = functools.partial(extract_document, member.upload.path, method, use_cache=use_cache,
+                                    doc_hash=member.upload.sha256)
+        result = await archive_documents.run(member.upload.sha256, extract)
+        
+        return BatchFileResult(
+            filename=member.name,
+            **response_fields(result)
+        )
+        
+    except HTTPException as e:
+        return BatchFileResult(
+            filename=member.name,
+            success=False,
+            text="",
+            pages=0,
+            message=e.detail,
+            error=e.detail
+        )
+        
+    except Exception as e:
+        logger.error(f"Archive extraction error for {member.name}: {str(e)}")
+        return BatchFileResult(
+            filename=member.name,
+            success=False,
+            text="",
+            pages=0,
+            message=f"Extraction failed: {str(e)}",
+            error=str(e)
+        )
+    finally:
+        member.close()
+
+async def stream_archive_results(archive: ArchiveStream, method: str, use_cache: bool, concurrency: int,
+                                 output_format: str) -> AsyncIterator[str]:
+    """
+    Stream the results of the PDFs in an archive request body as each one completes
+    
+    Members are dispatched in archive order as soon as they have been read,
+    at most ``concurrency`` at a time; a slot is freed once its result has
+    been written, so a client reading slowly holds back the extraction
+    instead of piling results up in memory. Every ``result`` record carries
+    the member's position among the archive's PDFs; the final ``summary``
+    has the counts of a batch response and the number of non-PDF files
+    skipped. A broken archive is reported with an ``error`` record after
+    the results of the members read before it.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    archive_documents = SingleFlight()
+    # (event, member index, result) in the order they happen
+    events: asyncio.Queue = asyncio.Queue()
+    tasks: List[asyncio.Future] = []
+    
+    async def run(index: int, member: ArchiveMember) -> None:
+        result = await process_archive_member(member, method, use_cache, archive_documents)
+        events.put_nowait(("result", index, result))
+    
+    async def dispatch() -> None:
+        members = archive.members()
+        try:
+            while True:
+                # Take the next member only when it can start, so reading pauses while all slots are busy
+                await semaphore.acquire()
+                try:
+                    member = await members.__anext__()
+                except StopAsyncIteration:
+                    return
+                if member.upload is not None:
+                    observe_bytes_ingested(member.upload.size)
+                tasks.append(asyncio.ensure_future(run(len(tasks), member)))
+        finally:
+            await members.aclose()
+    
+    dispatcher = asyncio.ensure_future(dispatch())
+    dispatcher.add_done_callback(lambda done: events.put_nowait(("read", None, None)))
+    watcher = asyncio.ensure_future(archive.disconnected.wait())
+    watcher.add_done_callback(lambda done: events.put_nowait(("disconnected", None, None)))
+    reading = True
+    reported = 0
+    successful_count = 0
+    try:
+        while reading or reported < len(tasks):
+            event, index, result = await events.get()
+            if event == "disconnected":
+                return
+            if event == "read":
+                reading = False
+                error = None if dispatcher.cancelled() else dispatcher.exception()
+                if isinstance(error, ClientDisconnect):
+                    return
+                if error is not None:
+                    message = error.detail if isinstance(error, HTTPException) else str(error)
+                    logger.error(f"Archive extraction error: {message}")
+                    yield format_stream_record("error", {'success': False, 'error': message}, output_format)
+                continue
+            
+            reported += 1
+            successful_count += result.success
+            yield format_stream_record("result", {'index': index, **result.model_dump()}, output_format)
+            semaphore.release()
+        
+        observe_batch_size(reported)
+        summary = batch_response(reported, successful_count, []).model_dump(exclude={'results'})
+        summary['skipped_files'] = archive.skipped
+        yield format_stream_record("summary", summary, output_format)
+    finally:
+        # Also when the client went away: stop the members that have not finished and the archive reader
+        for task in tasks:
+            task.cancel()
+        dispatcher.cancel()
+        watcher.cancel()
+        await archive.close()
+
+def validate_batch(files: List[UploadFile], max_files: int) -> None:
+    """Validate the number of files in a batch request"""
+    if len(files) > max_files:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Too many files. Maximum allowed is {max_files}, received {len(files)}"
+        )
+    
+    if len(files) == 0:
+        raise HTTPException(status_code=400, detail="No files provided")
+    
+    observe_batch_size(len(files))
 
 @app.post("/extract-text-batch", response_model=BatchExtractionResponse)
 async def extract_text_batch(
     files: List[UploadFile] = File(...),
-    method: str = Form("pdfplumber", description="Extraction method: 'pypdf2' or 'pdfplumber'"),
-    max_files: int = Form(10, description="Maximum number of files to process (default: 10)")
+    method: str = Form("pdfplumber", description="Extraction method: 'pypdf2', 'pdfplumber', 'pdfminer' or 'auto'"),
+    max_files: int = Form(10, description="Maximum number of files to process (default: 10)"),
+    concurrency: int = Form(BATCH_CONCURRENCY, description="Maximum number of files processed in parallel (1 = sequential)"),
+    use_cache: bool = Form(True, description="Serve repeated uploads from the result cache")
 ):
     """
     Extract text from multiple PDF files in batch
     
     - **files**: List of PDF files to extract text from
-    - **method**: Extraction method ('pypdf2' or 'pdfplumber')
+    - **method**: Extraction method ('pypdf2', 'pdfplumber', 'pdfminer' or 'auto')
     - **max_files**: Maximum number of files to process (default: 10)
+    - **concurrency**: Maximum number of files processed in parallel
+    - **use_cache**: Whether to serve repeated uploads from the result cache
     """
     try:
-        # Validate number of files
-        if len(files) > max_files:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Too many files. Maximum allowed is {max_files}, received {len(files)}"
-            )
-        
-        if len(files) == 0:
-            raise HTTPException(status_code=400, detail="No files provided")
-        
-        results = []
-        successful_count = 0
-        failed_count = 0
+        validate_batch(files, max_files)
         
-        for file in files:
-            try:
-                # Validate file type
-                if not file.filename.lower().endswith('.pdf'):
-                    results.append(BatchFileResult(
-                        filename=file.filename,
-                        success=False,
-                        text="",
-                        pages=0,
-                        message="File must be a PDF",
-                        error="Invalid file type"
-                    ))
-                    failed_count += 1
-                    continue
-                
-                # Read file content
-                content = await file.read()
-                if not content:
-                    results.append(BatchFileResult(
-                        filename=file.filename,
-                        success=False,
-                        text="",
-                        pages=0,
-                        message="Empty file",
-                        error="File is empty"
-                    ))
-                    failed_count += 1
-                    continue
-                
-                # Choose extraction method
-                if method.lower() == "pypdf2":
-                    result = extract_text_with_pypdf2(content)
-                elif method.lower() == "pdfplumber":
-                    result = extract_text_with_pdfplumber(content)
-                else:
-                    results.append(BatchFileResult(
-                        filename=file.filename,
-                        success=False,
-                        text="",
-                        pages=0,
-                        message="Invalid extraction method",
-                        error="Invalid method. Use 'pypdf2' or 'pdfplumber'"
-                    ))
-                    failed_count += 1
-                    continue
-                
-                results.append(BatchFileResult(
-                    filename=file.filename,
-                    success=True,
-                    text=result['text'],
-                    pages=result['pages'],
-                    message=f"Successfully extracted text from {result['pages']} pages",
-                    metadata=result['metadata']
-                ))
-                successful_count += 1
-                
-            except Exception as e:
-                logger.error(f"Batch extraction error for {file.filename}: {str(e)}")
-                results.append(BatchFileResult(
-                    filename=file.filename,
-                    success=False,
-                    text="",
-                    pages=0,
-                    message=f"Extraction failed: {str(e)}",
-                    error=str(e)
-                ))
-                failed_count += 1
-        
-        summary = f"Processed {len(files)} files: {successful_count} successful, {failed_count} failed"
-        
-        return BatchExtractionResponse(
-            success=successful_count > 0,
-            total_files=len(files),
-            successful_extractions=successful_count,
-            failed_extractions=failed_count,
-            results=results,
-            summary=summary
+        batch_documents = SingleFlight(remember=True)
+        results = await gather_batch_results(
+            [functools.partial(process_batch_file, file, method, use_cache, batch_documents) for file in files],
+            concurrency,
+            batch_dispatch_order(files)
         )
         
+        return build_batch_response(files, results)
+        
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Batch extraction error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Batch text extraction failed: {str(e)}")
 
+@app.post("/extract-text-batch-stream")
+async def extract_text_batch_stream(
+    files: List[UploadFile] = File(...),
+    method: str = Form("pdfplumber", description="Extraction method: 'pypdf2', 'pdfplumber', 'pdfminer' or 'auto'"),
+    max_files: int = Form(10, description="Maximum number of files to process (default: 10)"),
+    concurrency: int = Form(BATCH_CONCURRENCY, description="Maximum number of files processed in parallel (1 = sequential)"),
+    use_cache: bool = Form(True, description="Serve repeated uploads from the result cache"),
+    format: str = Form("ndjson", description="Stream format: 'ndjson' or 'sse'")
+):
+    """
+    Extract text from multiple PDF files, streaming each result as soon as its file is done
+    
+    - **files**: List of PDF files to extract text from
+    - **method**: Extraction method ('pypdf2', 'pdfplumber', 'pdfminer' or 'auto')
+    - **max_files**: Maximum number of files to process (default: 10)
+    - **concurrency**: Maximum number of files processed in parallel
+    - **use_cache**: Whether to serve repeated uploads from the result cache
+    - **format**: 'ndjson' for one JSON object per line, 'sse' for Server-Sent Events
+    """
+    validate_batch(files, max_files)
+    
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="Invalid format. Use 'ndjson' or 'sse'")
+    
+    batch_documents = SingleFlight(remember=True)
+    return StreamingResponse(
+        stream_batch_results(
+            files,
+            [functools.partial(process_batch_file, file, method, use_cache, batch_documents) for file in files],
+            concurrency,
+            format
+        ),
+        media_type=NDJSON_MEDIA_TYPE if format == "ndjson" else "text/event-stream"
+    )
+
+@app.post("/extract-text-archive")
+async def extract_text_archive(
+    request: Request,
+    method: str = Query("pdfplumber", description="Extraction method: 'pypdf2', 'pdfplumber', 'pdfminer' or 'auto'"),
+    max_files: int = Query(ARCHIVE_MAX_MEMBERS, description=f"Maximum number of PDF files in the archive (default: {ARCHIVE_MAX_MEMBERS})"),
+    concurrency: int = Query(BATCH_CONCURRENCY, description="Maximum number of files processed in parallel (1 = sequential)"),
+    use_cache: bool = Query(True, description="Serve repeated files from the result cache"),
+    format: str = Query("ndjson", description="Stream format: 'ndjson' or 'sse'")
+):
+    """
+    Extract text from the PDFs in a zip or tar archive sent as the request body, streaming each result as it is done
+    
+    The body is the archive itself (zip, or tar optionally compressed with
+    gzip, bzip2 or xz), not a form, so the options are query parameters.
+    Tar archives are extracted while they are being uploaded.
+    
+    - **method**: Extraction method ('pypdf2', 'pdfplumber', 'pdfminer' or 'auto')
+    - **max_files**: Maximum number of PDF files in the archive
+    - **concurrency**: Maximum number of files processed in parallel
+    - **use_cache**: Whether to serve repeated files from the result cache
+    - **format**: 'ndjson' for one JSON object per line, 'sse' for Server-Sent Events
+    """
+    if method.lower() not in EXTRACTION_METHODS:
+        raise HTTPException(status_code=400, detail=INVALID_METHOD_DETAIL)
+    
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="Invalid format. Use 'ndjson' or 'sse'")
+    
+    return RequestStreamingResponse(
+        stream_archive_results(ArchiveStream(request, max_files), method, use_cache, concurrency, format),
+        media_type=NDJSON_MEDIA_TYPE if format == "ndjson" else "text/event-stream"
+    )
+
 @app.post("/extract-text-batch-advanced", response_model=BatchExtractionResponse)
 async def extract_text_batch_advanced(
     files: List[UploadFile] = File(...),
     include_metadata: bool = Form(True, description="Include PDF metadata"),
     page_range: Optional[str] = Form(None, description="Page range (e.g., '1-3' or '1,3,5')"),
-    max_files: int = Form(10, description="Maximum number of files to process (default: 10)")
+    max_files: int = Form(10, description="Maximum number of files to process (default: 10)"),
+    concurrency: int = Form(BATCH_CONCURRENCY, description="Maximum number of files processed in parallel (1 = sequential)"),
+    use_cache: bool = Form(True, description="Serve repeated uploads from the result cache")
 ):
     """
     Advanced batch text extraction with additional options
@@ -403,141 +2165,128 @@ async def extract_text_batch_advanced(
     - **include_metadata**: Whether to include PDF metadata
     - **page_range**: Specific page range to extract (e.g., '1-3' or '1,3,5')
     - **max_files**: Maximum number of files to process (default: 10)
+    - **concurrency**: Maximum number of files processed in parallel
+    - **use_cache**: Whether to serve repeated uploads from the result cache
     """
     try:
-        # Validate number of files
-        if len(files) > max_files:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Too many files. Maximum allowed is {max_files}, received {len(files)}"
-            )
-        
-        if len(files) == 0:
-            raise HTTPException(status_code=400, detail="No files provided")
+        validate_batch(files, max_files)
         
         # Parse page range
-        pages_to_extract = None
-        if page_range:
-            try:
-                pages_to_extract = []
-                for part in page_range.split(','):
-                    if '-' in part:
-                        start, end = map(int, part.split('-'))
-                        pages_to_extract.extend(range(start, end + 1))
-                    else:
-                        pages_to_extract.append(int(part))
-                # Convert to 0-based indexing
-                pages_to_extract = [p - 1 for p in pages_to_extract if p > 0]
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid page range format")
-        
-        results = []
-        successful_count = 0
-        failed_count = 0
-        
-        for file in files:
-            try:
-                # Validate file type
-                if not file.filename.lower().endswith('.pdf'):
-                    results.append(BatchFileResult(
-                        filename=file.filename,
-                        success=False,
-                        text="",
-                        pages=0,
-                        message="File must be a PDF",
-                        error="Invalid file type"
-                    ))
-                    failed_count += 1
-                    continue
-                
-                # Read file content
-                content = await file.read()
-                if not content:
-                    results.append(BatchFileResult(
-                        filename=file.filename,
-                        success=False,
-                        text="",
-                        pages=0,
-                        message="Empty file",
-                        error="File is empty"
-                    ))
-                    failed_count += 1
-                    continue
-                
-                # Use pdfplumber for advanced extraction
-                with pdfplumber.open(io.BytesIO(content)) as pdf:
-                    text = ""
-                    metadata = {}
-                    
-                    # Extract metadata if requested
-                    if include_metadata and pdf.metadata:
-                        metadata = {
-                            'title': pdf.metadata.get('Title', ''),
-                            'author': pdf.metadata.get('Author', ''),
-                            'subject': pdf.metadata.get('Subject', ''),
-                            'creator': pdf.metadata.get('Creator', ''),
-                            'producer': pdf.metadata.get('Producer', ''),
-                            'creation_date': pdf.metadata.get('CreationDate', ''),
-                            'modification_date': pdf.metadata.get('ModDate', '')
-                        }
-                    
-                    # Extract text from specified pages
-                    total_pages = len(pdf.pages)
-                    if pages_to_extract:
-                        for page_num in pages_to_extract:
-                            if 0 <= page_num < total_pages:
-                                page = pdf.pages[page_num]
-                                page_text = page.extract_text()
-                                if page_text:
-                                    text += f"\n--- Page {page_num + 1} ---\n{page_text}\n"
-                    else:
-                        # Extract from all pages
-                        for page_num, page in enumerate(pdf.pages):
-                            page_text = page.extract_text()
-                            if page_text:
-                                text += f"\n--- Page {page_num + 1} ---\n{page_text}\n"
-                    
-                    extracted_pages = len(pages_to_extract) if pages_to_extract else total_pages
-                    
-                    results.append(BatchFileResult(
-                        filename=file.filename,
-                        success=True,
-                        text=text.strip(),
-                        pages=extracted_pages,
-                        message=f"Successfully extracted text from {extracted_pages} pages",
-                        metadata=metadata if include_metadata else None
-                    ))
-                    successful_count += 1
-                
-            except Exception as e:
-                logger.error(f"Advanced batch extraction error for {file.filename}: {str(e)}")
-                results.append(BatchFileResult(
-                    filename=file.filename,
-                    success=False,
-                    text="",
-                    pages=0,
-                    message=f"Advanced extraction failed: {str(e)}",
-                    error=str(e)
-                ))
-                failed_count += 1
-        
-        summary = f"Processed {len(files)} files: {successful_count} successful, {failed_count} failed"
-        
-        return BatchExtractionResponse(
-            success=successful_count > 0,
-            total_files=len(files),
-            successful_extractions=successful_count,
-            failed_extractions=failed_count,
-            results=results,
-            summary=summary
+        pages_to_extract = parse_page_range(page_range)
+        
+        batch_documents = SingleFlight(remember=True)
+        results = await gather_batch_results(
+            [functools.partial(process_batch_file_advanced, file, include_metadata, pages_to_extract, use_cache,
+                               batch_documents)
+             for file in files],
+            concurrency,
+            batch_dispatch_order(files)
         )
         
+        return build_batch_response(files, results)
+        
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Advanced batch extraction error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Advanced batch text extraction failed: {str(e)}")
 
+def get_job_or_404(job_id: str) -> Dict[str, Any]:
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def job_status_response(job: Dict[str, Any]) -> JobStatusResponse:
+    return JobStatusResponse(
+        job_id=job['id'],
+        status=job['status'],
+        filename=job['filename'],
+        pages_done=job['pages_done'],
+        pages_total=job['pages_total'],
+        error=job['error'],
+        created_at=job['created_at'],
+        started_at=job['started_at'],
+        finished_at=job['finished_at']
+    )
+
+@app.post("/jobs", response_model=JobStatusResponse, status_code=202)
+async def create_job(
+    file: UploadFile = File(...),
+    method: str = Form("pdfplumber", description="Extraction method: 'pypdf2', 'pdfplumber', 'pdfminer' or 'auto'"),
+    include_metadata: bool = Form(True, description="Include PDF metadata"),
+    page_range: Optional[str] = Form(None, description="Page range (e.g., '1-3' or '1,3,5')"),
+    use_cache: bool = Form(True, description="Serve repeated uploads from the result cache"),
+    layout_params: Optional[str] = Form(None, description="pdfminer layout parameters as JSON, e.g. '{\"char_margin\": 3}' (method 'pdfminer' only)"),
+):
+    """
+    Queue a PDF for extraction and return the job id immediately
+    
+    - **file**: PDF file to extract text from
+    - **method**: Extraction method ('pypdf2', 'pdfplumber', 'pdfminer' or 'auto')
+    - **include_metadata**: Whether to include PDF metadata
+    - **page_range**: Specific page range to extract (e.g., '1-3' or '1,3,5')
+    - **use_cache**: Whether to serve repeated uploads from the result cache
+    - **layout_params**: JSON object of pdfminer layout parameters for the 'pdfminer' method
+    
+    Poll `/jobs/{job_id}` for progress and fetch `/jobs/{job_id}/result` once done.
+    """
+    upload = None
+    try:
+        # Validate file type
+        if not file.filename.lower().endswith('.pdf'):
+            raise HTTPException(status_code=400, detail="File must be a PDF")
+        
+        if method.lower() not in EXTRACTION_METHODS:
+            raise HTTPException(status_code=400, detail=INVALID_METHOD_DETAIL)
+        
+        # Parse page range and layout parameters
+        pages_to_extract = parse_page_range(page_range)
+        text_options = parse_layout_params(layout_params) if method.lower() == "pdfminer" else None
+        
+        # Spool file content to disk
+        upload = await spool_upload(file)
+        if not upload.size:
+            raise HTTPException(status_code=400, detail="Empty file")
+        
+        # The job store takes ownership of the spooled file
+        job_id = job_store.create(file.filename, upload.path, {
+            'method': method.lower(),
+            'include_metadata': include_metadata,
+            'pages_to_extract': pages_to_extract,
+            'use_cache': use_cache,
+            'text_options': text_options,
+            'sha256': upload.sha256
+        })
+        upload = None
+        job_runner.submit(job_id)
+        
+        return job_status_response(job_store.get(job_id))
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Job submission error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Job submission failed: {str(e)}")
+    finally:
+        if upload is not None:
+            upload.close()
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: str):
+    """Status of an extraction job and its progress in pages"""
+    return job_status_response(get_job_or_404(job_id))
+
+@app.get("/jobs/{job_id}/result", response_model=TextExtractionResponse)
+async def get_job_result(job_id: str):
+    """Result of a finished extraction job"""
+    job = get_job_or_404(job_id)
+    if job['status'] == JOB_FAILED:
+        raise HTTPException(status_code=500, detail=f"Job failed: {job['error']}")
+    if job['status'] != JOB_DONE:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return job_store.load_result(job_id)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
@@ -0,0 +1,254 @@
+"""
+Prometheus metrics for the extraction service.
+
+Request-level metrics are labelled by endpoint (the route path) and by
+extraction method. Opening a PDF and extracting each page happen inside the
+worker processes, so those timings are collected in the worker, returned
+alongside the task result and recorded by the server process.
+"""
+
+import contextlib
+import contextvars
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Match
+
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+PAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BATCH_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+# Label values used outside of a request or before the method is known
+UNKNOWN_LABEL = "none"
+
+REQUEST_DURATION = Histogram(
+    "pdf_request_duration_seconds", "Time spent handling a request",
+    ["endpoint"], buckets=STAGE_BUCKETS
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "pdf_requests_in_flight", "Requests currently being handled", ["endpoint"]
+)
+STAGE_DURATION = Histogram(
+    "pdf_stage_duration_seconds",
+    "Time spent in each extraction stage (admission, upload, queue, open, serialize)",
+    ["stage", "endpoint", "method"], buckets=STAGE_BUCKETS
+)
+PAGE_DURATION = Histogram(
+    "pdf_page_extraction_seconds", "Time spent extracting the text of one page, by engine (the page stage)",
+    ["engine", "endpoint", "method"], buckets=PAGE_BUCKETS
+)
+BYTES_INGESTED = Counter(
+    "pdf_bytes_ingested_total", "Bytes of uploaded PDFs received", ["endpoint"]
+)
+BATCH_SIZE = Histogram(
+    "pdf_batch_files", "Number of files in a batch request", ["endpoint"], buckets=BATCH_BUCKETS
+)
+WORKER_RECYCLES = Counter(
+    "pdf_worker_recycles", "Extraction worker processes retired and replaced", ["reason"]
+)
+ADMISSION_REJECTIONS = Counter(
+    "pdf_admission_rejections", "Requests turned away with 503 by admission control", ["lane", "reason"]
+)
+
+# Route path of the request being handled and the extraction method it uses
+current_endpoint: contextvars.ContextVar[str] = contextvars.ContextVar("current_endpoint", default=UNKNOWN_LABEL)
+current_method: contextvars.ContextVar[str] = contextvars.ContextVar("current_method", default=UNKNOWN_LABEL)
+
+
+def set_extraction_method(method: str) -> None:
+    """Label the metrics recorded from now on in this request with ``method``"""
+    current_method.set(method)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    STAGE_DURATION.labels(stage, current_endpoint.get(), current_method.get()).observe(seconds)
+
+
+def observe_batch_size(files: int) -> None:
+    BATCH_SIZE.labels(current_endpoint.get()).observe(files)
+
+
+def observe_bytes_ingested(size: int) -> None:
+    BYTES_INGESTED.labels(current_endpoint.get()).inc(size)
+
+
+def observe_admission_rejection(lane: str, reason: str) -> None:
+    ADMISSION_REJECTIONS.labels(lane, reason).inc()
+
+
+# Timings recorded by the worker task running in this thread
+_worker_timings = threading.local()
+
+
+@contextlib.contextmanager
+def worker_timer(stage: str, engine: Optional[str] = None, page: Optional[int] = None) -> Iterator[None]:
+    """
+    Time a stage of a worker task
+
+    ``engine`` and ``page`` mark a per-page timing. Outside of
+    ``call_with_timings`` this does nothing.
+    """
+    timings = getattr(_worker_timings, "timings", None)
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.append((stage, engine, time.perf_counter() - started, page))
+
+
+# (stage, engine, seconds, page) recorded by worker_timer
+StageTiming = Tuple[str, Optional[str], float, Optional[int]]
+
+
+def call_with_timings(func: Callable[..., Any], *args: Any) -> Tuple[Any, List[StageTiming]]:
+    """Run ``func(*args)`` in a worker, returning its result and the stage timings it recorded"""
+    timings = []
+    _worker_timings.timings = timings
+    started = time.perf_counter()
+    try:
+        result = func(*args)
+    finally:
+        _worker_timings.timings = None
+    timings.append(("task", None, time.perf_counter() - started, None))
+    return result, timings
+
+
+def observe_worker_timings(timings: List[StageTiming], wall_seconds: float) -> None:
+    """Record the timings of a finished worker task; the time not spent in the task was spent queued"""
+    endpoint = current_endpoint.get()
+    method = current_method.get()
+    for stage, engine, seconds, _ in timings:
+        if stage == "task":
+            STAGE_DURATION.labels("queue", endpoint, method).observe(max(0.0, wall_seconds - seconds))
+        elif engine is not None:
+            PAGE_DURATION.labels(engine, endpoint, method).observe(seconds)
+        else:
+            STAGE_DURATION.labels(stage, endpoint, method).observe(seconds)
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSON response that records the time spent serialising its body"""
+
+    def render(self, content: Any) -> bytes:
+        started = time.perf_counter()
+        body = super().render(content)
+        observe_stage("serialize", time.perf_counter() - started)
+        return body
+
+
+class CacheCollector:
+    """Expose the hit/miss counters and sizes of result caches"""
+
+    def __init__(self, caches: Dict[str, Any]):
+        self.caches = caches
+
+    def collect(self):
+        hits = CounterMetricFamily("pdf_cache_hits", "Cache lookups answered", labels=["cache", "tier"])
+        misses = CounterMetricFamily("pdf_cache_misses", "Cache lookups not answered", labels=["cache"])
+        hit_ratio = GaugeMetricFamily("pdf_cache_hit_ratio", "Share of cache lookups answered", labels=["cache"])
+        size = GaugeMetricFamily("pdf_cache_bytes", "Size of the cached entries", labels=["cache", "tier"])
+        for name, cache in self.caches.items():
+            stats = cache.stats()
+            hits.add_metric([name, "memory"], stats["memory_hits"])
+            hits.add_metric([name, "disk"], stats["disk_hits"])
+            misses.add_metric([name], stats["misses"])
+            hit_ratio.add_metric([name], stats["hit_ratio"])
+            size.add_metric([name, "memory"], stats["memory_bytes"])
+            size.add_metric([name, "disk"], stats["disk_bytes"])
+        return [hits, misses, hit_ratio, size]
+
+
+def register_cache_metrics(caches: Dict[str, Any]) -> None:
+    """Expose the statistics of the given caches, keyed by cache name"""
+    REGISTRY.register(CacheCollector(caches))
+
+
+class WorkerCollector:
+    """Expose the resident memory and task count of each extraction worker"""
+
+    def __init__(self, stats: Callable[[], Dict[int, Tuple[int, int]]]):
+        self.stats = stats
+
+    def collect(self):
+        rss = GaugeMetricFamily("pdf_worker_rss_bytes", "Resident memory of a worker after its last task",
+                                labels=["worker"])
+        tasks = GaugeMetricFamily("pdf_worker_tasks", "Tasks run by a worker since it started", labels=["worker"])
+        for pid, (task_count, rss_bytes) in sorted(self.stats().items()):
+            rss.add_metric([str(pid)], rss_bytes)
+            tasks.add_metric([str(pid)], task_count)
+        return [rss, tasks]
+
+
+def register_worker_metrics(stats: Callable[[], Dict[int, Tuple[int, int]]]) -> None:
+    """Expose per-worker statistics read from ``stats`` (pid -> (tasks, resident bytes)) at scrape time"""
+    REGISTRY.register(WorkerCollector(stats))
+
+
+class AdmissionCollector:
+    """Expose the queue depth and capacity in use of each admission lane"""
+
+    def __init__(self, stats: Callable[[], Dict[str, Any]]):
+        self.stats = stats
+
+    def collect(self):
+        depth = GaugeMetricFamily("pdf_admission_queue_depth", "Requests waiting to be admitted", labels=["lane"])
+        in_use = GaugeMetricFamily("pdf_admission_units_in_use", "Cost units held by admitted requests",
+                                   labels=["lane"])
+        for name, lane in self.stats()["lanes"].items():
+            depth.add_metric([name], lane["queue_depth"])
+            in_use.add_metric([name], lane["in_use"])
+        return [depth, in_use]
+
+
+def register_admission_metrics(stats: Callable[[], Dict[str, Any]]) -> None:
+    """Expose admission lane statistics read from ``stats`` at scrape time"""
+    REGISTRY.register(AdmissionCollector(stats))
+
+
+def register_gauge_callback(name: str, documentation: str, callback: Callable[[], float]) -> Gauge:
+    """Register a gauge whose value is read from ``callback`` at scrape time"""
+    gauge = Gauge(name, documentation)
+    gauge.set_function(callback)
+    return gauge
+
+
+def metrics_response() -> Response:
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+
+class MetricsMiddleware:
+    """Track in-flight requests and request durations, and label the request's metrics with its route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def _route_path(self, scope) -> str:
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = self._route_path(scope)
+        current_endpoint.set(endpoint)
+        current_method.set(UNKNOWN_LABEL)
+        in_flight = REQUESTS_IN_FLIGHT.labels(endpoint)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            in_flight.dec()
+            REQUEST_DURATION.labels(endpoint).observe(time.perf_counter() - started)
@@ -0,0 +1,242 @@
+"""
+Opt-in profiling of individual requests.
+
+A request sent with an ``X-Profile`` header has every extraction task it
+submits to the worker pool run under a profiler, either deterministically
+with cProfile (``pstats``) or with a stack sampler (``collapsed``, one line
+per stack, ready for flamegraph tools). The profile and the wall time of
+every extracted page are written to ``PROFILE_DIR`` and can be fetched from
+``/profiles/{profile_id}``.
+
+Profiling is off unless ``PDF_PROFILING_ENABLED`` is set, in which case the
+middleware is installed; with ``PDF_PROFILE_TOKEN`` set, requests must also
+carry that token in ``X-Profile-Token``.
+"""
+
+import contextvars
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+from metrics import StageTiming, call_with_timings, current_endpoint
+
+# Allow requests to be profiled
+PROFILING_ENABLED = os.getenv("PDF_PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+# Token required in the X-Profile-Token header (unset = no token required)
+PROFILE_TOKEN = os.getenv("PDF_PROFILE_TOKEN", "")
+# Directory the profiles are written to
+PROFILE_DIR = os.getenv("PDF_PROFILE_DIR", "profiles")
+# Interval between two stack samples in 'collapsed' mode
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PDF_PROFILE_SAMPLE_INTERVAL_MS", "1")) / 1000
+
+PROFILE_MODES = ("pstats", "collapsed")
+PROFILE_HEADER = b"x-profile"
+PROFILE_TOKEN_HEADER = b"x-profile-token"
+
+# Profile of the request being handled, if it asked for one
+current_profile: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar(
+    "current_profile", default=None
+)
+
+
+def check_profile_token(token: Optional[str]) -> None:
+    """Raise unless profiling is enabled and ``token`` matches the configured token"""
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if PROFILE_TOKEN and not hmac.compare_digest((token or "").encode(), PROFILE_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid profile token")
+
+
+class StackSampler(threading.Thread):
+    """Count the call stacks of one thread at a fixed interval"""
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def stop(self) -> Dict[str, int]:
+        self._stopped.set()
+        self.join()
+        return dict(self.counts)
+
+
+def call_with_profile(mode: str, func: Callable[..., Any], *args: Any) -> Tuple[Any, List[StageTiming], Any]:
+    """Run ``func(*args)`` in a worker under a profiler; return its result, stage timings and profile data"""
+    if mode == "pstats":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            result, timings = call_with_timings(func, *args)
+        finally:
+            profiler.disable()
+        profiler.create_stats()
+        return result, timings, profiler.stats
+
+    sampler = StackSampler(threading.get_ident())
+    sampler.start()
+    try:
+        result, timings = call_with_timings(func, *args)
+    finally:
+        counts = sampler.stop()
+    return result, timings, counts
+
+
+class _ProfileData:
+    """Raw cProfile statistics in the form pstats.Stats loads"""
+
+    def __init__(self, stats: Dict):
+        self.stats = stats
+
+    def create_stats(self) -> None:
+        pass
+
+
+class RequestProfile:
+    """Profile data of every worker task of one request"""
+
+    def __init__(self, mode: str, endpoint: str):
+        self.id = uuid.uuid4().hex
+        self.mode = mode
+        self.endpoint = endpoint
+        self.created_at = time.time()
+        self.started = time.perf_counter()
+        self.stats: Optional[pstats.Stats] = None
+        self.counts: Counter = Counter()
+        self.page_timings: List[Dict[str, Any]] = []
+
+    def add(self, data: Any, timings: List[StageTiming]) -> None:
+        """Merge the profile and page timings of a finished worker task"""
+        if self.mode == "pstats":
+            if self.stats is None:
+                self.stats = pstats.Stats(_ProfileData(data))
+            else:
+                self.stats.add(_ProfileData(data))
+        else:
+            self.counts.update(data)
+        for stage, engine, seconds, page in timings:
+            if page is not None:
+                self.page_timings.append({'page': page + 1, 'engine': engine, 'ms': round(seconds * 1000, 3)})
+
+    def save(self, directory: str = PROFILE_DIR) -> None:
+        """Write the profile and a JSON summary with the slowest pages first"""
+        os.makedirs(directory, exist_ok=True)
+        if self.mode == "pstats":
+            if self.stats is not None:
+                self.stats.dump_stats(os.path.join(directory, f"{self.id}.pstats"))
+        else:
+            with open(os.path.join(directory, f"{self.id}.collapsed"), "w", encoding="utf-8") as f:
+                for stack, count in self.counts.most_common():
+                    f.write(f"{stack} {count}\n")
+        summary = {
+            'profile_id': self.id,
+            'mode': self.mode,
+            'endpoint': self.endpoint,
+            'created_at': self.created_at,
+            'wall_ms': round((time.perf_counter() - self.started) * 1000, 1),
+            'pages': sorted(self.page_timings, key=lambda page: page['ms'], reverse=True)
+        }
+        with open(os.path.join(directory, f"{self.id}.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f)
+
+
+def profile_path(profile_id: str, directory: str = PROFILE_DIR) -> Optional[str]:
+    """Path of the raw profile file, or None if there is no such profile"""
+    if not profile_id.isalnum():
+        return None
+    for extension in ("pstats", "collapsed"):
+        path = os.path.join(directory, f"{profile_id}.{extension}")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def load_profile(profile_id: str, top: int = 50, directory: str = PROFILE_DIR) -> Optional[Dict[str, Any]]:
+    """Load a saved profile's summary, with the profile itself rendered as text"""
+    if not profile_id.isalnum():
+        return None
+    try:
+        with open(os.path.join(directory, f"{profile_id}.json"), encoding="utf-8") as f:
+            summary = json.load(f)
+    except FileNotFoundError:
+        return None
+
+    path = profile_path(profile_id, directory)
+    if path is None:
+        summary['profile'] = ""
+    elif summary['mode'] == "pstats":
+        report = io.StringIO()
+        pstats.Stats(path, stream=report).sort_stats("cumulative").print_stats(top)
+        summary['profile'] = report.getvalue()
+    else:
+        with open(path, encoding="utf-8") as f:
+            summary['profile'] = f.read()
+    return summary
+
+
+class ProfilingMiddleware:
+    """Profile requests carrying an ``X-Profile: pstats|collapsed`` header"""
+
+    def __init__(self, app, directory: str = PROFILE_DIR):
+        self.app = app
+        self.directory = directory
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        mode = headers.get(PROFILE_HEADER)
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        mode = mode.decode("latin-1").lower()
+        try:
+            check_profile_token(headers.get(PROFILE_TOKEN_HEADER, b"").decode("latin-1"))
+            if mode not in PROFILE_MODES:
+                raise HTTPException(status_code=400, detail="Invalid profile mode. Use 'pstats' or 'collapsed'")
+        except HTTPException as e:
+            response = JSONResponse(status_code=e.status_code, content={"detail": e.detail})
+            await response(scope, receive, send)
+            return
+
+        profile = RequestProfile(mode, current_endpoint.get())
+        current_profile.set(profile)
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            current_profile.set(None)
+            profile.save(self.directory)
@@ -8,6 +8,7 @@ import requests
 import json
 import sys
 import os
+import time
 from pathlib import Path
 
 # API base URL
@@ -122,6 +123,117 @@ def extract_text_advanced(file_path, include_metadata=True, page_range=None):
         print(f"Error: {str(e)}")
         return None
 
+def test_page_range_past_end(file_path):
+    """Test a page range that runs past the end of the document"""
+    print("\nTesting a page range past the end of the document")
+    print(f"File: {file_path}")
+    
+    if not os.path.exists(file_path):
+        print(f"Error: File {file_path} not found.")
+        return False
+    
+    try:
+        with open(file_path, 'rb') as f:
+            files = {'file': f}
+            data = {'page_range': '1-10000', 'use_cache': False}
+            response = requests.post(f"{BASE_URL}/extract-text-advanced", files=files, data=data)
+        
+        print(f"Status: {response.status_code}")
+        result = response.json()
+        print(f"Extraction status: {result.get('status')}")
+        print(f"Message: {result.get('message')}")
+        # Pages that do not exist are neither extracted nor counted against the page limit
+        if response.status_code != 200 or result['status'] != 'complete':
+            print("Error: every page of the document should have been extracted")
+            return False
+        return True
+    except requests.exceptions.ConnectionError:
+        print("Error: Could not connect to the API.")
+        return False
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return False
+
+def run_job(file_path, timeout=120):
+    """Submit an extraction job and poll it until it finishes"""
+    with open(file_path, 'rb') as f:
+        response = requests.post(f"{BASE_URL}/jobs", files={'file': f})
+    job = response.json()
+    deadline = time.time() + timeout
+    while job['status'] in ('queued', 'running') and time.time() < deadline:
+        time.sleep(0.5)
+        job = requests.get(f"{BASE_URL}/jobs/{job['job_id']}").json()
+    return job
+
+def test_jobs(file_path):
+    """Test the job API, including a job answered from the result cache"""
+    print("\nTesting extraction jobs")
+    print(f"File: {file_path}")
+    
+    if not os.path.exists(file_path):
+        print(f"Error: File {file_path} not found.")
+        return False
+    
+    try:
+        passed = True
+        # The second job for the same file is answered from the result cache
+        for attempt in ("first", "cached"):
+            job = run_job(file_path)
+            print(f"{attempt.capitalize()} job: {job['status']}, {job['pages_done']}/{job['pages_total']} pages")
+            if job['status'] != 'done' or not job['pages_total'] or job['pages_done'] != job['pages_total']:
+                print("Error: a finished job should report all of its pages as done")
+                passed = False
+        return passed
+    except requests.exceptions.ConnectionError:
+        print("Error: Could not connect to the API.")
+        return False
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return False
+
+def split_content_pdf(text):
+    """A one-page PDF whose text operand and operator are in different content streams"""
+    contents = [f"BT /F1 24 Tf 72 700 Td ({text})".encode(), b"Tj ET"]
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 4 0 R >> >> "
+        b"/Contents [5 0 R 6 0 R] >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ] + [b"<< /Length %d >>\nstream\n%s\nendstream" % (len(data), data) for data in contents]
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return pdf
+
+def test_split_content_streams():
+    """Test a page whose text-showing operator is split from its operand across content streams"""
+    print("\nTesting a page with its text split across content streams...")
+    try:
+        files = {'file': ('split.pdf', split_content_pdf("Hello"), 'application/pdf')}
+        data = {'method': 'pdfplumber', 'use_cache': False}
+        response = requests.post(f"{BASE_URL}/extract-text", files=files, data=data)
+        
+        print(f"Status: {response.status_code}")
+        result = response.json()
+        print(f"Text: {result.get('text')!r}")
+        if "Hello" not in result.get('text', ''):
+            print("Error: the page's text was not extracted")
+            return False
+        return True
+    except requests.exceptions.ConnectionError:
+        print("Error: Could not connect to the API.")
+        return False
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return False
+
 def test_error_cases():
     """Test various error cases"""
     print("\nTesting error cases...")
@@ -180,6 +292,10 @@ def main():
         # Test advanced extraction
         extract_text_advanced(pdf_file, include_metadata=True)
         extract_text_advanced(pdf_file, page_range="1-2")
+        test_page_range_past_end(pdf_file)
+        
+        # Test extraction jobs
+        test_jobs(pdf_file)
         
     else:
         print("\nNo PDF file provided. Testing error cases only.")
@@ -188,6 +304,9 @@ def main():
     # Test error cases
     test_error_cases()
     
+    # Test text split across content streams
+    test_split_content_streams()
+    
     print("\nTest completed!")
 
 if __name__ == "__main__":
@@ -0,0 +1,189 @@
+"""
+Upload spooling and size limits.
+
+Uploaded PDFs are copied in fixed-size chunks to a temporary file on disk
+instead of being read into memory, and the extraction engines read them
+through a memory map. Worker processes receive the file path, not the bytes.
+"""
+
+import contextlib
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+import time
+from typing import BinaryIO, Iterator, Tuple, Union
+
+from fastapi import HTTPException, UploadFile
+from starlette.responses import JSONResponse
+
+from metrics import observe_bytes_ingested, observe_stage
+
+# Largest accepted PDF (0 = unlimited)
+MAX_UPLOAD_BYTES = int(os.getenv("PDF_MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+# Largest accepted request body, all files of a batch included (0 = unlimited)
+MAX_REQUEST_BYTES = int(os.getenv("PDF_MAX_REQUEST_BYTES", str(1024 * 1024 * 1024)))
+# Directory for spooled uploads (defaults to the system temp directory)
+UPLOAD_DIR = os.getenv("PDF_UPLOAD_DIR") or None
+
+SPOOL_CHUNK_BYTES = 1024 * 1024
+# Bytes a single-file request body may carry besides the PDF: multipart headers and form fields
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Routes whose body carries exactly one PDF; they are held to the per-file limit while being received
+SINGLE_FILE_ROUTES = ("/extract-text", "/extract-text-advanced", "/extract-text-stream", "/inspect", "/jobs")
+
+# A PDF given either as bytes or as the path of a file on disk
+PDFSource = Union[bytes, str]
+
+
+def hash_pdf_source(pdf_file: PDFSource) -> str:
+    """Return the SHA-256 hex digest of a PDF given as bytes or as a path"""
+    if isinstance(pdf_file, (bytes, bytearray)):
+        return hashlib.sha256(pdf_file).hexdigest()
+    digest = hashlib.sha256()
+    with open(pdf_file, "rb") as f:
+        for chunk in iter(lambda: f.read(SPOOL_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SpooledUpload:
+    """An uploaded file copied to disk, with its size and SHA-256 digest"""
+
+    def __init__(self, filename: str, path: str, size: int, sha256: str):
+        self.filename = filename
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+    def close(self) -> None:
+        """Delete the spooled file"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def file_too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File too large. Maximum size is {max_bytes} bytes")
+
+
+async def spool_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> SpooledUpload:
+    """
+    Copy an upload to a temporary file in chunks, hashing it on the way
+
+    Raises a 413 as soon as more than ``max_bytes`` have been read.
+    """
+    if max_bytes and file.size is not None and file.size > max_bytes:
+        raise file_too_large(max_bytes)
+
+    started = time.perf_counter()
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(suffix=".pdf", dir=UPLOAD_DIR)
+    try:
+        with os.fdopen(fd, "wb") as spooled:
+            while True:
+                chunk = await file.read(SPOOL_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise file_too_large(max_bytes)
+                digest.update(chunk)
+                spooled.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+
+    observe_stage("upload", time.perf_counter() - started)
+    observe_bytes_ingested(size)
+    return SpooledUpload(file.filename, path, size, digest.hexdigest())
+
+
+def spool_stream(filename: str, stream: BinaryIO, max_bytes: int = MAX_UPLOAD_BYTES) -> SpooledUpload:
+    """Blocking counterpart of ``spool_upload`` for a file object, e.g. an archive member"""
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(suffix=".pdf", dir=UPLOAD_DIR)
+    try:
+        with os.fdopen(fd, "wb") as spooled:
+            for chunk in iter(lambda: stream.read(SPOOL_CHUNK_BYTES), b""):
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise file_too_large(max_bytes)
+                digest.update(chunk)
+                spooled.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return SpooledUpload(filename, path, size, digest.hexdigest())
+
+
+@contextlib.contextmanager
+def open_pdf_source(pdf_file: PDFSource) -> Iterator[BinaryIO]:
+    """Open a PDF given as bytes or as a path; files are memory-mapped"""
+    if isinstance(pdf_file, (bytes, bytearray)):
+        yield io.BytesIO(pdf_file)
+        return
+
+    with open(pdf_file, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield f
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+class RequestSizeLimitMiddleware:
+    """
+    Reject request bodies larger than ``max_bytes`` with a 413
+
+    On ``file_routes`` the body is instead limited to ``max_file_bytes`` plus
+    the multipart envelope, so an oversized PDF is cut off while it arrives
+    rather than after the whole form has been parsed. A declared
+    Content-Length over the limit is rejected before any of the body is
+    read; otherwise the body is counted while it is received.
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_REQUEST_BYTES, max_file_bytes: int = MAX_UPLOAD_BYTES,
+                 file_routes: Tuple[str, ...] = SINGLE_FILE_ROUTES):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.file_routes = file_routes
+
+    def body_limit(self, path: str) -> Tuple[int, str]:
+        """The largest body accepted on ``path`` and the detail of the 413 sent past it"""
+        if path in self.file_routes and self.max_file_bytes:
+            file_limit = self.max_file_bytes + MULTIPART_OVERHEAD_BYTES
+            if not self.max_bytes or file_limit < self.max_bytes:
+                return file_limit, file_too_large(self.max_file_bytes).detail
+        return self.max_bytes, f"Request too large. Maximum size is {self.max_bytes} bytes"
+
+    async def __call__(self, scope, receive, send):
+        max_bytes, detail = self.body_limit(scope["path"]) if scope["type"] == "http" else (0, "")
+        if not max_bytes:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > max_bytes:
+                response = JSONResponse(status_code=413, content={"detail": detail})
+                await response(scope, receive, send)
+                return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
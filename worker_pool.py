@@ -0,0 +1,412 @@
+"""
+Process pool used to run PDF extraction off the event loop.
+
+The extraction libraries are pure Python and CPU bound, so running them
+inside an ``async def`` handler blocks the whole uvicorn worker. Handlers
+submit the extraction function to this pool and await the result instead.
+
+Each worker process runs one task at a time and is managed on its own, so
+one worker can be replaced without disturbing the tasks of the others. A
+task may be given a deadline; if it is still running then, only the worker
+running it is killed.
+Every task reports the resident memory of the worker that ran it; a worker
+that grows past the RSS cap, or has run its maximum number of tasks, exits
+once its task is done and a fresh process takes its place. Memory stays flat
+in long-running servers without killing any extraction half way.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import pickle
+import resource
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from metrics import WORKER_RECYCLES, call_with_timings, observe_worker_timings
+from profiling import call_with_profile, current_profile
+
+logger = logging.getLogger(__name__)
+
+# Number of worker processes (0 runs extraction in a thread instead)
+WORKER_PROCESSES = int(os.getenv("PDF_WORKER_PROCESSES", str(os.cpu_count() or 1)))
+# Replace a worker process after it has run this many tasks (0 = never). A task is one call
+# to the pool: a whole document, one page chunk of a sharded or streamed document, or a page
+# count, so a single document can take several
+WORKER_MAX_TASKS = int(os.getenv("PDF_WORKER_MAX_TASKS", "0"))
+# Replace a worker once its resident memory exceeds this many megabytes (0 = never)
+WORKER_MAX_RSS_MB = int(os.getenv("PDF_WORKER_MAX_RSS_MB", "1024"))
+# Start method for worker processes: 'spawn', 'forkserver' or 'fork'
+WORKER_START_METHOD = os.getenv("PDF_WORKER_START_METHOD", "spawn")
+
+# Seconds a stopping worker gets to exit before it is killed
+WORKER_STOP_TIMEOUT = 5
+# Seconds before replacing a worker that died before finishing any task, e.g. failing to import
+WORKER_RESTART_DELAY = 1
+
+_pool: Optional["WorkerPool"] = None
+# Tasks submitted to the pool that have not finished yet
+_pending_tasks = 0
+
+
+class TaskOverdue(Exception):
+    """Raised by ``run_in_worker`` for a task not finished by its deadline; its worker, if any, was killed"""
+
+
+def current_rss_bytes() -> int:
+    """Resident memory of this process (the peak where the current value is not available)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def portable_exception(error: BaseException) -> BaseException:
+    """``error`` if it survives pickling, otherwise a plain Exception with the same message"""
+    try:
+        pickle.loads(pickle.dumps(error))
+        return error
+    except Exception:
+        return Exception(f"{type(error).__name__}: {error}")
+
+
+def worker_main(conn: multiprocessing.connection.Connection) -> None:
+    """
+    Run the tasks sent over ``conn`` until told to stop; the loop of every worker process
+
+    A task is a tuple of a callable and its arguments. Each reply holds
+    whether the task succeeded, its result or exception, and the resident
+    memory of the worker afterwards.
+    """
+    # Ctrl-C is for the server, which stops its workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        try:
+            reply = (True, task[0](*task[1:]))
+        except BaseException as e:
+            reply = (False, portable_exception(e))
+        try:
+            conn.send(reply + (current_rss_bytes(),))
+        except Exception as e:
+            # The result could not be pickled
+            conn.send((False, portable_exception(e), current_rss_bytes()))
+
+
+class Worker:
+    """One worker process, the pipe its tasks go over and the task it is running"""
+
+    def __init__(self, context: multiprocessing.context.BaseContext):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.pid = self.process.pid
+        self.tasks = 0
+        self.rss = 0
+        # Result of the task being run, if any, and the timer that kills the worker at its deadline
+        self.future: Optional[asyncio.Future] = None
+        self.kill_timer: Optional[asyncio.TimerHandle] = None
+        self.killed = False
+        self.exited = False
+
+
+class WorkerPool:
+    """
+    Worker processes, each running one task at a time
+
+    Tasks wait for an idle worker in the order they were submitted. A monitor
+    thread reads the replies of the workers and notices the ones that exit;
+    the bookkeeping itself happens on the event loop. A worker over
+    ``max_rss_bytes`` or past ``max_tasks`` is told to exit after its task,
+    and a worker that exits for any reason is replaced by a new process.
+    """
+
+    def __init__(self, processes: int = WORKER_PROCESSES, start_method: str = WORKER_START_METHOD,
+                 max_tasks: int = WORKER_MAX_TASKS, max_rss_mb: int = WORKER_MAX_RSS_MB):
+        self.processes = max(1, processes)
+        self.max_tasks = max_tasks
+        self.max_rss_bytes = max_rss_mb * 1024 * 1024
+        self._context = multiprocessing.get_context(start_method)
+        self._loop = asyncio.get_running_loop()
+        self._workers: Dict[int, Worker] = {}
+        self._idle: Deque[Worker] = deque()
+        self._waiting: Deque[asyncio.Future] = deque()
+        self._lock = threading.Lock()
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        self._closed = False
+        for _ in range(self.processes):
+            self._start_worker()
+        self._monitor = threading.Thread(target=self._monitor_workers, name="extraction-pool-monitor", daemon=True)
+        self._monitor.start()
+        logger.info(
+            f"Started extraction pool: {self.processes} workers, start method '{start_method}', "
+            f"max tasks per worker {max_tasks or 'unlimited'}"
+        )
+
+    def _start_worker(self) -> None:
+        worker = Worker(self._context)
+        with self._lock:
+            self._workers[worker.pid] = worker
+        self._wake_monitor()
+        self._release(worker)
+
+    def _wake_monitor(self) -> None:
+        os.write(self._wakeup_write, b"\0")
+
+    def _monitor_workers(self) -> None:
+        """Hand replies and exits of the workers to the event loop; runs in the monitor thread"""
+        while True:
+            with self._lock:
+                workers = [worker for worker in self._workers.values() if not worker.exited]
+                if self._closed and not workers:
+                    return
+            watched = [self._wakeup_read]
+            for worker in workers:
+                watched += [worker.conn, worker.process.sentinel]
+            ready = multiprocessing.connection.wait(watched)
+            if self._wakeup_read in ready:
+                os.read(self._wakeup_read, 4096)
+            for worker in workers:
+                exited = worker.process.sentinel in ready
+                if worker.conn in ready or (exited and worker.conn.poll()):
+                    try:
+                        reply = worker.conn.recv()
+                    except (EOFError, OSError):
+                        exited = True
+                    except Exception as e:
+                        # The reply arrived but could not be unpickled
+                        self._call_soon(self._task_done, worker, (False, e, worker.rss))
+                    else:
+                        self._call_soon(self._task_done, worker, reply)
+                if exited:
+                    worker.process.join()
+                    worker.exited = True
+                    self._call_soon(self._worker_exited, worker)
+
+    def _call_soon(self, callback: Callable[..., None], *args: Any) -> None:
+        try:
+            self._loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # The event loop is closed; the server is shutting down
+            pass
+
+    def _release(self, worker: Worker) -> None:
+        """Give an idle worker to the longest waiting task"""
+        while self._waiting:
+            waiter = self._waiting.popleft()
+            if not waiter.done():
+                waiter.set_result(worker)
+                return
+        self._idle.append(worker)
+
+    async def _acquire(self) -> Worker:
+        if self._idle:
+            return self._idle.popleft()
+        waiter = self._loop.create_future()
+        self._waiting.append(waiter)
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release(waiter.result())
+            raise
+
+    def _task_done(self, worker: Worker, reply: Tuple[bool, Any, int]) -> None:
+        succeeded, output, worker.rss = reply
+        worker.tasks += 1
+        self._cancel_kill_timer(worker)
+        future, worker.future = worker.future, None
+        if future is not None and not future.done():
+            if succeeded:
+                future.set_result(output)
+            else:
+                future.set_exception(output)
+        if worker.exited or self._closed:
+            return
+        if self.max_rss_bytes and worker.rss > self.max_rss_bytes:
+            self._retire(worker, "rss")
+        elif self.max_tasks and worker.tasks >= self.max_tasks:
+            self._retire(worker, "max_tasks")
+        else:
+            self._release(worker)
+
+    def _retire(self, worker: Worker, reason: str) -> None:
+        """Let a worker exit; it is replaced once it has"""
+        WORKER_RECYCLES.labels(reason).inc()
+        logger.info(f"Recycling extraction worker {worker.pid} ({reason})")
+        try:
+            worker.conn.send(None)
+        except OSError:
+            pass
+
+    def _worker_exited(self, worker: Worker) -> None:
+        with self._lock:
+            self._workers.pop(worker.pid, None)
+        worker.conn.close()
+        if worker in self._idle:
+            self._idle.remove(worker)
+        self._cancel_kill_timer(worker)
+        future, worker.future = worker.future, None
+        if future is not None and not future.done():
+            if worker.killed:
+                future.set_exception(TaskOverdue())
+            else:
+                # e.g. killed by the OOM killer
+                logger.error(f"Extraction worker {worker.pid} died unexpectedly, starting a new one")
+                future.set_exception(Exception("Extraction worker process terminated unexpectedly"))
+        if self._closed:
+            return
+        if worker.tasks or worker.killed:
+            self._start_worker()
+        else:
+            self._loop.call_later(WORKER_RESTART_DELAY, self._restart_worker)
+
+    def _restart_worker(self) -> None:
+        if not self._closed:
+            self._start_worker()
+
+    async def run(self, task: Tuple[Any, ...], kill_after: Optional[float] = None) -> Any:
+        """
+        Run ``task[0](*task[1:])`` in a worker process and await its result
+
+        Raises TaskOverdue if the task has not finished ``kill_after``
+        seconds from now. A task still waiting for a worker then is never
+        started; the worker of a task still running is killed and replaced.
+        If the caller is cancelled the task still runs, and its worker is
+        released (or killed at the deadline) as usual.
+        """
+        kill_at = None if kill_after is None else self._loop.time() + kill_after
+        try:
+            worker = await asyncio.wait_for(self._acquire(), kill_after)
+        except asyncio.TimeoutError:
+            raise TaskOverdue()
+        try:
+            worker.conn.send(task)
+        except BaseException:
+            self._release(worker)
+            raise
+        worker.future = self._loop.create_future()
+        if kill_at is not None:
+            worker.kill_timer = self._loop.call_at(kill_at, self._kill_overdue, worker, worker.future)
+        return await worker.future
+
+    def _kill_overdue(self, worker: Worker, future: asyncio.Future) -> None:
+        worker.kill_timer = None
+        if worker.future is future and not worker.exited:
+            logger.warning(f"Killing extraction worker {worker.pid} to stop a task that overran its deadline")
+            worker.killed = True
+            worker.process.kill()
+
+    def _cancel_kill_timer(self, worker: Worker) -> None:
+        if worker.kill_timer is not None:
+            worker.kill_timer.cancel()
+            worker.kill_timer = None
+
+    def stats(self) -> Dict[int, Tuple[int, int]]:
+        """Tasks run and resident bytes of each live worker that has run a task, by pid"""
+        with self._lock:
+            workers = list(self._workers.values())
+        return {worker.pid: (worker.tasks, worker.rss) for worker in workers if worker.tasks and not worker.exited}
+
+    def shutdown(self) -> None:
+        """Stop every worker, killing those that do not exit in time"""
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers.values())
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        deadline = time.monotonic() + WORKER_STOP_TIMEOUT
+        for worker in workers:
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                worker.process.kill()
+        self._wake_monitor()
+        self._monitor.join(WORKER_STOP_TIMEOUT)
+        os.close(self._wakeup_read)
+        os.close(self._wakeup_write)
+        for waiter in self._waiting:
+            waiter.cancel()
+
+
+def get_pool() -> Optional[WorkerPool]:
+    """Return the shared worker pool, creating it on first use"""
+    global _pool
+    if WORKER_PROCESSES <= 0:
+        return None
+    if _pool is None:
+        _pool = WorkerPool()
+    return _pool
+
+
+def shutdown_pool() -> None:
+    """Shut down the shared worker pool"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def worker_stats() -> Dict[int, Tuple[int, int]]:
+    """Tasks run and resident bytes of each live worker, by pid"""
+    return _pool.stats() if _pool is not None else {}
+
+
+def pending_tasks() -> int:
+    """Number of tasks submitted to the pool that have not finished yet"""
+    return _pending_tasks
+
+
+def queue_depth() -> int:
+    """Number of submitted tasks waiting for a free worker"""
+    return max(0, _pending_tasks - max(1, WORKER_PROCESSES))
+
+
+async def run_in_worker(func: Callable[..., Any], *args: Any, kill_after: Optional[float] = None) -> Any:
+    """
+    Run ``func(*args)`` in the extraction pool and await its result
+
+    With ``kill_after``, raises TaskOverdue once that many seconds have
+    passed, killing the worker if the task is still running (stuck in native
+    code, swapping). Without worker processes the call returns at that point
+    but the thread carries on until the task finishes on its own.
+    """
+    global _pending_tasks
+    pool = get_pool()
+    profile = current_profile.get()
+    task = (call_with_timings, func) if profile is None else (call_with_profile, profile.mode, func)
+    started = time.perf_counter()
+    _pending_tasks += 1
+    try:
+        if pool is None:
+            try:
+                output = await asyncio.wait_for(run_in_threadpool(*task, *args), kill_after)
+            except asyncio.TimeoutError:
+                raise TaskOverdue()
+        else:
+            output = await pool.run(task + args, kill_after)
+    finally:
+        _pending_tasks -= 1
+    result, timings = output[:2]
+    observe_worker_timings(timings, time.perf_counter() - started)
+    if profile is not None:
+        profile.add(output[2], timings)
+    return result